@@ -2,9 +2,16 @@ from os import environ
 
 from requests import RequestException
 
-session_id = environ["JUEJIN_SESSION_ID"]
-if not session_id:
-    raise ValueError("environment variable 'JUEJIN_SESSION_ID' is not set")
+
+def __getattr__(name):
+    # `session_id` is only read from the environment when a script asks for it, so that the clients (and `JuejinError`)
+    # can be imported without one, e.g. by the multi-account runner
+    if name == "session_id":
+        session_id = environ["JUEJIN_SESSION_ID"]
+        if not session_id:
+            raise ValueError("environment variable 'JUEJIN_SESSION_ID' is not set")
+        return session_id
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 class JuejinError(RequestException):
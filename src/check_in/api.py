@@ -1,22 +1,87 @@
-from json import JSONDecodeError
+from concurrent.futures import Future
+from itertools import count
+from threading import Lock
+from time import sleep
+from typing import Any, Callable, Tuple
 
-from requests import Session
+from requests import PreparedRequest, Request, Response, Session, exceptions
 
 from __init__ import JuejinError
+from endpoints import BASE_URL, ENDPOINTS, build_body, decode, unpack
+from throttle import MAX_ATTEMPTS, RETRY_STATUSES, backoff_delay, bucket_for, counters
 
 
 class JuejinSession:
-    """Juejin session."""
+    """Juejin session.
 
-    def __init__(self, session_id: str):
+    The methods call the endpoints declared in `endpoints.ENDPOINTS`, every endpoint is prepared once per session and
+    copied for each call. Requests are paced by the rate limiter of their host (see `throttle`). Idempotent requests
+    are retried with jittered exponential backoff on connection errors, throttling and malformed responses, and
+    identical GET requests in flight at the same time are sent once.
+    """
+
+    def __init__(self, session_id: str, base_url: str = BASE_URL):
         self.__session = Session()
         self.session.cookies.set("sessionid", session_id)
+        self.base_url = base_url
+        self.__templates = {}  # Endpoint name -> (prepared request without cookies, settings of `Session.send`)
+        self.__in_flight = {}  # URL -> Future of the GET request in flight
+        self.__in_flight_lock = Lock()
 
     @property
     def session(self):
         return self.__session
 
-    def _request_handler(self, wrapped=None, *, return_keys=("data",), method="get"):
+    def __send(self, url: str, idempotent: bool, send: Callable[[], Response]) -> dict:
+        # Send a request, retrying if allowed, and return the decoded response
+        for attempt in count(1):
+            bucket_for(url).acquire()
+            counters.increment("requests")
+            try:
+                ret = send()
+            except (exceptions.ConnectionError, exceptions.Timeout):
+                if not idempotent or attempt >= MAX_ATTEMPTS:
+                    raise
+            else:
+                if transient := ret.status_code in RETRY_STATUSES:
+                    counters.increment("throttle_responses")
+                try:
+                    ret_json = decode(ret.content)
+                except ValueError:
+                    ret_json = None
+                    transient = True
+                if not transient or not idempotent or attempt >= MAX_ATTEMPTS:
+                    if ret_json is None:
+                        raise JuejinError(ret.text) from None
+                    return ret_json
+            counters.increment("retries")
+            sleep(backoff_delay(attempt))
+
+    def __coalesce(self, method: str, url: str, has_body: bool, idempotent: bool, send: Callable[[], Response]) -> dict:
+        # Identical GET requests in flight share the first one's response
+        if method.upper() != "GET" or has_body:
+            return self.__send(url, idempotent, send)
+
+        with self.__in_flight_lock:
+            if (future := self.__in_flight.get(url)) is None:
+                future = self.__in_flight[url] = Future()
+                is_owner = True
+            else:
+                is_owner = False
+        if not is_owner:
+            counters.increment("coalesced")
+            return future.result()
+
+        try:
+            future.set_result(self.__send(url, idempotent, send))
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            with self.__in_flight_lock:
+                del self.__in_flight[url]
+        return future.result()
+
+    def _request_handler(self, wrapped=None, *, return_keys=("data",), method="get", idempotent=False):
 
         def _decorator(f):
             def _wrapper(*args, **kwargs):
@@ -42,23 +107,9 @@ class JuejinSession:
                         raise ValueError("second return value must be a dict if present")
                     req_config = result[1]
 
-                ret = self.__session.request(method, url, **req_config)
-
-                try:
-                    ret_json = ret.json()
-                except JSONDecodeError:
-                    raise JuejinError(ret.text) from None
-
-                if ret_json["err_msg"] != "success":
-                    raise JuejinError(f"error {ret_json['err_no']}: "
-                                      f"{ret_json['err_msg'] if ret_json['err_msg'] else '<no message>'}")
-
-                if len(return_keys) == 1:
-                    return ret_json[return_keys[0]]
-                ret_list = []
-                for key in return_keys:
-                    ret_list.append(ret_json[key])
-                return ret_list
+                ret_json = self.__coalesce(method, url, bool(req_config), idempotent,
+                                           lambda: self.__session.request(method, url, **req_config))
+                return unpack(ret_json, return_keys)
 
             return _wrapper
 
@@ -67,24 +118,51 @@ class JuejinSession:
         else:
             return _decorator
 
+    def __template(self, name: str) -> Tuple[PreparedRequest, dict]:
+        if (template := self.__templates.get(name)) is None:
+            endpoint = ENDPOINTS[name]
+            url = self.base_url + endpoint.path
+            prepared = self.__session.prepare_request(Request(endpoint.method, url))
+            # Cookies are added at every call, the server may have updated them since
+            prepared.headers.pop("Cookie", None)
+            template = self.__templates[name] = \
+                prepared, self.__session.merge_environment_settings(url, {}, None, None, None)
+        return template
+
+    def __prepare(self, template: PreparedRequest, body: dict | None) -> PreparedRequest:
+        prepared = template.copy()
+        prepared.prepare_cookies(self.__session.cookies)
+        if body is not None:
+            prepared.prepare_body(None, None, json=body)
+        return prepared
+
+    def _call(self, name: str, **fields) -> Any:
+        """Call an endpoint of `endpoints.ENDPOINTS`.
+
+        :param name: name of the endpoint
+        :type name: str
+        :param fields: fields of the body of the endpoint
+        :return: the values of the return keys of the endpoint, see `endpoints.unpack`
+        :rtype: Any
+        :raises ValueError: the fields do not match the body of the endpoint
+        :raises TypeError: a field cannot be converted to the type of the body, see `endpoints.build_body`
+        :raises JuejinError: the response is an error
+        """
+        endpoint = ENDPOINTS[name]
+        body = build_body(name, fields)
+        template, settings = self.__template(name)
+        ret_json = self.__coalesce(endpoint.method, template.url, body is not None, endpoint.idempotent,
+                                   lambda: self.__session.send(self.__prepare(template, body), **settings))
+        return unpack(ret_json, endpoint.return_keys)
+
     def is_checked_in(self) -> bool:
         """Get check in status.
 
         :return: True if checked in, False otherwise
         :rtype: bool
         """
-
-        @self._request_handler
-        def _inner():
-            return "https://api.juejin.cn/growth_api/v1/get_today_status"
-
-        return _inner()
+        return self._call("is_checked_in")
 
     def check_in(self) -> dict:
         """Check in."""
-
-        @self._request_handler(method="POST")
-        def _inner():
-            return "https://api.juejin.cn/growth_api/v1/check_in"
-
-        return _inner()
+        return self._call("check_in")
@@ -0,0 +1,142 @@
+from asyncio import Future, sleep
+from itertools import count
+from typing import Any
+
+from aiohttp import ClientError, ClientSession, TCPConnector
+
+from __init__ import JuejinError
+from endpoints import BASE_URL, ENDPOINTS, build_body, decode, unpack
+from throttle import MAX_ATTEMPTS, RETRY_STATUSES, backoff_delay, bucket_for, counters
+
+CONNECTION_LIMIT = 8  # Keep-alive connections per session
+
+
+class AsyncJuejinSession:
+    """Juejin session on asyncio, with the same methods as `JuejinSession` as coroutines.
+
+    Requests share a pool of keep-alive connections, so independent calls can be awaited together with
+    `asyncio.gather`. Pacing, retries and coalescing are the same as `JuejinSession`'s. Use it as an async context
+    manager, the connections are closed on exit::
+
+        async with AsyncJuejinSession(session_id) as session:
+            if not await session.is_checked_in():
+                await session.check_in()
+    """
+    BASE_URL = BASE_URL
+
+    def __init__(self, session_id: str, base_url: str = BASE_URL):
+        self.session_id = session_id
+        self.base_url = base_url
+        self.__session = None
+        self.__urls = {}  # Endpoint name -> URL
+        self.__in_flight = {}  # URL -> Future of the GET request in flight
+
+    @property
+    def session(self) -> ClientSession:
+        if self.__session is None:
+            raise RuntimeError(f"{type(self).__name__} is not opened, use it with `async with`")
+        return self.__session
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def open(self) -> None:
+        """Open the connection pool, called by `async with`.
+
+        :return: None
+        """
+        if self.__session is None:
+            self.__session = ClientSession(connector=TCPConnector(limit=CONNECTION_LIMIT),
+                                           cookies={"sessionid": self.session_id})
+
+    async def close(self) -> None:
+        """Close the connection pool, called by `async with`.
+
+        :return: None
+        """
+        if self.__session is not None:
+            await self.__session.close()
+            self.__session = None
+
+    async def __send(self, method: str, url: str, req_config: dict, idempotent: bool) -> dict:
+        # See `JuejinSession.__send`
+        for attempt in count(1):
+            await bucket_for(url).acquire_async()
+            counters.increment("requests")
+            try:
+                async with self.session.request(method, url, **req_config) as ret:
+                    if transient := ret.status in RETRY_STATUSES:
+                        counters.increment("throttle_responses")
+                    try:
+                        ret_json = decode(await ret.read())
+                    except ValueError:
+                        ret_json = None
+                        transient = True
+                    if not transient or not idempotent or attempt >= MAX_ATTEMPTS:
+                        if ret_json is None:
+                            raise JuejinError(await ret.text()) from None
+                        return ret_json
+            except ClientError:
+                if not idempotent or attempt >= MAX_ATTEMPTS:
+                    raise
+            counters.increment("retries")
+            await sleep(backoff_delay(attempt))
+
+    async def __coalesce(self, method: str, url: str, req_config: dict, idempotent: bool) -> dict:
+        # See `JuejinSession.__coalesce`
+        if method.upper() != "GET" or req_config:
+            return await self.__send(method, url, req_config, idempotent)
+
+        if (future := self.__in_flight.get(url)) is not None:
+            counters.increment("coalesced")
+            return await future
+        future = self.__in_flight[url] = Future()
+        try:
+            future.set_result(await self.__send(method, url, req_config, idempotent))
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            del self.__in_flight[url]
+        return future.result()
+
+    async def _request(self, url_path: str, method: str = "GET", return_keys=("data",), idempotent: bool = False,
+                       **req_config) -> Any:
+        # Same checks as `JuejinSession._request_handler`, `url_path` is relative to `base_url`
+        ret_json = await self.__coalesce(method, self.base_url + url_path, req_config, idempotent)
+        return unpack(ret_json, return_keys)
+
+    async def _call(self, name: str, **fields) -> Any:
+        """Call an endpoint of `endpoints.ENDPOINTS`, see `JuejinSession._call`.
+
+        :param name: name of the endpoint
+        :type name: str
+        :param fields: fields of the body of the endpoint
+        :return: the values of the return keys of the endpoint, see `endpoints.unpack`
+        :rtype: Any
+        :raises ValueError: the fields do not match the body of the endpoint
+        :raises TypeError: a field cannot be converted to the type of the body, see `endpoints.build_body`
+        :raises JuejinError: the response is an error
+        """
+        endpoint = ENDPOINTS[name]
+        body = build_body(name, fields)
+        if (url := self.__urls.get(name)) is None:
+            url = self.__urls[name] = self.base_url + endpoint.path
+        ret_json = await self.__coalesce(endpoint.method, url, {} if body is None else {"json": body},
+                                         endpoint.idempotent)
+        return unpack(ret_json, endpoint.return_keys)
+
+    async def is_checked_in(self) -> bool:
+        """Get check in status.
+
+        :return: True if checked in, False otherwise
+        :rtype: bool
+        """
+        return await self._call("is_checked_in")
+
+    async def check_in(self) -> dict:
+        """Check in."""
+        return await self._call("check_in")
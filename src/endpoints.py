@@ -0,0 +1,108 @@
+from json import loads as json_loads
+from typing import Any, Callable, Dict, NamedTuple, Tuple
+
+try:
+    from orjson import loads as orjson_loads
+except ImportError:  # Optional, the standard library decoder is used instead
+    orjson_loads = None
+
+from __init__ import JuejinError
+
+BASE_URL = "https://api.juejin.cn/growth_api/v1/"
+# Conversions made by `build_body`, (type of the value, type of the field) -> converter, e.g. IDs given as integers
+CONVERSIONS: Dict[Tuple[type, type], Callable[[Any], Any]] = {(int, str): str}
+
+
+class Endpoint(NamedTuple):
+    """An endpoint of the growth API, see `ENDPOINTS`."""
+    method: str
+    path: str  # Relative to the base URL of the session
+    body: Tuple[Tuple[str, type], ...] = ()  # Fields of the JSON body and their types, no body if empty
+    return_keys: Tuple[str, ...] = ("data",)
+    idempotent: bool = False  # Safe to retry, see `throttle`
+
+
+ENDPOINTS: Dict[str, Endpoint] = {
+    "is_checked_in": Endpoint("GET", "get_today_status", idempotent=True),
+    "check_in": Endpoint("POST", "check_in"),
+    "get_lottery_config": Endpoint("GET", "lottery_config/get", idempotent=True),
+    "get_lottery_history": Endpoint("POST", "lottery_history/global_small"),
+    "draw": Endpoint("POST", "lottery/draw"),
+    "get_luck": Endpoint("POST", "lottery_lucky/my_lucky", idempotent=True),  # Read only
+    "attract_luck": Endpoint("POST", "lottery_lucky/dip_lucky", body=(("lottery_history_id", str),)),
+}
+
+_loads: Callable[[bytes], Any] = orjson_loads or json_loads
+
+
+def set_json_backend(loads: Callable[[bytes], Any] | None = None) -> None:
+    """Set the function decoding the responses, orjson if it is installed or the standard library otherwise.
+
+    :param loads: takes the body of a response as bytes and raises ValueError if it is not JSON, None for the default
+    :type loads: Callable[[bytes], Any] | None
+    :return: None
+    """
+    global _loads
+    _loads = loads or orjson_loads or json_loads
+
+
+def decode(content: bytes) -> dict:
+    """Decode the body of a response with the JSON backend.
+
+    :param content: body of a response
+    :type content: bytes
+    :return: decoded body
+    :rtype: dict
+    :raises ValueError: not JSON
+    """
+    return _loads(content)
+
+
+def unpack(ret_json: dict, return_keys: Tuple[str, ...]) -> Any:
+    """Check a decoded response for errors and take the values of interest from it.
+
+    :param ret_json: decoded response
+    :type ret_json: dict
+    :param return_keys: keys of the values to return
+    :type return_keys: Tuple[str, ...]
+    :return: the value of the only key, or a list of the values of every key
+    :rtype: Any
+    :raises JuejinError: the response is an error
+    """
+    if ret_json["err_msg"] != "success":
+        raise JuejinError(f"error {ret_json['err_no']}: "
+                          f"{ret_json['err_msg'] if ret_json['err_msg'] else '<no message>'}")
+
+    if len(return_keys) == 1:
+        return ret_json[return_keys[0]]
+    return [ret_json[key] for key in return_keys]
+
+
+def build_body(name: str, fields: dict) -> dict | None:
+    """Check the fields of a call against the body of its endpoint. Only the conversions of `CONVERSIONS` are made,
+    e.g. an integer history ID is sent as a string.
+
+    :param name: name of the endpoint in `ENDPOINTS`
+    :type name: str
+    :param fields: fields of the body
+    :type fields: dict
+    :return: the JSON body, None if the endpoint has none
+    :rtype: dict | None
+    :raises ValueError: missing or unexpected fields
+    :raises TypeError: a field of another type that cannot be converted
+    """
+    schema = ENDPOINTS[name].body
+    if len(fields) != len(schema) or any(key not in fields for key, _ in schema):
+        raise ValueError(f"{name} expects the fields {[key for key, _ in schema]}, but got {list(fields)}")
+    if not schema:
+        return None
+
+    body = {}
+    for key, field_type in schema:
+        if not isinstance(value := fields[key], field_type):
+            # Looked up by the exact type, e.g. booleans are not converted as integers
+            if (converter := CONVERSIONS.get((type(value), field_type))) is None:
+                raise TypeError(f"{key} of {name} should be {field_type.__name__}, not {type(value).__name__}")
+            value = converter(value)
+        body[key] = value
+    return body
@@ -0,0 +1,52 @@
+from typing import Dict, List, Union
+
+from check_in.async_api import AsyncJuejinSession
+
+
+class AsyncLottery:
+    """`Lottery` on asyncio, the methods are coroutines on an `AsyncJuejinSession`."""
+
+    def __init__(self, juejin_session: AsyncJuejinSession):
+        self.session = juejin_session
+
+    async def get_config(self) -> Dict[str, Union[List[Dict[str, str]], int]]:
+        """Get lottery config.
+
+        :return: ID, name, type, image, and unlock count of every prize, the cost of a draw and the number of free draw.
+        :rtype: Dict[str, Union[List[Dict[str, str]], int]]
+        """
+        return await self.session._call("get_lottery_config")
+
+    async def get_history(self) -> dict:
+        """Get lottery history.
+
+        :return: User ID, history ID, username, user avatar, prize name, prize image and date of every record.
+        :rtype: Dict[str, List[Dict[str, str]]]
+        """
+        return await self.session._call("get_lottery_history")
+
+    async def draw(self) -> Dict[str, str]:
+        """Draw lottery.
+
+        :return: ID, lottery ID, name, type, image, description, history ID and luck of the draw.
+        :rtype: Dict[str, str]
+        """
+        return await self.session._call("draw")
+
+    async def get_luck(self) -> Dict[str, Union[str, int]]:
+        """Get luck; when the value of luck reaches 6000, you will win a Juejin merch!
+
+        :return: ID, user ID and luck.
+        ::rtype: Dict[str, Union[str, int]]
+        """
+        return await self.session._call("get_luck")
+
+    async def attract_luck(self, lottery_history_id: str) -> Dict[str, Union[int, bool]]:
+        """Attract luck from others who had won a prize. You can do this at most once a day.
+
+        :param lottery_history_id: ID of the record you want to attract luck from.
+        :type lottery_history_id: str
+        :return: Your luck and the luck you have attracted.
+        ::rtype: Dict[str, Union[int, bool]]
+        """
+        return await self.session._call("attract_luck", lottery_history_id=lottery_history_id)
@@ -1,21 +1,27 @@
 if __name__ == "__main__":
+    from asyncio import gather, run
     from random import choice
 
     from __init__ import session_id
-    from api import Lottery
-    from check_in.api import JuejinSession
+    from async_api import AsyncLottery
+    from check_in.async_api import AsyncJuejinSession
 
-    lottery = Lottery(JuejinSession(session_id))
-    lottery_config = lottery.get_config()
-    # You will get a free draw every day after check-in
-    for _ in range(lottery_config["free_count"]):
-        # By default, it only draw a lottery when it does not cost any points
-        result = lottery.draw()
-        print("You win a", result['lottery_name'])
+    async def main():
+        async def _draw_free():
+            # You will get a free draw every day after check-in
+            for _ in range((await lottery.get_config())["free_count"]):
+                # By default, it only draw a lottery when it does not cost any points
+                result = await lottery.draw()
+                print("You win a", result['lottery_name'])
 
-    lottery_history = lottery.get_history()["lotteries"]
-    random_record = choice(lottery_history)["history_id"]
-    lottery.attract_luck(random_record)
+        async with AsyncJuejinSession(session_id) as session:
+            lottery = AsyncLottery(session)
+            # The global history does not depend on the draws, it is fetched meanwhile
+            _, lottery_history = await gather(_draw_free(), lottery.get_history())
+            random_record = choice(lottery_history["lotteries"])["history_id"]
+            await lottery.attract_luck(random_record)
 
-    luck = lottery.get_luck()["total_value"]
-    print(f"\nYour luck is {luck}. {'Claim your prize right now!' if luck >= 6000 else ''}")
+            luck = (await lottery.get_luck())["total_value"]
+            print(f"\nYour luck is {luck}. {'Claim your prize right now!' if luck >= 6000 else ''}")
+
+    run(main())
@@ -0,0 +1,129 @@
+from asyncio import Semaphore, gather
+from hashlib import blake2b
+from random import choice
+from time import perf_counter
+from typing import List, TextIO
+
+from check_in.async_api import AsyncJuejinSession
+from lottery.async_api import AsyncLottery
+from throttle import counters
+
+DEFAULT_CONCURRENCY = 8
+
+
+def read_session_ids(file: TextIO) -> List[str]:
+    """Read session IDs, one per line. Blank lines and lines starting with '#' are skipped.
+
+    :param file: file opened in text mode
+    :type file: TextIO
+    :return: session IDs, in order
+    :rtype: List[str]
+    """
+    return [line.strip() for line in file if line.strip() and not line.lstrip().startswith("#")]
+
+
+def account_name(session_id: str) -> str:
+    """Short name of an account for logs and summaries, the session ID itself is a secret.
+
+    :param session_id: session ID
+    :type session_id: str
+    :return: hex digest
+    :rtype: str
+    """
+    return blake2b(session_id.encode(), digest_size=4).hexdigest()
+
+
+async def run_account(session_id: str, semaphore: Semaphore, base_url: str = AsyncJuejinSession.BASE_URL) -> dict:
+    """Check in, draw the free lotteries and attract luck for an account, as the daily scripts do. An error only stops
+    the account it happens to, it is recorded in the summary.
+
+    :param session_id: session ID
+    :type session_id: str
+    :param semaphore: bounds the accounts run at once
+    :type semaphore: Semaphore
+    :param base_url: see `AsyncJuejinSession`
+    :type base_url: str
+    :return: summary of the account
+    :rtype: dict
+    """
+    summary = {"account": account_name(session_id), "ok": False, "checked_in": None, "prizes": [], "luck": None,
+               "error": None}
+    async with semaphore:
+        start_time = perf_counter()
+        try:
+            async with AsyncJuejinSession(session_id, base_url) as session:
+                lottery = AsyncLottery(session)
+                if not await session.is_checked_in():
+                    await session.check_in()
+                    summary["checked_in"] = "now"
+                else:
+                    summary["checked_in"] = "already"
+
+                async def _draw_free():
+                    for _ in range((await lottery.get_config())["free_count"]):
+                        summary["prizes"].append((await lottery.draw())["lottery_name"])
+
+                _, lottery_history = await gather(_draw_free(), lottery.get_history())
+                await lottery.attract_luck(choice(lottery_history["lotteries"])["history_id"])
+                summary["luck"] = (await lottery.get_luck())["total_value"]
+                summary["ok"] = True
+        except Exception as e:
+            summary["error"] = f"{type(e).__name__}: {e}"
+        summary["seconds"] = perf_counter() - start_time
+    return summary
+
+
+async def run_accounts(session_ids: List[str], concurrency: int = DEFAULT_CONCURRENCY,
+                       base_url: str = AsyncJuejinSession.BASE_URL) -> List[dict]:
+    """Run `run_account` for every account, `concurrency` accounts at a time. Every account has its own session and
+    connection pool.
+
+    :param session_ids: session IDs
+    :type session_ids: List[str]
+    :param concurrency: number of accounts run at once
+    :type concurrency: int
+    :param base_url: see `AsyncJuejinSession`
+    :type base_url: str
+    :return: summary of every account, in the order of `session_ids`
+    :rtype: List[dict]
+    :raises ValueError: non-positive `concurrency`
+    """
+    if concurrency < 1:
+        raise ValueError(f"concurrency should be a positive integer, not {concurrency}")
+
+    semaphore = Semaphore(concurrency)
+    return list(await gather(*(run_account(session_id, semaphore, base_url) for session_id in session_ids)))
+
+
+if __name__ == "__main__":
+    from argparse import ArgumentParser
+    from asyncio import run
+    from json import dumps
+    from sys import stderr, stdin, stdout
+
+    parser = ArgumentParser(description="Check in, draw and attract luck for many accounts at once.")
+    parser.add_argument("session_ids", nargs="?", default="-",
+                        help="file of session IDs, one per line, standard input if omitted")
+    parser.add_argument("--concurrency", type=int, default=DEFAULT_CONCURRENCY, help="accounts run at once")
+    parser.add_argument("--output", help="JSON lines summary to write, standard output if omitted")
+    args = parser.parse_args()
+
+    if args.session_ids == "-":
+        ids = read_session_ids(stdin)
+    else:
+        with open(args.session_ids) as ids_file:
+            ids = read_session_ids(ids_file)
+
+    run_start = perf_counter()
+    summaries = run(run_accounts(ids, args.concurrency))
+    output = open(args.output, "w") if args.output else stdout
+    for account_summary in summaries:
+        output.write(dumps(account_summary, ensure_ascii=False, separators=(",", ":")) + "\n")
+    if output is not stdout:
+        output.close()
+
+    failed = sum(not account_summary["ok"] for account_summary in summaries)
+    print(f"{len(summaries)} account(s) in {perf_counter() - run_start:.1f}s, {failed} failed", file=stderr)
+    print(", ".join(f"{name}: {value}" for name, value in counters.as_dict().items()), file=stderr)
+    if failed:
+        exit(1)
@@ -3,18 +3,24 @@ from typing import List
 from urllib.parse import urljoin
 
 from jwt import decode
-from requests import post, get
+from requests import Session
 
 from __init__ import JuejinError
+from throttle import bucket_for, counters
 
 
 class JuejinGameSession:
-    """Juejin game session."""
+    """Juejin game session.
+
+    Requests go through a `requests.Session`, so the connections to the game server are kept alive from one level to
+    the next instead of being opened for every request. It may be used by one thread at a time.
+    """
     BASE_URL = "https://juejin-game.bytedance.com/game/num-puzz/ugc/"
     GET_TOKEN_URL = "https://juejin.cn/get/token"
 
     def __init__(self, session_id: str):
         self.session_id = session_id
+        self.__session = Session()
         self.token = self.__get_token_from_session_id()
         self.uid = self.__get_uid_from_token()
         self.headers = {
@@ -25,8 +31,21 @@ class JuejinGameSession:
             "time": int(time() * 1000)  # Millisecond timestamp
         }
 
+    @property
+    def session(self) -> Session:
+        return self.__session
+
+    def close(self) -> None:
+        """Close the pooled connections.
+
+        :return: None
+        """
+        self.__session.close()
+
     def __get_token_from_session_id(self) -> str:
-        response = get(self.GET_TOKEN_URL, cookies={
+        bucket_for(self.GET_TOKEN_URL).acquire()
+        counters.increment("requests")
+        response = self.__session.get(self.GET_TOKEN_URL, cookies={
             "sessionid": self.session_id
         }).json()
         try:
@@ -47,10 +66,14 @@ class JuejinGameSession:
         if data is None:
             data = {}
 
-        response = post(urljoin(self.BASE_URL, url_path),
-                        headers=self.headers,
-                        params=self.params,
-                        json=data).json()
+        # Paced but never retried, neither starting nor completing a level is idempotent
+        url = urljoin(self.BASE_URL, url_path)
+        bucket_for(url).acquire()
+        counters.increment("requests")
+        response = self.__session.post(url,
+                                       headers=self.headers,
+                                       params=self.params,
+                                       json=data).json()
         try:
             return response["data"]
         except KeyError:
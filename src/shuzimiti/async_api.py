@@ -0,0 +1,116 @@
+from time import time
+from typing import List
+from urllib.parse import urljoin
+
+from aiohttp import ClientSession, TCPConnector
+from jwt import decode
+
+from __init__ import JuejinError
+from throttle import bucket_for, counters
+
+CONNECTION_LIMIT = 8  # Keep-alive connections per session
+
+
+class AsyncJuejinGameSession:
+    """`JuejinGameSession` on asyncio, the methods are coroutines sharing a pool of keep-alive connections.
+
+    The token is fetched when the session is opened, use it as an async context manager::
+
+        async with AsyncJuejinGameSession(session_id) as session:
+            data = await session.fetch_level_data()
+    """
+    BASE_URL = "https://juejin-game.bytedance.com/game/num-puzz/ugc/"
+    GET_TOKEN_URL = "https://juejin.cn/get/token"
+
+    def __init__(self, session_id: str, base_url: str = BASE_URL, get_token_url: str = GET_TOKEN_URL):
+        self.session_id = session_id
+        self.base_url = base_url
+        self.get_token_url = get_token_url
+        self.token = None
+        self.uid = None
+        self.headers = None
+        self.params = None
+        self.__session = None
+
+    async def __aenter__(self):
+        await self.open()
+        return self
+
+    async def __aexit__(self, exc_type, exc_val, exc_tb):
+        await self.close()
+
+    async def open(self) -> None:
+        """Open the connection pool and log in, called by `async with`.
+
+        :return: None
+        :raises JuejinError: the token cannot be fetched
+        :raises ValueError: invalid token
+        """
+        if self.__session is not None:
+            return
+        self.__session = ClientSession(connector=TCPConnector(limit=CONNECTION_LIMIT))
+        try:
+            self.token = await self.__get_token_from_session_id()
+            self.uid = self.__get_uid_from_token()
+        except BaseException:
+            await self.close()
+            raise
+        self.headers = {
+            "authorization": "Bearer " + self.token
+        }
+        self.params = {
+            "uid": self.uid,
+            "time": int(time() * 1000)  # Millisecond timestamp
+        }
+
+    async def close(self) -> None:
+        """Close the connection pool, called by `async with`.
+
+        :return: None
+        """
+        if self.__session is not None:
+            await self.__session.close()
+            self.__session = None
+
+    async def __get_token_from_session_id(self) -> str:
+        await bucket_for(self.get_token_url).acquire_async()
+        counters.increment("requests")
+        async with self.__session.get(self.get_token_url, cookies={"sessionid": self.session_id}) as response:
+            response = await response.json(content_type=None)
+        try:
+            return response["data"]
+        except KeyError:
+            raise JuejinError(response["err_msg"]) from None  # Suppress the context being printed
+
+    def __get_uid_from_token(self) -> str:
+        # See `JuejinGameSession.__get_uid_from_token`
+        try:
+            return decode(self.token, options={"verify_signature": False})["userId"]
+        except Exception:
+            raise ValueError("invalid token") from None
+
+    async def __post_request_handler(self, url_path: str, data: dict | None = None) -> dict:
+        if self.__session is None:
+            raise RuntimeError(f"{type(self).__name__} is not opened, use it with `async with`")
+        if data is None:
+            data = {}
+
+        # See `JuejinGameSession.__post_request_handler`
+        url = urljoin(self.base_url, url_path)
+        await bucket_for(url).acquire_async()
+        counters.increment("requests")
+        async with self.__session.post(url, headers=self.headers, params=self.params, json=data) as response:
+            response = await response.json(content_type=None)
+        try:
+            return response["data"]
+        except KeyError:
+            # Suppress the context being printed
+            raise JuejinError(response["message"]) from None
+
+    async def fetch_level_data(self) -> dict:
+        return await self.__post_request_handler("start")
+
+    async def submit_level(self, commands: List[list]) -> dict:
+        return await self.__post_request_handler("complete", {
+            "command": commands
+        })
@@ -0,0 +1,184 @@
+from glob import glob
+from json import JSONDecodeError, dumps, load, loads
+from multiprocessing import Pool
+from os import path
+from sys import stderr
+from time import monotonic, perf_counter
+from typing import Generator, Iterable, TextIO, Tuple
+
+from cache import board_key
+from solve import GaveUp, make_puzzle, solve, to_commands
+from stats import SolverStats
+
+DEFAULT_STRATEGIES = ("beam", "astar")  # Same as `script.py`, add "integrated" with `--strategies`
+
+
+def read_levels(source: str | TextIO) -> Generator[dict, None, None]:
+    """Read level data (`JuejinGameSession.fetch_level_data` payloads) lazily. Files and lines that are not valid JSON
+    are reported on the standard error and skipped, the levels after them are still read.
+
+    :param source: directory of JSON files (one payload each, read in name order), JSON lines file, or a stream of
+        JSON lines
+    :type source: str | TextIO
+    :return: A generator, yield a level a time
+    :rtype: Generator[dict, None, None]
+    """
+    if isinstance(source, str) and path.isdir(source):
+        for file_path in sorted(glob(path.join(source, "*.json"))):
+            with open(file_path) as file:
+                try:
+                    level = load(file)
+                except JSONDecodeError as e:
+                    print(f"Skipping {file_path}: {e}", file=stderr)
+                    continue
+            yield level
+        return
+
+    file = open(source) if isinstance(source, str) else source
+    name = getattr(file, "name", "<stream>")
+    try:
+        for line_number, line in enumerate(file, 1):
+            if line.strip():
+                try:
+                    level = loads(line)
+                except JSONDecodeError as e:
+                    print(f"Skipping line {line_number} of {name}: {e}", file=stderr)
+                    continue
+                yield level
+    finally:
+        if file is not source:
+            file.close()
+
+
+# noinspection PyTypeHints
+def solve_level(level: dict, strategies: Tuple[str, ...] = DEFAULT_STRATEGIES, budget: float | None = None) -> dict:
+    """Solve a level in this process.
+
+    :param level: level data, with `map`, `target` and `round`
+    :type level: dict
+    :param strategies: see `solve.solve`
+    :type strategies: Tuple[str, ...]
+    :param budget: seconds before giving up, never if None
+    :type budget: float | None
+    :return: outcome ("solved", "gave_up" or "unsolvable"), the commands in the form `JuejinGameSession.submit_level`
+        takes (None if not solved), the solver stats and the seconds taken; `error` is None, see `solve_levels`
+    :rtype: dict
+    """
+    puzzle = make_puzzle(level["map"], level["target"])
+    stats = SolverStats()
+    start_time = perf_counter()
+    solution = solve(puzzle, strategies=strategies, deadline=None if budget is None else monotonic() + budget,
+                     stats=stats)
+    seconds = perf_counter() - start_time
+
+    result = {
+        "round": level.get("round"),
+        "key": board_key(level["map"], level["target"]),
+        "outcome": "solved",
+        "commands": None,
+        "plan": None,
+        "strategy": None,
+        "seconds": seconds,
+        "stats": stats.as_dict(),
+        "error": None
+    }
+    if solution is None:
+        result["outcome"] = "unsolvable"
+    elif isinstance(solution, GaveUp):
+        result["outcome"] = "gave_up"
+    else:
+        result["commands"] = to_commands(puzzle, solution.moves)
+        result["plan"] = solution.plan
+        result["strategy"] = solution.strategy
+    return result
+
+
+def _solve_level(arguments: Tuple[dict, Tuple[str, ...], float | None]) -> Tuple[dict, dict]:
+    level, strategies, budget = arguments
+    start_time = perf_counter()
+    try:
+        return level, solve_level(level, strategies, budget)
+    except Exception as e:
+        # A malformed level only fails itself, the others are still solved
+        try:
+            key = board_key(level["map"], level["target"])
+        except Exception:
+            key = None
+        return level, {"round": level.get("round") if isinstance(level, dict) else None, "key": key,
+                       "outcome": "error", "commands": None, "plan": None, "strategy": None,
+                       "seconds": perf_counter() - start_time, "stats": None, "error": f"{type(e).__name__}: {e}"}
+
+
+# noinspection PyTypeHints
+def solve_levels(levels: Iterable[dict], workers: int = 1, strategies: Iterable[str] = DEFAULT_STRATEGIES,
+                 budget: float | None = None, ordered: bool = True) -> Generator[Tuple[dict, dict], None, None]:
+    """Solve levels in parallel with `solve_level`, each in a fresh worker process, so that the `peak_rss` of the stats
+    is the one of the level. A level raising an error gets the outcome "error" and the message in `error`, the other
+    levels are not affected.
+
+    :param levels: level data
+    :type levels: Iterable[dict]
+    :param workers: number of worker processes
+    :type workers: int
+    :param strategies: see `solve.solve`
+    :type strategies: Iterable[str]
+    :param budget: seconds per level, unlimited if None
+    :type budget: float | None
+    :param ordered: yield in the order of `levels`, otherwise as soon as each level is done
+    :type ordered: bool
+    :return: A generator, yield a level and its result a time
+    :rtype: Generator[Tuple[dict, dict], None, None]
+    :raises ValueError: non-positive `workers`
+    """
+    if workers < 1:
+        raise ValueError(f"workers should be a positive integer, not {workers}")
+
+    strategies = tuple(strategies)
+    tasks = ((level, strategies, budget) for level in levels)
+    with Pool(workers, maxtasksperchild=1) as pool:
+        yield from (pool.imap if ordered else pool.imap_unordered)(_solve_level, tasks)
+
+
+if __name__ == "__main__":
+    from argparse import ArgumentParser
+    from os import cpu_count
+    from sys import stdin, stdout
+
+    from cache import SolutionCache
+
+    parser = ArgumentParser(description="Solve levels offline, one JSON line of commands and stats per level.")
+    parser.add_argument("source", nargs="?", default="-",
+                        help="directory of JSON files or JSON lines file of level data, standard input if omitted")
+    parser.add_argument("--output", help="JSON lines file to write, standard output if omitted")
+    parser.add_argument("--workers", type=int, default=cpu_count() or 1)
+    parser.add_argument("--strategies", nargs="+", default=list(DEFAULT_STRATEGIES))
+    parser.add_argument("--budget", type=float, help="seconds per level, unlimited if omitted")
+    parser.add_argument("--unordered", action="store_true", help="write each level as soon as it is solved")
+    parser.add_argument("--cache", help="solution cache to store the commands in, see `cache.SolutionCache`")
+    args = parser.parse_args()
+
+    output = open(args.output, "w") if args.output else stdout
+    cache = SolutionCache(args.cache) if args.cache else None
+    counts = {"solved": 0, "gave_up": 0, "unsolvable": 0, "error": 0}
+    run_start = perf_counter()
+    try:
+        for solved_level, level_result in solve_levels(read_levels(stdin if args.source == "-" else args.source),
+                                                       args.workers, args.strategies, args.budget,
+                                                       not args.unordered):
+            output.write(dumps(level_result, separators=(",", ":")) + "\n")
+            output.flush()
+            counts[level_result["outcome"]] += 1
+            if cache is not None and level_result["commands"] is not None:
+                cache.put(solved_level["map"], solved_level["target"], level_result["commands"],
+                          solved_level.get("round"))
+    finally:
+        if output is not stdout:
+            output.close()
+        if cache is not None:
+            cache.close()
+
+    elapsed = perf_counter() - run_start
+    total = sum(counts.values())
+    print(f"{total} level(s) in {elapsed:.1f}s ({total / elapsed if elapsed else 0:.2f} levels/s): "
+          f"{counts['solved']} solved, {counts['gave_up']} gave up, {counts['unsolvable']} unsolvable, "
+          f"{counts['error']} error(s)", file=stderr)
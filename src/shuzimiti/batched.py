@@ -0,0 +1,235 @@
+from contextlib import nullcontext
+from typing import Callable, Literal
+
+from geometry import feasible_components, slide_components
+from number_puzzle import BaseNumberPuzzle, Direction, NumberPuzzle
+from stats import SolverStats
+
+try:
+    import numpy as np
+except ImportError:  # Optional, only needed by `batched_bfs`
+    np = None
+
+# Cell codes, numbers are coded from NUMBER onwards through a value table
+BLANK = 0
+OBSTACLE = 1
+SYMBOL_TO_CODE = {0.3: 2, 0.4: 3, 0.5: 4, 0.6: 5}
+NUMBER = 6
+CHUNK_STATES = 1 << 15  # States expanded at once, bounds the size of the temporary arrays
+ZOBRIST_SEED = 0x5EED
+INT64_MAX = (1 << 63) - 1
+
+
+def _zobrist_table(cells: int, codes: int):
+    # Fixed random keys per (cell, code) from a splitmix64 stream, blank cells hash to 0
+    state = (np.arange(cells * codes, dtype=np.uint64) + np.uint64(ZOBRIST_SEED)) * np.uint64(0x9E3779B97F4A7C15)
+    state ^= state >> np.uint64(30)
+    state *= np.uint64(0xBF58476D1CE4E5B9)
+    state ^= state >> np.uint64(27)
+    state *= np.uint64(0x94D049BB133111EB)
+    state ^= state >> np.uint64(31)
+    table = state.reshape(cells, codes)
+    table[:, BLANK] = 0
+    return table
+
+
+def _destinations(boards, length: int, width: int, direction: Direction):
+    # Flat index each cell would slide to in `direction`, for every board at once
+    grid = (boards != BLANK).reshape(-1, width, length)
+    if direction in (Direction.LEFT, Direction.RIGHT):
+        axis, size = 2, length
+        positions = np.arange(length).reshape(1, 1, length)
+    else:
+        axis, size = 1, width
+        positions = np.arange(width).reshape(1, width, 1)
+
+    if direction in (Direction.LEFT, Direction.UP):
+        # Nearest blocker strictly before each cell, the piece stops right after it
+        blockers = np.where(grid, positions, -1)
+        blockers = np.concatenate((np.full_like(np.take(blockers, [0], axis), -1),
+                                   np.take(blockers, range(size - 1), axis)), axis)
+        stops = np.maximum.accumulate(blockers, axis) + 1
+    else:
+        # Nearest blocker strictly after each cell, the piece stops right before it
+        blockers = np.flip(np.where(grid, positions, size), axis)
+        blockers = np.concatenate((np.full_like(np.take(blockers, [0], axis), size),
+                                   np.take(blockers, range(size - 1), axis)), axis)
+        stops = np.flip(np.minimum.accumulate(blockers, axis), axis) - 1
+
+    ys = np.arange(width).reshape(1, width, 1)
+    xs = np.arange(length).reshape(1, 1, length)
+    if axis == 2:
+        return (ys * length + stops).reshape(len(boards), -1)
+    return (stops * length + xs).reshape(len(boards), -1)
+
+
+# noinspection PyTypeHints
+def batched_bfs(puzzle: BaseNumberPuzzle, val1: int, symbol: Literal[0.3, 0.4, 0.5, 0.6, 0.7], val2: int,
+                second_try: bool = False, interrupt: Callable[[], bool] | None = None,
+                max_depth: int | None = None, stats: SolverStats | None = None) -> bool:
+    """Same search as `solve.bfs` with the "bfs" strategy, but a whole layer is expanded at once with NumPy. Meant for
+    wide levels whose layers grow to hundreds of thousands of states. The moves found are applied to `puzzle`.
+
+    Each layer is a 2-D array of flattened boards. Slides, merges and Zobrist hashes of every piece in every direction
+    are computed as array operations, duplicates are dropped with `np.unique`. As in `solve.bfs`, any other calculation
+    than `val1 symbol val2` prunes the state, so the values on the board never change during the search.
+
+    :param puzzle: A puzzle
+    :type puzzle: BaseNumberPuzzle
+    :param val1: left operand
+    :type val1: int
+    :param symbol: operator
+    :type symbol: Literal[0.3, 0.4, 0.5, 0.6, 0.7]
+    :param val2: right operand
+    :type val2: int
+    :param second_try: move every piece instead of only the pieces involved in the calculation
+    :type second_try: bool
+    :param interrupt: called once per layer, the search gives up once it returns True
+    :type interrupt: Callable[[], bool] | None
+    :param max_depth: most moves the calculation may take, unlimited if None
+    :type max_depth: int | None
+    :param stats: see `solve.bfs`, the states of a layer are counted as expanded at once and the layer is the frontier
+    :type stats: SolverStats | None
+    :return: True if the calculation is performed, False otherwise
+    :rtype: bool
+    :raises ImportError: NumPy is not installed
+    """
+    if np is None:
+        raise ImportError("the batched engine requires numpy, install it with `pip install numpy`")
+    if stats is not None and not second_try:
+        stats.searches += 1
+
+    length, width = puzzle.LENGTH, puzzle.WIDTH
+    components = slide_components(puzzle)
+    if not (feasible := feasible_components(puzzle, val1, symbol, val2, components)):
+        return False
+
+    # Code the board, numbers index into `values`
+    flat = [item for row in puzzle.puzzle for item in row]
+    numbers = sorted({item for item in flat if NumberPuzzle.is_number(item)})
+    # The values never change during the search, Python integers are only needed for numbers beyond 64 bits
+    values = np.zeros(NUMBER + len(numbers), dtype=np.int64 if not numbers or numbers[-1] <= INT64_MAX else object)
+    values[NUMBER:] = numbers
+    number_codes = {number: NUMBER + index for index, number in enumerate(numbers)}
+
+    def _code(item):
+        if NumberPuzzle.is_number(item):
+            return number_codes[item]
+        if NumberPuzzle.is_obstacle(item):
+            return OBSTACLE
+        return SYMBOL_TO_CODE.get(item, BLANK)
+
+    dtype = np.uint8 if len(values) <= 1 << 8 else np.uint16
+    start = np.array([[_code(item) for item in flat]], dtype=dtype)
+    in_feasible = np.array([component in feasible for component in components])
+    if second_try:
+        movable_codes = np.arange(OBSTACLE + 1, len(values))
+    else:
+        movable_codes = np.array([number_codes[val1], number_codes[val2]] +
+                                 ([SYMBOL_TO_CODE[symbol]] if symbol in SYMBOL_TO_CODE else []))
+    # Goal operands in codes, the mirror is accepted for commutative symbols
+    goals = {(number_codes[val1], number_codes[val2])}
+    if symbol in (0.3, 0.5):  # + and *
+        goals.add((number_codes[val2], number_codes[val1]))
+    goal_symbol = SYMBOL_TO_CODE.get(symbol, BLANK)  # BLANK stands for concatenation
+
+    zobrist = _zobrist_table(length * width, len(values))
+    cells = np.arange(length * width)
+    visited = np.bitwise_xor.reduce(zobrist[cells, start.astype(np.intp)], axis=1)
+    layer, hashes = start, visited
+    parents = []  # Per layer, index of the parent of each state in the previous layer
+    records = []  # Per layer, encoded move (`encode_history_record`) that leads to each state
+    y_bits = width.bit_length()
+
+    with nullcontext() if stats is None else stats.phase("search"):
+        while len(layer) and (max_depth is None or len(records) < max_depth):
+            if stats is not None:
+                stats.expanded += len(layer)
+                stats.frontier_peak = max(stats.frontier_peak, len(layer))
+                stats.sample()
+            if interrupt is not None and interrupt():
+                return False
+
+            child_parents, child_cells, child_destinations, child_records = [], [], [], []
+            for chunk_start in range(0, len(layer), CHUNK_STATES):
+                boards = layer[chunk_start:chunk_start + CHUNK_STATES]
+                state_index, cell = np.nonzero(np.isin(boards, movable_codes) & in_feasible)
+                value = boards[state_index, cell].astype(np.intp)
+                x, y = cell % length, cell // length
+                for direction in Direction:
+                    destination = _destinations(boards, length, width, direction)[state_index, cell]
+                    changed = destination != cell
+                    if direction in (Direction.LEFT, Direction.RIGHT):
+                        # Merges, see `NumberPuzzle.move`; the cells ahead of the destination are never the vacated one
+                        step = 1 if direction == Direction.RIGHT else -1
+                        x_after = destination % length
+                        near_x, far_x = x_after + step, x_after + 2 * step
+                        near_ok = (near_x >= 0) & (near_x < length)
+                        far_ok = (far_x >= 0) & (far_x < length)
+                        last_cell = length * width - 1
+                        near = np.where(near_ok, boards[state_index, np.clip(destination + step, 0, last_cell)],
+                                        BLANK)
+                        far = np.where(far_ok, boards[state_index, np.clip(destination + 2 * step, 0, last_cell)],
+                                       BLANK)
+                        near, far = near.astype(np.intp), far.astype(np.intp)
+                        is_number = value >= NUMBER
+                        concat = is_number & near_ok & (near >= NUMBER)
+                        evaluate = is_number & ~concat & far_ok & (near >= SYMBOL_TO_CODE[0.3]) & (near < NUMBER) & \
+                            (far >= NUMBER)
+                        left, right = (value, far) if step == 1 else (far, value)
+                        left = np.where(concat, value if step == 1 else near, left)
+                        right = np.where(concat, near if step == 1 else value, right)
+                        # Calculations that raise ArithmeticError leave the pieces as they are
+                        left_value, right_value = values[left], values[right]
+                        divisible = (right_value != 0) & (left_value % np.where(right_value == 0, 1, right_value) == 0)
+                        evaluate &= np.where(near == SYMBOL_TO_CODE[0.4], left_value >= right_value, True) & \
+                            np.where(near == SYMBOL_TO_CODE[0.6], divisible, True)
+                        merged = concat | evaluate
+                        merged_symbol = np.where(concat, BLANK, near)
+                        is_goal = merged & (merged_symbol == goal_symbol) & \
+                            np.any([(left == a) & (right == b) for a, b in goals], axis=0)
+                        if is_goal.any():
+                            hit = np.flatnonzero(is_goal)[0]
+                            path = [int(x[hit]) << (y_bits + 2) | int(y[hit]) << 2 | direction.value]
+                            node = chunk_start + int(state_index[hit])
+                            for depth in range(len(records) - 1, -1, -1):
+                                path.append(int(records[depth][node]))
+                                node = int(parents[depth][node])
+                            for record in reversed(path):
+                                puzzle.move(*puzzle.decode_history_record(record))
+                            return True
+                        changed &= ~merged  # Any other calculation consumes pieces that the remaining steps rely on
+                    child_parents.append(chunk_start + state_index[changed])
+                    child_cells.append(cell[changed])
+                    child_destinations.append(destination[changed])
+                    child_records.append(x[changed] << (y_bits + 2) | y[changed] << 2 | direction.value)
+
+            child_parents = np.concatenate(child_parents)
+            child_cells = np.concatenate(child_cells)
+            child_destinations = np.concatenate(child_destinations)
+            moved = layer[child_parents, child_cells].astype(np.intp)
+            child_hashes = hashes[child_parents] ^ zobrist[child_cells, moved] ^ zobrist[child_destinations, moved]
+
+            # Keep the first occurrence of every new state, in generation order so that the search is deterministic
+            unique_hashes, first = np.unique(child_hashes, return_index=True)
+            first = np.sort(first[~np.isin(unique_hashes, visited, assume_unique=True)])
+            if stats is not None:
+                stats.generated += len(child_hashes)
+                stats.deduplicated += len(child_hashes) - len(first)
+            child_hashes = child_hashes[first]
+            visited = np.union1d(visited, child_hashes)
+
+            children = layer[child_parents[first]]
+            rows = np.arange(len(first))
+            children[rows, child_cells[first]] = BLANK
+            children[rows, child_destinations[first]] = moved[first]
+            parents.append(child_parents[first])
+            records.append(np.concatenate(child_records)[first])
+            layer, hashes = children, child_hashes
+
+    if second_try:
+        return False
+    if stats is not None:
+        stats.second_tries += 1
+    return batched_bfs(puzzle, val1, symbol, val2, second_try=True, interrupt=interrupt, max_depth=max_depth,
+                       stats=stats)
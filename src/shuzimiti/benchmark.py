@@ -0,0 +1,473 @@
+from json import dumps, loads
+from multiprocessing import Pool
+from random import Random
+from statistics import median
+from time import monotonic, perf_counter
+from typing import Dict, Iterable, List, Tuple
+
+from cache import board_key
+from compact_puzzle import CompactNumberPuzzle
+from number_puzzle import BaseNumberPuzzle, Direction, NumberPuzzle
+from solve import GaveUp, find_valid_calculations, make_puzzle, solve
+from stats import SolverStats
+
+PLAN_LIMIT = 10000  # Plans enumerated per level at most, to time `find_valid_calculations`
+ENGINES = (NumberPuzzle, CompactNumberPuzzle)  # Compared by the "engines" command, see `solve.make_puzzle`
+
+
+class _LinearScanNumberPuzzle(NumberPuzzle):
+    """`NumberPuzzle` with the cell by cell destination scan it used before the blocker indexes, kept as a baseline."""
+
+    # noinspection PyTypeHints
+    def _NumberPuzzle__find_destination_and_move(self, x: int, y: int, direction: Direction) -> Tuple[int, int]:
+        is_increasing = direction in (Direction.RIGHT, Direction.DOWN)
+        is_moving_horizontally = direction in (Direction.LEFT, Direction.RIGHT)
+        if is_increasing:
+            start = x + 1 if is_moving_horizontally else y + 1
+            stop = self.LENGTH if is_moving_horizontally else self.WIDTH
+            step = 1
+        else:
+            start = x - 1 if is_moving_horizontally else y - 1
+            stop = -1
+            step = -1
+
+        loc = None
+        for loc in range(start, stop, step):
+            val_at_loc = self[loc, y] if is_moving_horizontally else self[x, loc]
+            if not self.is_blank(val_at_loc):
+                loc -= step
+                break
+
+        if loc is None or (loc == x if is_moving_horizontally else loc == y):
+            return x, y
+        if is_moving_horizontally:
+            self._NumberPuzzle__move_piece(x, y, loc, y)
+            return loc, y
+        else:
+            self._NumberPuzzle__move_piece(x, y, x, loc)
+            return x, loc
+
+
+def generate_wide_board(length: int, width: int = 4, density: float = 0.02, seed: int = 0) -> List[List[int | float]]:
+    """Generate a sparse board with `width` rows and `length` columns.
+
+    :param length: number of columns
+    :type length: int
+    :param width: number of rows
+    :type width: int
+    :param density: probability of a cell being occupied
+    :type density: float
+    :param seed: random seed
+    :type seed: int
+    :return: A board in the form of `NumberPuzzle.puzzle`
+    :rtype: List[List[int | float]]
+    """
+    rng = Random(seed)
+    board = [[0.1] * length for _ in range(width)]
+    for row in board:
+        for x in range(length):
+            if rng.random() < density:
+                row[x] = rng.choice((0.2, 0.3, 0.4, 0.5, 0.6, *range(1, 10)))
+    board[0][0] = 1  # At least one piece
+    return board
+
+
+def expansions_per_second(puzzle: BaseNumberPuzzle, duration: float = 1.0) -> float:
+    """Repeatedly expand every piece in every direction (move and undo) of `puzzle`, as `solve.bfs` does.
+
+    :param puzzle: A puzzle
+    :type puzzle: BaseNumberPuzzle
+    :param duration: minimum seconds to run
+    :type duration: float
+    :return: number of expansions per second
+    :rtype: float
+    """
+    pieces = [coordinate for coordinates in puzzle.pieces.values() for coordinate in coordinates]
+    expansions = 0
+    start_time = perf_counter()
+    while (elapsed := perf_counter() - start_time) < duration:
+        for x, y in pieces:
+            for direction in Direction:
+                (moved_x, moved_y), _ = puzzle.move(x, y, direction)
+                if moved_x != x or moved_y != y:
+                    puzzle.undo()
+                expansions += 1
+    return expansions / elapsed
+
+
+def solve_seconds(engine: type, levels: Iterable[dict], strategy: str, budget: float) -> Tuple[float, int]:
+    """Solve levels one after another with an engine and a single strategy, in this process.
+
+    :param engine: puzzle class, one of `ENGINES`
+    :type engine: type
+    :param levels: levels, with `map` and `target`
+    :type levels: Iterable[dict]
+    :param strategy: strategy for `solve.solve`
+    :type strategy: str
+    :param budget: seconds per level before `solve.solve` gives up
+    :type budget: float
+    :return: total seconds and number of levels solved
+    :rtype: Tuple[float, int]
+    """
+    seconds = 0.0
+    solved = 0
+    for level in levels:
+        puzzle = engine(level["map"], level["target"])
+        start_time = perf_counter()
+        solution = solve(puzzle, strategies=(strategy,), deadline=monotonic() + budget)
+        seconds += perf_counter() - start_time
+        solved += solution is not None and not isinstance(solution, GaveUp)
+    return seconds, solved
+
+
+def generate_level(size: int, seed: int, round_: int = 0) -> dict:
+    """Generate a synthetic level on a `size` x `size` board, in the format of `JuejinGameSession.fetch_level_data`.
+
+    Larger boards get more numbers, symbols and obstacles. The target comes from a random plan over the numbers and
+    symbols placed, so it is reachable by calculation, but the pieces may still be stuck where they are.
+
+    :param size: number of rows and columns
+    :type size: int
+    :param seed: random seed
+    :type seed: int
+    :param round_: `round` of the level
+    :type round_: int
+    :return: level data, with `map`, `target` and `round`
+    :rtype: dict
+    :raises ValueError: `size` smaller than 3
+    """
+    if size < 3:
+        raise ValueError(f"size should be at least 3, not {size}")
+
+    rng = Random(seed)
+    while True:
+        numbers = [rng.randint(1, 9) for _ in range(size // 2 + 1)]
+        # Each step of the plan is a calculation with a symbol on the board or, now and then, a concatenation
+        steps = [rng.choice((0.3, 0.4, 0.5, 0.6, 0.7)) for _ in range(len(numbers) - 1)]
+        values = list(numbers)
+        try:
+            for symbol in steps:
+                num1 = values.pop(rng.randrange(len(values)))
+                num2 = values.pop(rng.randrange(len(values)))
+                values.append(NumberPuzzle.calc(num1, symbol, num2))
+        except ArithmeticError:
+            continue
+        break
+
+    cells = [(x, y) for y in range(size) for x in range(size)]
+    rng.shuffle(cells)
+    board = [[0.1] * size for _ in range(size)]
+    pieces = numbers + [symbol for symbol in steps if symbol != 0.7] + [0.2] * size
+    for (x, y), piece in zip(cells, pieces):
+        board[y][x] = piece
+    return {"map": board, "target": values[0], "round": round_}
+
+
+def generate_corpus(sizes: Iterable[int], per_size: int = 3, seed: int = 0) -> List[dict]:
+    """Generate levels of increasing size with `generate_level`, the same arguments always give the same levels.
+
+    :param sizes: board sizes
+    :type sizes: Iterable[int]
+    :param per_size: number of levels per size
+    :type per_size: int
+    :param seed: random seed
+    :type seed: int
+    :return: levels, numbered by `round`
+    :rtype: List[dict]
+    """
+    levels = []
+    for size in sorted(sizes):
+        for _ in range(per_size):
+            levels.append(generate_level(size, seed + len(levels), len(levels) + 1))
+    return levels
+
+
+def read_json_lines(file_path: str) -> List[dict]:
+    """Read a JSON lines file, e.g. a corpus (one `JuejinGameSession.fetch_level_data` payload per line) or the
+    measurements of a run.
+
+    :param file_path: file path
+    :type file_path: str
+    :return: objects, one per line
+    :rtype: List[dict]
+    """
+    with open(file_path) as file:
+        return [loads(line) for line in file if line.strip()]
+
+
+# noinspection PyTypeHints
+def benchmark_level(level: dict, strategy: str, budget: float) -> dict:
+    """Time the construction of the puzzle, the enumeration of its plans (`PLAN_LIMIT` at most) and `solve.solve` with a
+    single strategy on a level. Run it in a fresh process to get the peak memory of the level alone.
+
+    :param level: level data, with `map` and `target`
+    :type level: dict
+    :param strategy: strategy for `solve.solve`
+    :type strategy: str
+    :param budget: seconds before `solve.solve` gives up
+    :type budget: float
+    :return: measurements, `seconds` is the time to the first solution (None if not solved)
+    :rtype: dict
+    """
+    start_time = perf_counter()
+    puzzle = make_puzzle(level["map"], level["target"])
+    construction_seconds = perf_counter() - start_time
+
+    start_time = perf_counter()
+    plans = sum(1 for _ in zip(range(PLAN_LIMIT), find_valid_calculations(puzzle)))
+    plans_seconds = perf_counter() - start_time
+
+    stats = SolverStats()
+    start_time = perf_counter()
+    solution = solve(puzzle, strategies=(strategy,), deadline=monotonic() + budget, stats=stats)
+    seconds = perf_counter() - start_time
+    stats = stats.as_dict()
+    search_seconds = stats["phases"].get("search", 0.0)
+    return {
+        "key": board_key(level["map"], level["target"]),
+        "round": level.get("round"),
+        "strategy": strategy,
+        "outcome": "unsolvable" if solution is None else "gave_up" if isinstance(solution, GaveUp) else "solved",
+        "seconds": seconds if solution is not None and not isinstance(solution, GaveUp) else None,
+        "moves": len(solution.moves) if solution is not None and not isinstance(solution, GaveUp) else None,
+        "construction_seconds": construction_seconds,
+        "plans": plans,
+        "plans_seconds": plans_seconds,
+        "expanded": stats["expanded"],
+        "search_seconds": search_seconds,
+        "states_per_second": stats["expanded"] / search_seconds if search_seconds else None,
+        "peak_rss": stats["peak_rss"]
+    }
+
+
+def _benchmark_level(arguments: Tuple[dict, str, float]) -> dict:
+    return benchmark_level(*arguments)
+
+
+def benchmark_corpus(levels: Iterable[dict], strategies: Iterable[str], budget: float) -> Iterable[dict]:
+    """Run `benchmark_level` on every level with every strategy, each run in a fresh process.
+
+    :param levels: levels
+    :type levels: Iterable[dict]
+    :param strategies: strategies for `solve.solve`
+    :type strategies: Iterable[str]
+    :param budget: seconds per run
+    :type budget: float
+    :return: A generator, yield the measurements of a run a time, in order
+    :rtype: Iterable[dict]
+    """
+    runs = [(level, strategy, budget) for level in levels for strategy in strategies]
+    with Pool(1, maxtasksperchild=1) as pool:
+        yield from pool.imap(_benchmark_level, runs)
+
+
+def summarize(results: Iterable[dict], keys: Iterable[str] | None = None) -> Dict[str, dict]:
+    """Aggregate the measurements of `benchmark_corpus` per strategy.
+
+    :param results: measurements
+    :type results: Iterable[dict]
+    :param keys: only aggregate the levels with these `cache.board_key`s, every level if None
+    :type keys: Iterable[str] | None
+    :return: strategy -> aggregate
+    :rtype: Dict[str, dict]
+    """
+    keys = None if keys is None else set(keys)
+    runs = {}
+    for result in results:
+        if keys is None or result["key"] in keys:
+            runs.setdefault(result["strategy"], []).append(result)
+
+    summary = {}
+    for strategy, results_ in runs.items():
+        solved = [result for result in results_ if result["outcome"] == "solved"]
+        search_seconds = sum(result["search_seconds"] for result in results_)
+        peak_rss = [result["peak_rss"] for result in results_ if result["peak_rss"] is not None]
+        summary[strategy] = {
+            "levels": len(results_),
+            "solved": len(solved),
+            "median_seconds": median(result["seconds"] for result in solved) if solved else None,
+            "states_per_second": sum(result["expanded"] for result in results_) / search_seconds if search_seconds
+            else None,
+            "peak_rss": max(peak_rss) if peak_rss else None,
+            "construction_seconds": sum(result["construction_seconds"] for result in results_) / len(results_),
+            "plans_seconds": sum(result["plans_seconds"] for result in results_) / len(results_)
+        }
+    return summary
+
+
+def find_regressions(results: List[dict], baseline: List[dict], threshold: float = 0.2) -> List[str]:
+    """Compare measurements with those of a baseline run, over the levels both runs have.
+
+    A strategy regresses if it solves fewer levels, if its states per second drop, or if its median time to a solution
+    or its peak memory grow, by more than `threshold` (a fraction of the baseline).
+
+    :param results: measurements from `benchmark_corpus`
+    :type results: List[dict]
+    :param baseline: measurements of the baseline run
+    :type baseline: List[dict]
+    :param threshold: tolerated change
+    :type threshold: float
+    :return: descriptions of the regressions, empty if there is none
+    :rtype: List[str]
+    """
+    keys = {result["key"] for result in results} & {result["key"] for result in baseline}
+    current, previous = summarize(results, keys), summarize(baseline, keys)
+    regressions = []
+    for strategy, now in current.items():
+        if (before := previous.get(strategy)) is None:
+            continue
+        if now["solved"] < before["solved"]:
+            regressions.append(f"{strategy}: solved {now['solved']} levels, {before['solved']} before")
+        for metric, higher_is_better in (("states_per_second", True), ("median_seconds", False),
+                                         ("peak_rss", False)):
+            if now[metric] is None or not before[metric]:
+                continue
+            change = now[metric] / before[metric] - 1
+            if (-change if higher_is_better else change) > threshold:
+                regressions.append(f"{strategy}: {metric} {now[metric]:,.3f}, {before[metric]:,.3f} before "
+                                   f"({change:+.0%})")
+    return regressions
+
+
+if __name__ == "__main__":
+    from argparse import ArgumentParser
+    from sys import stdout
+
+    from batched import np
+
+    parser = ArgumentParser(description="Benchmark the solver offline.")
+    subparsers = parser.add_subparsers(dest="command", required=True)
+
+    slides_parser = subparsers.add_parser("slides", help="benchmark slide-destination lookup on wide boards")
+    slides_parser.add_argument("--lengths", type=int, nargs="+", default=[8, 32, 128, 512])
+    slides_parser.add_argument("--duration", type=float, default=1.0, help="seconds per measurement")
+
+    engines_parser = subparsers.add_parser("engines", help="compare the puzzle engines of `ENGINES`")
+    engines_parser.add_argument("--lengths", type=int, nargs="+", default=[8, 32, 128], help="wide board lengths")
+    engines_parser.add_argument("--sizes", type=int, nargs="+", default=[3, 4, 5, 6, 7])
+    engines_parser.add_argument("--per-size", type=int, default=6, help="levels per size")
+    engines_parser.add_argument("--seed", type=int, default=0)
+    engines_parser.add_argument("--strategies", nargs="+", default=["bfs", "astar", "beam"])
+    engines_parser.add_argument("--duration", type=float, default=1.0, help="seconds per expansion measurement")
+    engines_parser.add_argument("--budget", type=float, default=30.0, help="seconds per level and strategy")
+
+    integrated_parser = subparsers.add_parser("integrated", help="compare solve.solve_integrated with a plan strategy")
+    integrated_parser.add_argument("--sizes", type=int, nargs="+", default=[4, 5, 6, 7])
+    integrated_parser.add_argument("--per-size", type=int, default=8, help="levels per size")
+    integrated_parser.add_argument("--seed", type=int, default=0)
+    integrated_parser.add_argument("--strategy", default="astar", help="plan strategy to compare with")
+    integrated_parser.add_argument("--budget", type=float, default=20.0, help="seconds per level and strategy")
+
+    generate_parser = subparsers.add_parser("generate", help="write a synthetic corpus as JSON lines")
+    generate_parser.add_argument("--sizes", type=int, nargs="+", default=[5, 7, 9, 11])
+    generate_parser.add_argument("--per-size", type=int, default=3, help="levels per size")
+    generate_parser.add_argument("--seed", type=int, default=0)
+    generate_parser.add_argument("--output", help="file to write, standard output if omitted")
+
+    corpus_parser = subparsers.add_parser("corpus", help="benchmark the solver on a corpus of levels")
+    corpus_parser.add_argument("--corpus", help="JSON lines of level data, a synthetic corpus if omitted")
+    corpus_parser.add_argument("--sizes", type=int, nargs="+", default=[5, 7, 9, 11])
+    corpus_parser.add_argument("--per-size", type=int, default=3, help="levels per size")
+    corpus_parser.add_argument("--seed", type=int, default=0)
+    corpus_parser.add_argument("--strategies", nargs="+",
+                               default=["bfs", "astar", "greedy", "beam"] + (["batched"] if np is not None else []) +
+                                       ["integrated"])
+    corpus_parser.add_argument("--budget", type=float, default=10.0, help="seconds per level and strategy")
+    corpus_parser.add_argument("--output", help="file to write the measurements to, as JSON lines")
+    corpus_parser.add_argument("--baseline", help="measurements of an earlier run to compare with")
+    corpus_parser.add_argument("--threshold", type=float, default=0.2, help="tolerated change against the baseline")
+    args = parser.parse_args()
+
+    if args.command == "slides":
+        print(f"{'length':>8} {'before (exp/s)':>16} {'after (exp/s)':>16} {'speedup':>8}")
+        for board_length in args.lengths:
+            board = generate_wide_board(board_length, seed=board_length)
+            before = expansions_per_second(_LinearScanNumberPuzzle(board, 0), args.duration)
+            after = expansions_per_second(NumberPuzzle(board, 0), args.duration)
+            print(f"{board_length:>8} {before:>16,.0f} {after:>16,.0f} {after / before:>7.2f}x")
+
+    elif args.command == "engines":
+        names = [engine.__name__ for engine in ENGINES]
+        print(f"{'length':>8} " + " ".join(f"{name + ' (exp/s)':>28}" for name in names))
+        for board_length in args.lengths:
+            board = generate_wide_board(board_length, seed=board_length)
+            rates = [expansions_per_second(engine(board, 0), args.duration) for engine in ENGINES]
+            print(f"{board_length:>8} " + " ".join(f"{rate:>28,.0f}" for rate in rates))
+        print()
+
+        print(f"{'size':>4} {'strategy':>10} " + " ".join(f"{name + ' (s)':>28}" for name in names))
+        for strategy in args.strategies:
+            for board_size in args.sizes:
+                levels = [generate_level(board_size, args.seed + index) for index in range(args.per_size)]
+                timings = [solve_seconds(engine, levels, strategy, args.budget) for engine in ENGINES]
+                print(f"{board_size:>4} {strategy:>10} " +
+                      " ".join(f"{f'{seconds:.2f} ({solved}/{len(levels)})':>28}" for seconds, solved in timings))
+
+    elif args.command == "integrated":
+        # Time spent on a level whatever the outcome, unsolved levels count with the time taken to give up. Outcomes are
+        # shown by their initial: solved, gave up or unsolvable
+        print(f"{'size':>4} {'round':>6} {args.strategy + ' (s)':>14} {'expanded':>9} {'integrated (s)':>14} "
+              f"{'expanded':>9}")
+        totals = {}
+        corpus = generate_corpus(args.sizes, args.per_size, args.seed)
+        results = list(benchmark_corpus(corpus, (args.strategy, "integrated"), args.budget))
+        for generated_level, (plan_result, integrated_result) in zip(corpus, zip(results[::2], results[1::2])):
+            board_size = len(generated_level["map"])
+            cells = []
+            for result in (plan_result, integrated_result):
+                seconds = result["plans_seconds"] + result["search_seconds"] if result["seconds"] is None \
+                    else result["seconds"]
+                total = totals.setdefault((board_size, result["strategy"]), [0, 0.0, 0])
+                total[0] += result["outcome"] == "solved"
+                total[1] += seconds
+                total[2] += result["expanded"]
+                cells.append(f"{seconds:>12.2f} {result['outcome'][0]} {result['expanded']:>9,}")
+            totals.setdefault((board_size, "only integrated"), [0])[0] += \
+                integrated_result["outcome"] == "solved" and plan_result["outcome"] != "solved"
+            print(f"{board_size:>4} {generated_level['round']:>6} {cells[0]:>24} {cells[1]:>24}")
+        print()
+
+        print(f"{'size':>4} {'strategy':>16} {'solved':>8} {'seconds':>9} {'expanded':>10}")
+        for board_size in sorted(set(args.sizes)):
+            for strategy in (args.strategy, "integrated"):
+                solved, seconds, expanded = totals[board_size, strategy]
+                print(f"{board_size:>4} {strategy:>16} {solved:>3}/{args.per_size:<4} {seconds:>9.2f} {expanded:>10,}")
+            print(f"{board_size:>4} {'only integrated':>16} {totals[board_size, 'only integrated'][0]:>3}/{args.per_size}")
+
+    elif args.command == "generate":
+        output = open(args.output, "w") if args.output else stdout
+        for generated_level in generate_corpus(args.sizes, args.per_size, args.seed):
+            output.write(dumps(generated_level, separators=(",", ":")) + "\n")
+        if output is not stdout:
+            output.close()
+
+    else:
+        corpus = read_json_lines(args.corpus) if args.corpus else generate_corpus(args.sizes, args.per_size, args.seed)
+        measurements = []
+        print(f"{'round':>6} {'strategy':>10} {'outcome':>10} {'seconds':>8} {'states/s':>10} {'peak MiB':>9}")
+        for measurement in benchmark_corpus(corpus, args.strategies, args.budget):
+            measurements.append(measurement)
+            seconds = "-" if measurement["seconds"] is None else f"{measurement['seconds']:.2f}"
+            print(f"{str(measurement['round']):>6} {measurement['strategy']:>10} {measurement['outcome']:>10} "
+                  f"{seconds:>8} {measurement['states_per_second'] or 0:>10,.0f} "
+                  f"{(measurement['peak_rss'] or 0) / (1 << 20):>9.1f}")
+        print()
+
+        print(f"{'strategy':>10} {'solved':>8} {'median s':>9} {'states/s':>10} {'peak MiB':>9}")
+        for summarized_strategy, aggregate in summarize(measurements).items():
+            seconds = "-" if aggregate["median_seconds"] is None else f"{aggregate['median_seconds']:.2f}"
+            print(f"{summarized_strategy:>10} {aggregate['solved']:>3}/{aggregate['levels']:<4} {seconds:>9} "
+                  f"{aggregate['states_per_second'] or 0:>10,.0f} {(aggregate['peak_rss'] or 0) / (1 << 20):>9.1f}")
+
+        if args.output:
+            with open(args.output, "w") as output_file:
+                for measurement in measurements:
+                    output_file.write(dumps(measurement, separators=(",", ":")) + "\n")
+        if args.baseline:
+            regressions = find_regressions(measurements, read_json_lines(args.baseline), args.threshold)
+            print()
+            for regression in regressions:
+                print("Regression:", regression)
+            if regressions:
+                exit(1)
+            print("No regression against the baseline.")
@@ -0,0 +1,79 @@
+import sqlite3
+from hashlib import blake2b
+from json import dumps, loads
+from os import makedirs, path
+from threading import Lock
+from typing import List
+
+
+def board_key(board: List[List[int | float]], target: int) -> str:
+    """Canonical key of a level, the same `map` and `target` always give the same key in every process and every run.
+
+    :param board: `map` of the level
+    :type board: List[List[int | float]]
+    :param target: target of the level
+    :type target: int
+    :return: hex digest
+    :rtype: str
+    """
+    return blake2b(dumps([board, target], separators=(",", ":")).encode(), digest_size=16).hexdigest()
+
+
+class SolutionCache:
+    """On-disk store of submitted commands, keyed by `board_key`. It may be shared by threads."""
+
+    def __init__(self, file_path: str):
+        if directory := path.dirname(file_path):
+            makedirs(directory, exist_ok=True)
+        # Serialized by `__lock`, e.g. written by the background thread of `pipeline.LevelPipeline`
+        self.__connection = sqlite3.connect(file_path, check_same_thread=False)
+        self.__lock = Lock()
+        self.__connection.execute("CREATE TABLE IF NOT EXISTS solutions ("
+                                  "key TEXT PRIMARY KEY, "
+                                  "commands TEXT NOT NULL, "
+                                  "round INTEGER"
+                                  ") WITHOUT ROWID")
+        self.__connection.commit()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.close()
+
+    def get(self, board: List[List[int | float]], target: int) -> List[list] | None:
+        """Look up the commands submitted for a level.
+
+        :param board: `map` of the level
+        :type board: List[List[int | float]]
+        :param target: target of the level
+        :type target: int
+        :return: commands in the form `JuejinGameSession.submit_level` takes, None if the level is not cached
+        :rtype: List[list] | None
+        """
+        with self.__lock:
+            row = self.__connection.execute("SELECT commands FROM solutions WHERE key = ?",
+                                            (board_key(board, target),)).fetchone()
+        return None if row is None else loads(row[0])
+
+    def put(self, board: List[List[int | float]], target: int, commands: List[list], round_: int | None = None) -> None:
+        """Store the commands submitted for a level.
+
+        :param board: `map` of the level
+        :type board: List[List[int | float]]
+        :param target: target of the level
+        :type target: int
+        :param commands: commands in the form `JuejinGameSession.submit_level` takes
+        :type commands: List[list]
+        :param round_: round of the level, for reference only
+        :type round_: int | None
+        :return: None
+        """
+        row = (board_key(board, target), dumps(commands, separators=(",", ":")), round_)
+        with self.__lock:
+            self.__connection.execute("INSERT OR REPLACE INTO solutions (key, commands, round) VALUES (?, ?, ?)", row)
+            self.__connection.commit()
+
+    def close(self) -> None:
+        with self.__lock:
+            self.__connection.close()
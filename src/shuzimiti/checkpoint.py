@@ -0,0 +1,192 @@
+import struct
+from array import array
+from json import dumps, loads
+from os import fsync, makedirs, path, remove, replace
+from typing import BinaryIO, List, NamedTuple, Tuple
+
+from cache import board_key
+from number_puzzle import CODE_TO_VALUE, NUMBER
+from transposition import BYTE_ORDER, TranspositionTable
+
+MAGIC = b"SZMTCKP\x03"  # The last byte is the version of the format
+LENGTH_PREFIX = struct.Struct("<Q")
+CHECKPOINT_INTERVAL = 60.0  # Seconds between two checkpoints of a running search
+
+
+class SearchState(NamedTuple):
+    """What `solve.bfs` needs to carry on with an interrupted search."""
+    step: Tuple[int, float, int]
+    strategy: str
+    second_try: bool
+    parents: array  # Search tree columns, see `solve.bfs`
+    moves: array
+    frontier: List[Tuple[float, bytes]]  # (priority, entry), in popping order, see `solve.FRONTIER_SUFFIX`
+    values: Tuple[int | float, ...]  # Code -> value of the packed boards, see `number_puzzle.packing_codes`
+    table: TranspositionTable
+
+
+class Checkpoint(NamedTuple):
+    """Progress of `solve.solve` on a level."""
+    key: str  # `cache.board_key` of the level
+    strategies: Tuple[str, ...]
+    candidate: int  # Index of the candidate being searched, every candidate before it failed
+    steps_done: int  # Steps of the plan of the candidate already performed...
+    history: List[int]  # ...by these moves
+    search: SearchState | None  # Search of the next step, None to start it over
+
+
+def checkpoint_path(directory: str, board: List[List[int | float]], target: int) -> str:
+    """Path of the checkpoint file of a level.
+
+    :param directory: directory of the checkpoints
+    :type directory: str
+    :param board: `map` of the level
+    :type board: List[List[int | float]]
+    :param target: target of the level
+    :type target: int
+    :return: file path
+    :rtype: str
+    """
+    return path.join(directory, board_key(board, target) + ".ckpt")
+
+
+def _write_blob(file: BinaryIO, blob: bytes) -> None:
+    file.write(LENGTH_PREFIX.pack(len(blob)))
+    file.write(blob)
+
+
+def _read_size(file: BinaryIO) -> int:
+    if len(prefix := file.read(LENGTH_PREFIX.size)) < LENGTH_PREFIX.size:
+        raise EOFError("truncated checkpoint")
+    return LENGTH_PREFIX.unpack(prefix)[0]
+
+
+def _read_blob(file: BinaryIO) -> bytes:
+    size = _read_size(file)
+    if len(blob := file.read(size)) < size:
+        raise EOFError("truncated checkpoint")
+    return blob
+
+
+def _write_array(file: BinaryIO, items: array) -> None:
+    # The item size is written along the type code, it is platform dependent
+    _write_blob(file, f"{items.typecode}{items.itemsize}".encode())
+    file.write(LENGTH_PREFIX.pack(len(items)))
+    items.tofile(file)
+
+
+def _read_array(file: BinaryIO, swap_bytes: bool) -> array:
+    type_info = _read_blob(file).decode()
+    items = array(type_info[0])
+    if str(items.itemsize) != type_info[1:]:
+        raise ValueError(f"items of array {type_info[0]!r} are {items.itemsize} bytes, not {type_info[1:]}")
+    items.fromfile(file, _read_size(file))
+    if swap_bytes:
+        items.byteswap()
+    return items
+
+
+def save_checkpoint(file_path: str, checkpoint: Checkpoint) -> None:
+    """Write a checkpoint. The file is written next to its destination first and moved into place, so a checkpoint is
+    either complete or not there at all.
+
+    The format is a sequence of sections that are read in the order they are written: the magic, the byte order (see
+    `transposition.BYTE_ORDER`), a JSON header, then the arrays of the search (tree columns, frontier priorities) and
+    the transposition table in native byte order, with the frontier entries (packed in little-endian order already)
+    before the table. Checkpoints may be restored on another machine (e.g. from a CI cache), `load_checkpoint` converts
+    them if the byte order differs.
+
+    :param file_path: file path, see `checkpoint_path`
+    :type file_path: str
+    :param checkpoint: A checkpoint
+    :type checkpoint: Checkpoint
+    :return: None
+    """
+    if directory := path.dirname(file_path):
+        makedirs(directory, exist_ok=True)
+
+    search = checkpoint.search
+    header = {
+        "key": checkpoint.key,
+        "strategies": checkpoint.strategies,
+        "candidate": checkpoint.candidate,
+        "steps_done": checkpoint.steps_done,
+        "history": checkpoint.history,
+        "search": None
+    }
+    if search is not None:
+        header["search"] = {
+            "step": search.step,
+            "strategy": search.strategy,
+            "second_try": search.second_try,
+            "numbers": search.values[NUMBER:]
+        }
+
+    temporary_path = file_path + ".tmp"
+    with open(temporary_path, "wb") as file:
+        file.write(MAGIC)
+        file.write(BYTE_ORDER)
+        _write_blob(file, dumps(header, separators=(",", ":")).encode())
+        if search is not None:
+            _write_array(file, search.parents)
+            _write_array(file, search.moves)
+            _write_array(file, array("d", (priority for priority, _ in search.frontier)))
+            _write_blob(file, b"".join(entry for _, entry in search.frontier))
+            search.table.dump(file)
+        file.flush()
+        fsync(file.fileno())
+    replace(temporary_path, file_path)
+
+
+def load_checkpoint(file_path: str, key: str) -> Checkpoint | None:
+    """Read a checkpoint written by `save_checkpoint`.
+
+    :param file_path: file path, see `checkpoint_path`
+    :type file_path: str
+    :param key: `cache.board_key` of the level
+    :type key: str
+    :return: A checkpoint, None if there is none for the level or if it cannot be read
+    :rtype: Checkpoint | None
+    """
+    try:
+        with open(file_path, "rb") as file:
+            if file.read(len(MAGIC)) != MAGIC:
+                return None  # Not a checkpoint, or one of another version of the format
+            if (byte_order := file.read(1)) not in (b"<", b">"):
+                return None
+            swap_bytes = byte_order != BYTE_ORDER
+            header = loads(_read_blob(file))
+            if header["key"] != key:
+                return None
+
+            search = None
+            if (search_header := header["search"]) is not None:
+                parents = _read_array(file, swap_bytes)
+                moves = _read_array(file, swap_bytes)
+                priorities = _read_array(file, swap_bytes)
+                entries = _read_blob(file)
+                table = TranspositionTable.load(file)
+
+                entry_size = len(entries) // len(priorities) if priorities else 0
+                frontier = [(priority, entries[index * entry_size:(index + 1) * entry_size])
+                            for index, priority in enumerate(priorities)]
+                search = SearchState(tuple(search_header["step"]), search_header["strategy"],
+                                     search_header["second_try"], parents, moves, frontier,
+                                     CODE_TO_VALUE + tuple(search_header["numbers"]), table)
+    except (OSError, ValueError, KeyError, IndexError, EOFError, struct.error):
+        return None  # Missing or corrupted, start over
+    return Checkpoint(header["key"], tuple(header["strategies"]), header["candidate"], header["steps_done"],
+                      header["history"], search)
+
+
+def discard_checkpoint(file_path: str) -> None:
+    """Delete a checkpoint, if there is one.
+
+    :param file_path: file path, see `checkpoint_path`
+    :type file_path: str
+    :return: None
+    """
+    try:
+        remove(file_path)
+    except FileNotFoundError:
+        pass
@@ -0,0 +1,404 @@
+from array import array
+from collections import defaultdict
+from collections.abc import Iterable
+from typing import Dict, List, Tuple, Literal, Sequence
+
+# The undo journal has the same layout as the one of `NumberPuzzle`, see `number_puzzle._NO_MERGE`
+from number_puzzle import BaseNumberPuzzle, Direction, PuzzleSnapshot, zobrist_key, CODE_TO_VALUE, NUMBER, \
+    _CONCAT, _EVAL, _HEADER_BITS, _MAX_BYTE_CODES, _MAX_WORD, _MERGE_MASK, _NO_MERGE, _RIGHT_MERGE, _SYMBOL_SHIFT, \
+    _SYMBOLS
+
+# Cells hold the codes of `number_puzzle.CODE_TO_VALUE`, numbers are coded from NUMBER onwards as they show up
+BLANK = 0
+OBSTACLE = 1
+# Most distinct numbers on a board, one code is left for the result of a calculation. Calculations never add numbers
+MAX_NUMBERS = _MAX_BYTE_CODES - NUMBER - 1
+# `move` compares the directions by identity, looking them up on the class is slower
+_LEFT = Direction.LEFT
+_UP = Direction.UP
+_RIGHT = Direction.RIGHT
+_DOWN = Direction.DOWN
+
+
+class CompactNumberPuzzle(BaseNumberPuzzle):
+    """A drop-in alternative to `NumberPuzzle` for the searches, see `solve.make_puzzle`.
+
+    The board is a flat `bytearray` (indexed by `y * LENGTH + x`) of the codes of `pack`, so packing a state and
+    restoring it are a single `bytes.translate` each. The cells which are not blank are also kept as row and column
+    bitmasks for sliding, and `move` and `undo` update everything in place without helper calls on the common path.
+    It exposes the same API as `NumberPuzzle`, so `solve.solve` runs on it unchanged. A board may hold
+    `MAX_NUMBERS` distinct numbers at most, the constructor raises `OverflowError` beyond that.
+    """
+    __slots__ = ("LENGTH", "WIDTH", "target", "history", "pieces", "obstacles", "__cells", "__values", "__codes",
+                 "__generation", "__row_masks", "__column_masks", "__obstacle_row_masks", "__obstacle_column_masks",
+                 "__zobrist_keys", "__zobrist_hash", "__journal", "__spill", "__cell_bits", "__history_shift",
+                 "__packing", "__unpacking")
+
+    def __init__(self, puzzle: List[List[int | float]], target: int):
+        # Parameter validation
+        if not self.is_number(target):
+            raise ValueError(f"target should be a non-negative integer, not {target}")
+        if not isinstance(puzzle, list) or not puzzle or not isinstance(puzzle[0], Iterable):
+            raise TypeError("malformed puzzle")
+
+        self.LENGTH = len(puzzle[0])
+        self.WIDTH = len(puzzle)
+        self.target = target
+        self.history = []  # Only storing `move` method calls (with their arguments) history
+        self.pieces = defaultdict(set)
+        self.obstacles = set()
+        self.__cells = bytearray(self.LENGTH * self.WIDTH)
+        self.__values = list(CODE_TO_VALUE)  # Code -> value, numbers are added by `__code_of`...
+        self.__codes = {value: code for code, value in enumerate(CODE_TO_VALUE)}  # ...and value -> code
+        self.__generation = 0  # Incremented whenever the numbers are coded again, see `__recode`
+        # Blocker indexes for sliding, see `NumberPuzzle`
+        self.__row_masks = [0] * self.WIDTH
+        self.__column_masks = [0] * self.LENGTH
+        self.__zobrist_keys = [{} for _ in range(self.LENGTH * self.WIDTH)]  # Per cell, value -> key
+        self.__zobrist_hash = 0
+        self.__journal = array("q")  # For inner use, storing every change made to the board, see `NumberPuzzle`
+        self.__spill = []  # Operands that do not fit in a journal word, last in first out
+        self.__cell_bits = (self.LENGTH * self.WIDTH - 1).bit_length()
+        self.__history_shift = self.WIDTH.bit_length() + 2  # See `encode_history_record`
+        self.__packing = None  # (codes, generation, number of codes, translation) of the last `pack`
+        self.__unpacking = None  # (values, generation, translation) of the last `restore_packed`
+
+        for y, row in enumerate(puzzle):
+            if not isinstance(row, Iterable):
+                raise TypeError("malformed puzzle")
+            if len(row) != self.LENGTH:
+                raise TypeError("malformed puzzle")
+
+            for x, item in enumerate(row):
+                index = y * self.LENGTH + x
+                if self.is_piece(item):
+                    self.__place(index, item)
+                elif self.is_obstacle(item):
+                    self.obstacles.add((x, y))
+                    self.__cells[index] = OBSTACLE
+                    self.__row_masks[y] |= 1 << x
+                    self.__column_masks[x] |= 1 << y
+                    self.__zobrist_hash ^= self.__key(index, item)
+                elif not self.is_blank(item):
+                    raise ValueError(f"invalid value '{item}' in puzzle")
+
+        if not self.pieces:
+            raise ValueError("no pieces in the puzzle")
+        if len(self.__values) - NUMBER > MAX_NUMBERS:
+            raise OverflowError(f"too many distinct numbers on the board: {len(self.__values) - NUMBER}")
+        # Obstacles never move, `__rebuild` starts from them
+        self.__obstacle_row_masks = [0] * self.WIDTH
+        self.__obstacle_column_masks = [0] * self.LENGTH
+        for x, y in self.obstacles:
+            self.__obstacle_row_masks[y] |= 1 << x
+            self.__obstacle_column_masks[x] |= 1 << y
+
+    def __getitem__(self, item):
+        if isinstance(item, tuple):
+            if item[0] < 0 or item[1] < 0:
+                raise IndexError(f"coordinates should ne non-negative, not ({item[0]}, {item[1]})")
+            if item[0] >= self.LENGTH:
+                raise IndexError(f"x-coordinate out of range: {item[0]}")
+            return self.__values[self.__cells[item[1] * self.LENGTH + item[0]]]
+        return self.puzzle[item]
+
+    @property
+    def puzzle(self) -> List[List[int | float]]:
+        """The board in the same nested list form as `NumberPuzzle.puzzle`, built on demand."""
+        board = self.snapshot().board
+        return [list(board[y * self.LENGTH:(y + 1) * self.LENGTH]) for y in range(self.WIDTH)]
+
+    @property
+    def zobrist_hash(self) -> int:
+        return self.__zobrist_hash
+
+    def __key(self, index: int, value: int | float) -> int:
+        keys = self.__zobrist_keys[index]
+        if (key := keys.get(value)) is None:
+            key = keys[value] = zobrist_key(index % self.LENGTH, index // self.LENGTH, value)
+        return key
+
+    def __code_of(self, value: int | float) -> int:
+        if (code := self.__codes.get(value)) is None:
+            if len(self.__values) == _MAX_BYTE_CODES:
+                self.__recode()
+            code = self.__codes[value] = len(self.__values)
+            self.__values.append(value)
+        return code
+
+    def __recode(self) -> None:
+        # Out of codes, only keep those of the values on the board. Codes handed out before are no longer valid
+        cells = self.__cells
+        numbers = sorted({self.__values[code] for code in cells if code >= NUMBER})
+        if len(numbers) > MAX_NUMBERS:
+            raise OverflowError(f"too many distinct numbers on the board: {len(numbers)}")
+        translation = bytearray(range(_MAX_BYTE_CODES))
+        for code, number in enumerate(numbers, NUMBER):
+            translation[self.__codes[number]] = code
+        cells[:] = cells.translate(translation)
+        self.__values = list(CODE_TO_VALUE) + numbers
+        self.__codes = {value: code for code, value in enumerate(self.__values)}
+        self.__generation += 1
+
+    def __encode(self, values: Iterable[int | float]) -> bytes:
+        # Codes of the values, coded again from the start if `__recode` ran halfway
+        values = tuple(values)
+        while True:
+            generation = self.__generation
+            codes = bytes(map(self.__code_of, values))
+            if generation == self.__generation:
+                return codes
+
+    def __push_operand(self, value: int) -> None:
+        if value > _MAX_WORD:
+            self.__spill.append(value)
+            value = -1
+        self.__journal.append(value)
+
+    def __pop_operand(self) -> int:
+        value = self.__journal.pop()
+        return self.__spill.pop() if value < 0 else value
+
+    def __place(self, index: int, value: int | float) -> None:  # Put a piece on a blank cell
+        y, x = divmod(index, self.LENGTH)
+        self.__cells[index] = self.__code_of(value)
+        self.__row_masks[y] |= 1 << x
+        self.__column_masks[x] |= 1 << y
+        self.pieces[value].add((x, y))
+        self.__zobrist_hash ^= self.__key(index, value)
+
+    def __take(self, index: int) -> int | float:  # Remove the piece of a cell and return it
+        y, x = divmod(index, self.LENGTH)
+        value = self.__values[self.__cells[index]]
+        self.__cells[index] = BLANK
+        self.__row_masks[y] &= ~(1 << x)
+        self.__column_masks[x] &= ~(1 << y)
+        coordinates = self.pieces[value]
+        coordinates.remove((x, y))
+        # Remove the set if it is empty
+        if not coordinates:
+            del self.pieces[value]
+        self.__zobrist_hash ^= self.__key(index, value)
+        return value
+
+    def __slide(self, from_index: int, to_index: int) -> None:  # `__take` + `__place` in one go
+        length = self.LENGTH
+        from_y, from_x = divmod(from_index, length)
+        to_y, to_x = divmod(to_index, length)
+        cells = self.__cells
+        value = self.__values[cells[from_index]]
+        cells[to_index] = cells[from_index]
+        cells[from_index] = BLANK
+        row_masks, column_masks = self.__row_masks, self.__column_masks
+        row_masks[from_y] &= ~(1 << from_x)
+        column_masks[from_x] &= ~(1 << from_y)
+        row_masks[to_y] |= 1 << to_x
+        column_masks[to_x] |= 1 << to_y
+        coordinates = self.pieces[value]
+        coordinates.remove((from_x, from_y))
+        coordinates.add((to_x, to_y))
+        keys = self.__zobrist_keys
+        self.__zobrist_hash ^= (keys[from_index].get(value) or self.__key(from_index, value)) ^ \
+            (keys[to_index].get(value) or self.__key(to_index, value))
+
+    def __rebuild(self) -> None:
+        # Bring the pieces and the blocker indexes in line with the cells
+        length = self.LENGTH
+        values = self.__values
+        row_masks = self.__row_masks = self.__obstacle_row_masks.copy()
+        column_masks = self.__column_masks = self.__obstacle_column_masks.copy()
+        pieces = self.pieces
+        pieces.clear()
+        for index, code in enumerate(self.__cells):
+            if code > OBSTACLE:
+                y, x = divmod(index, length)
+                row_masks[y] |= 1 << x
+                column_masks[x] |= 1 << y
+                pieces[values[code]].add((x, y))
+
+    # noinspection PyTypeHints
+    def move(self, x: int, y: int, direction: Direction) \
+            -> Tuple[Tuple[int, int], Tuple[int, Literal[0.3, 0.4, 0.5, 0.6, 0.7], int] | None]:
+        """Move a piece, see `NumberPuzzle.move`.
+
+        :param x: x-coordinate of the piece
+        :type x: int
+        :param y: y-coordinate of the piece
+        :type y: int
+        :param direction: moving direction, either left, right, up or down
+        :type direction: Direction
+        :return: final (x, y) coordinate of the piece after moving and the operands if a calculation is performed
+        :rtype: Tuple[Tuple[int, int], Tuple[int, Literal[0.3, 0.4, 0.5, 0.6, 0.7], int] | None]
+        :raises ValueError: invalid `direction`
+        :raises TypeError: no pieces on the coordinate given
+        :raises IndexError: coordinates out of range
+        """
+        length = self.LENGTH
+        if not (0 <= x < length and 0 <= y < self.WIDTH):
+            raise IndexError(f"coordinates out of range: ({x}, {y})")
+        cells = self.__cells
+        index = y * length + x
+        if (code := cells[index]) <= OBSTACLE:
+            raise TypeError(f"no movable pieces on ({x}, {y})")
+
+        # Look up the nearest blocker in the row/column, see `NumberPuzzle.__find_destination_and_move`
+        slid_x, slid_y = x, y
+        if direction is _LEFT:
+            slid_x = (self.__row_masks[y] & ((1 << x) - 1)).bit_length()
+        elif direction is _RIGHT:
+            blockers = self.__row_masks[y] >> (x + 1)
+            slid_x = x + (blockers & -blockers).bit_length() - 1 if blockers else length - 1
+        elif direction is _UP:
+            slid_y = (self.__column_masks[x] & ((1 << y) - 1)).bit_length()
+        elif direction is _DOWN:
+            blockers = self.__column_masks[x] >> (y + 1)
+            slid_y = y + (blockers & -blockers).bit_length() - 1 if blockers else self.WIDTH - 1
+        else:
+            raise ValueError("invalid direction")
+
+        values = self.__values
+        value = values[code]
+        slid = slid_y * length + slid_x
+        if slid != index:
+            # `__slide` inlined, this is most of the moves a search makes
+            cells[slid] = code
+            cells[index] = BLANK
+            row_masks, column_masks = self.__row_masks, self.__column_masks
+            row_masks[y] &= ~(1 << x)
+            column_masks[x] &= ~(1 << y)
+            row_masks[slid_y] |= 1 << slid_x
+            column_masks[slid_x] |= 1 << slid_y
+            coordinates = self.pieces[value]
+            coordinates.remove((x, y))
+            coordinates.add((slid_x, slid_y))
+            keys = self.__zobrist_keys
+            self.__zobrist_hash ^= (keys[index].get(value) or self.__key(index, value)) ^ \
+                (keys[slid].get(value) or self.__key(slid, value))
+
+        operands = None
+        merge = _NO_MERGE
+        loc = slid
+        if code >= NUMBER and (direction is _RIGHT or direction is _LEFT):
+            step = 1 if direction is _RIGHT else -1
+            if 0 <= slid_x + step < length:
+                next_loc = slid + step
+                if (next_code := cells[next_loc]) >= NUMBER:
+                    num2 = values[next_code]
+                    # Result is evaluating from left to right
+                    operands = (num2, 0.7, value) if step == -1 else (value, 0.7, num2)
+                    ans = self.calc(*operands)
+                    self.__take(slid)
+                    self.__take(next_loc)
+                    self.__place(next_loc, ans)
+                    self.__push_operand(value)
+                    self.__push_operand(num2)
+                    merge = _CONCAT
+                    loc = next_loc
+                elif next_code > OBSTACLE and 0 <= slid_x + 2 * step < length and \
+                        cells[next_next_loc := next_loc + step] >= NUMBER:
+                    val1_loc, val2_loc = (slid, next_next_loc) if step == 1 else (next_next_loc, slid)
+                    val1, symbol, val2 = values[cells[val1_loc]], values[next_code], values[cells[val2_loc]]
+                    try:
+                        ans = self.calc(val1, symbol, val2)
+                    except ArithmeticError:
+                        pass
+                    else:
+                        self.__take(val1_loc)
+                        self.__take(next_loc)
+                        self.__take(val2_loc)
+                        self.__place(next_loc, ans)
+                        self.__push_operand(val1)
+                        self.__push_operand(val2)
+                        merge = _EVAL | _SYMBOLS.index(symbol) << _SYMBOL_SHIFT
+                        operands = (val1, symbol, val2)
+                        loc = next_loc
+
+        # If no changes, nothing is journaled
+        if loc != index:
+            if direction is _RIGHT:
+                merge |= _RIGHT_MERGE
+            self.__journal.append((index << self.__cell_bits | slid) << _HEADER_BITS | merge)
+            # Same as `encode_history_record`
+            self.history.append(x << self.__history_shift | y << 2 | direction.value)
+        return (loc % length, loc // length), operands
+
+    def is_solved(self) -> bool:
+        """Check whether the puzzle is solved, see `NumberPuzzle.is_solved`.
+
+        :return: state of the puzzle
+        :rtype: bool
+        """
+        pieces = self.pieces
+        return len(pieces) == 1 and next(iter(pieces)) == self.target
+
+    def snapshot(self) -> PuzzleSnapshot:
+        """Same as `NumberPuzzle.snapshot`."""
+        return PuzzleSnapshot(tuple(map(self.__values.__getitem__, self.__cells)), self.__zobrist_hash)
+
+    def restore(self, snapshot: PuzzleSnapshot) -> None:
+        """Same as `NumberPuzzle.restore`."""
+        self.__cells[:] = self.__encode(snapshot.board)
+        self.__rebuild()
+        self.__zobrist_hash = snapshot.zobrist_hash
+
+    def pack(self, codes: Dict[int | float, int]) -> bytes:
+        """Same as `BaseNumberPuzzle.pack`, the cells are translated into `codes` at once."""
+        if len(codes) > _MAX_BYTE_CODES:
+            return super().pack(codes)
+        if (packing := self.__packing) is None or packing[0] is not codes or packing[1] != self.__generation or \
+                packing[2] != len(self.__values):
+            # Values missing from `codes` are not on the boards being packed, they are translated to a code out of range
+            translation = bytes(codes.get(value, _MAX_BYTE_CODES - 1) for value in self.__values)
+            packing = self.__packing = (codes, self.__generation, len(self.__values),
+                                        translation.ljust(_MAX_BYTE_CODES, b"\xff"))
+        return bytes(self.__cells).translate(packing[3])
+
+    def restore_packed(self, board: bytes, values: Sequence[int | float], zobrist_hash: int) -> None:
+        """Same as `BaseNumberPuzzle.restore_packed`, the cells are translated from `values` at once."""
+        if len(values) > _MAX_BYTE_CODES:
+            super().restore_packed(board, values, zobrist_hash)
+            return
+        if (unpacking := self.__unpacking) is None or unpacking[0] is not values or \
+                unpacking[1] != self.__generation:
+            translation = self.__encode(values)
+            unpacking = self.__unpacking = (values, self.__generation, translation.ljust(_MAX_BYTE_CODES, b"\x00"))
+        self.__cells[:] = board.translate(unpacking[2])
+        self.__rebuild()
+        self.__zobrist_hash = zobrist_hash
+
+    def fork(self, snapshot: PuzzleSnapshot | None = None) -> "CompactNumberPuzzle":
+        """Same as `NumberPuzzle.fork`."""
+        board = (self.snapshot() if snapshot is None else snapshot).board
+        return type(self)([list(board[y * self.LENGTH:(y + 1) * self.LENGTH]) for y in range(self.WIDTH)], self.target)
+
+    def undo(self, move_count: int = 1) -> None:
+        """Return the state of the puzzle to `move_count` number of moves before.
+
+        :param move_count: the number of steps to undo, default to 1
+        :type move_count: int
+        :return: None
+        """
+        journal = self.__journal
+        cell_mask = (1 << self.__cell_bits) - 1
+        for _ in range(move_count):  # Undo `move_count` times
+            if not journal:  # `move_count` > len(history)
+                break
+
+            header = journal.pop()
+            cells = header >> _HEADER_BITS
+            from_index, loc = cells >> self.__cell_bits, cells & cell_mask  # `loc` is where the piece slid to
+            if merge := header & _MERGE_MASK:
+                next_loc = loc + 1 if header & _RIGHT_MERGE else loc - 1
+                val2 = self.__pop_operand()
+                val1 = self.__pop_operand()
+                self.__take(next_loc)
+                if merge == _CONCAT:
+                    self.__place(loc, val1)
+                    self.__place(next_loc, val2)
+                else:  # _EVAL, `next_loc` is the symbol
+                    self.__place(next_loc - 1, val1)
+                    self.__place(next_loc, _SYMBOLS[header >> _SYMBOL_SHIFT & 0b11])
+                    self.__place(next_loc + 1, val2)
+            if from_index != loc:
+                self.__slide(loc, from_index)
+            self.history.pop()
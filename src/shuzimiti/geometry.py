@@ -0,0 +1,226 @@
+from collections import Counter, defaultdict, deque
+from functools import lru_cache
+from itertools import product
+from math import inf
+from typing import Dict, FrozenSet, List, Literal, Set, Tuple
+
+from number_puzzle import BaseNumberPuzzle, NumberPuzzle
+
+
+def slide_distances(puzzle: BaseNumberPuzzle) -> Tuple[Tuple[float, ...], ...]:
+    """Lower bounds of the number of moves for a piece to get into each row of the board.
+
+    Only obstacles are taken into account and a piece is assumed to be able to stop anywhere along its way (as if there
+    was always another piece to stop it), therefore the distances never overestimate.
+
+    :param puzzle: A puzzle
+    :type puzzle: BaseNumberPuzzle
+    :return: `distances[row][y * puzzle.LENGTH + x]`, `math.inf` if the piece on (x, y) can never reach `row`
+    :rtype: Tuple[Tuple[float, ...], ...]
+    """
+    return _slide_distances(puzzle.LENGTH, puzzle.WIDTH, frozenset(puzzle.obstacles))
+
+
+@lru_cache(maxsize=64)
+def _slide_graph(length: int, width: int, obstacles: FrozenSet[Tuple[int, int]]) -> Tuple[Tuple[int, ...], ...]:
+    # Cells reachable in one move from each cell (flat index), walking until an obstacle or an edge
+    graph = []
+    for y in range(width):
+        for x in range(length):
+            neighbours = []
+            if (x, y) not in obstacles:
+                for dx, dy in ((-1, 0), (0, -1), (1, 0), (0, 1)):
+                    nx, ny = x + dx, y + dy
+                    while 0 <= nx < length and 0 <= ny < width and (nx, ny) not in obstacles:
+                        neighbours.append(ny * length + nx)
+                        nx, ny = nx + dx, ny + dy
+            graph.append(tuple(neighbours))
+    return tuple(graph)
+
+
+@lru_cache(maxsize=64)
+def _slide_distances(length: int, width: int, obstacles: FrozenSet[Tuple[int, int]]) -> Tuple[Tuple[float, ...], ...]:
+    graph = _slide_graph(length, width, obstacles)
+    distances = []
+    for row in range(width):
+        # Multi-source BFS from every free cell of the row, moves are reversible when only obstacles count
+        row_distances = [inf] * (length * width)
+        to_do = deque()
+        for x in range(length):
+            if (x, row) not in obstacles:
+                row_distances[row * length + x] = 0
+                to_do.append(row * length + x)
+        while to_do:
+            index = to_do.popleft()
+            for neighbour in graph[index]:
+                if row_distances[neighbour] == inf:
+                    row_distances[neighbour] = row_distances[index] + 1
+                    to_do.append(neighbour)
+        distances.append(tuple(row_distances))
+    return tuple(distances)
+
+
+def slide_components(puzzle: BaseNumberPuzzle) -> Tuple[int, ...]:
+    """Split the board into regions that pieces can never leave.
+
+    With the same relaxation as `slide_distances`, a piece can reach every cell of its region and nothing else. Pieces
+    in different regions can never block, stop or merge with each other.
+
+    :param puzzle: A puzzle
+    :type puzzle: BaseNumberPuzzle
+    :return: `components[y * puzzle.LENGTH + x]`, the region ID of (x, y), -1 for obstacles
+    :rtype: Tuple[int, ...]
+    """
+    return _slide_components(puzzle.LENGTH, puzzle.WIDTH, frozenset(puzzle.obstacles))
+
+
+@lru_cache(maxsize=64)
+def _slide_components(length: int, width: int, obstacles: FrozenSet[Tuple[int, int]]) -> Tuple[int, ...]:
+    graph = _slide_graph(length, width, obstacles)
+    components = [-1] * (length * width)
+    component = 0
+    for index in range(length * width):
+        if components[index] != -1 or (index % length, index // length) in obstacles:
+            continue
+        components[index] = component
+        to_do = [index]
+        while to_do:
+            for neighbour in graph[to_do.pop()]:
+                if components[neighbour] == -1:
+                    components[neighbour] = component
+                    to_do.append(neighbour)
+        component += 1
+    return tuple(components)
+
+
+@lru_cache(maxsize=64)
+def _longest_runs(length: int, width: int, obstacles: FrozenSet[Tuple[int, int]]) -> Dict[int, int]:
+    # Longest horizontal run of free cells of each region, calculations need 2 (&) or 3 cells in a row
+    components = _slide_components(length, width, obstacles)
+    runs = {}
+    for y in range(width):
+        run = 0
+        for x in range(length):
+            run = 0 if (x, y) in obstacles else run + 1
+            if run:
+                component = components[y * length + x]
+                runs[component] = max(runs.get(component, 0), run)
+    return runs
+
+
+# noinspection PyTypeHints
+def feasible_components(puzzle: BaseNumberPuzzle, val1: int, symbol: Literal[0.3, 0.4, 0.5, 0.6, 0.7], val2: int,
+                        components: Tuple[int, ...]) -> Set[int]:
+    """Regions of `slide_components` in which the calculation `val1 symbol val2` can ever be performed, i.e. regions
+    holding every piece it needs and wide enough to line them up.
+
+    :param puzzle: A puzzle
+    :type puzzle: BaseNumberPuzzle
+    :param val1: left operand
+    :type val1: int
+    :param symbol: operator
+    :type symbol: Literal[0.3, 0.4, 0.5, 0.6, 0.7]
+    :param val2: right operand
+    :type val2: int
+    :param components: return value of `slide_components(puzzle)`
+    :type components: Tuple[int, ...]
+    :return: region IDs, empty if the calculation can never be performed
+    :rtype: Set[int]
+    """
+    required = Counter((val1, val2) if symbol == 0.7 else (val1, symbol, val2))
+    runs = _longest_runs(puzzle.LENGTH, puzzle.WIDTH, frozenset(puzzle.obstacles))
+    available = defaultdict(Counter)  # Region -> count of each required value
+    for value in required:
+        for x, y in puzzle.pieces.get(value, ()):
+            available[components[y * puzzle.LENGTH + x]][value] += 1
+    return {component for component, counts in available.items()
+            if runs.get(component, 0) >= sum(required.values()) and
+            all(counts[value] >= count for value, count in required.items())}
+
+
+# noinspection PyTypeHints
+def step_lower_bound(puzzle: BaseNumberPuzzle, val1: int, symbol: Literal[0.3, 0.4, 0.5, 0.6, 0.7], val2: int,
+                     distances: Tuple[Tuple[float, ...], ...]) -> float:
+    """Admissible estimate of the number of moves left to perform the calculation `val1 symbol val2` on the board.
+
+    The operands (and the symbol, unless it is a concatenation) have to meet in a row before the final horizontal move
+    merges them, so the estimate is the cheapest sum of their `slide_distances` to a common row plus that final move.
+
+    :param puzzle: A puzzle
+    :type puzzle: BaseNumberPuzzle
+    :param val1: left operand
+    :type val1: int
+    :param symbol: operator
+    :type symbol: Literal[0.3, 0.4, 0.5, 0.6, 0.7]
+    :param val2: right operand
+    :type val2: int
+    :param distances: return value of `slide_distances(puzzle)`
+    :type distances: Tuple[Tuple[float, ...], ...]
+    :return: lower bound of the number of moves, `math.inf` if the calculation can never be performed
+    :rtype: float
+    """
+    required = Counter((val1, val2) if symbol == 0.7 else (val1, symbol, val2))
+    instances = []
+    for value, count in required.items():
+        coordinates = puzzle.pieces.get(value)
+        if coordinates is None or len(coordinates) < count:
+            return inf
+        instances.append(([x + y * puzzle.LENGTH for x, y in coordinates], count))
+
+    best = inf
+    for row_distances in distances:
+        total = 0
+        for indexes, count in instances:
+            if count == 1:
+                total += min(row_distances[index] for index in indexes)
+            else:
+                total += sum(sorted(row_distances[index] for index in indexes)[:count])
+        best = min(best, total)
+    return best + 1
+
+
+# noinspection PyTypeHints
+def plan_cost(puzzle: BaseNumberPuzzle, plan: List[Tuple[int, Literal[0.3, 0.4, 0.5, 0.6, 0.7], int]],
+              distances: Tuple[Tuple[float, ...], ...]) -> float:
+    """Estimate how many moves it takes to realize a plan on the board.
+
+    Steps are simulated in order. For each step the cheapest pieces and the cheapest row to meet in are picked, by their
+    `slide_distances`, every obstacle between them in that row and the horizontal gap between them are added on top.
+    The result of a step is assumed to appear where its symbol (or its right operand, for concatenations) met.
+
+    :param puzzle: A puzzle
+    :type puzzle: BaseNumberPuzzle
+    :param plan: A plan yielded by `solve.find_valid_calculations`
+    :type plan: List[Tuple[int, Literal[0.3, 0.4, 0.5, 0.6, 0.7], int]]
+    :param distances: return value of `slide_distances(puzzle)`
+    :type distances: Tuple[Tuple[float, ...], ...]
+    :return: estimated number of moves, `math.inf` if some step can never be performed
+    :rtype: float
+    """
+    positions = {value: list(coordinates) for value, coordinates in puzzle.pieces.items() if coordinates}
+    total = 0
+    for val1, symbol, val2 in plan:
+        operands = (val1, val2) if symbol == 0.7 else (val1, symbol, val2)
+        best, best_choice, best_row = inf, None, None
+        for choice in product(*(positions.get(value, ()) for value in operands)):
+            if len(set(choice)) < len(choice):  # val1 == val2 needs two different pieces
+                continue
+            xs = [x for x, _ in choice]
+            left, right = min(xs), max(xs)
+            for row, row_distances in enumerate(distances):
+                cost = sum(row_distances[x + y * puzzle.LENGTH] for x, y in choice) + 1
+                if cost >= best:
+                    continue
+                cost += sum(1 for x in range(left + 1, right) if (x, row) in puzzle.obstacles)
+                cost += max(right - left - len(choice) + 1, 0) / puzzle.LENGTH
+                if cost < best:
+                    best, best_choice, best_row = cost, choice, row
+        if best_choice is None:
+            return inf
+
+        total += best
+        for value, coordinate in zip(operands, best_choice):
+            positions[value].remove(coordinate)
+        result = NumberPuzzle.calc(val1, symbol, val2)
+        positions.setdefault(result, []).append((best_choice[-1 if symbol == 0.7 else 1][0], best_row))
+    return total
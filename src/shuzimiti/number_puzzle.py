@@ -1,10 +1,29 @@
+import struct
+from array import array
 from collections import defaultdict
 from collections.abc import Iterable
 from copy import deepcopy
+from itertools import chain
 from enum import Enum
+from hashlib import blake2b
 from operator import add, sub
-from typing import List, Tuple, Literal, Any
-from uuid import uuid4
+from typing import Dict, List, Tuple, Literal, Any, NamedTuple, Sequence
+
+
+# Undo journal, see `NumberPuzzle.move`. Each move is one header word, preceded by the operands of its merge if any:
+#   bits 0-1: merge (_NO_MERGE, _CONCAT or _EVAL)
+#   bits 2-3: index of the symbol in `_SYMBOLS` (_EVAL only)
+#   bit 4: _RIGHT_MERGE, set if the merge happened to the right of the piece
+#   bits 5 and up: cell index (`y * LENGTH + x`) the piece moved from, then the cell index it slid to
+_NO_MERGE = 0
+_CONCAT = 1
+_EVAL = 2
+_MERGE_MASK = 0b11
+_SYMBOLS = (0.3, 0.4, 0.5, 0.6)
+_SYMBOL_SHIFT = 2
+_RIGHT_MERGE = 0b10000
+_HEADER_BITS = 5
+_MAX_WORD = (1 << 63) - 1  # Larger operands are kept in the spill list, the journal holds -1 instead
 
 
 class Direction(Enum):
@@ -15,7 +34,203 @@ class Direction(Enum):
     DOWN = 3
 
 
-class NumberPuzzle:
+def zobrist_key(x: int, y: int, piece: int | float) -> int:
+    """Zobrist key of a piece (or an obstacle) on (x, y). Keys are derived from the arguments only, so a state hashes
+    the same in every process and every run.
+
+    :param x: x-coordinate
+    :type x: int
+    :param y: y-coordinate
+    :type y: int
+    :param piece: value on the board
+    :type piece: int | float
+    :return: 64-bit key
+    :rtype: int
+    """
+    return int.from_bytes(blake2b(f"{x},{y},{piece!r}".encode(), digest_size=8).digest(), "little")
+
+
+class PuzzleSnapshot(NamedTuple):
+    """An immutable copy of the state of a puzzle, see `NumberPuzzle.snapshot`."""
+    board: Tuple[int | float, ...]  # Flattened row by row, `board[y * LENGTH + x]`
+    zobrist_hash: int
+
+
+# Cell codes of packed boards, numbers are coded from NUMBER onwards through a value table, see `packing_codes`
+CODE_TO_VALUE = (0.1, 0.2, 0.3, 0.4, 0.5, 0.6)
+NUMBER = len(CODE_TO_VALUE)
+_MAX_BYTE_CODES = 1 << 8  # With more codes, a cell takes two bytes
+
+
+def packing_codes(board: Iterable[int | float]) -> Tuple[Tuple[int | float, ...], Dict[int | float, int]]:
+    """Value table for packing the boards with the same values as `board`, e.g. every state searched for a step of a
+    plan, as those states move pieces around but never merge them.
+
+    :param board: values on the board, in any order
+    :type board: Iterable[int | float]
+    :return: code -> value and value -> code
+    :rtype: Tuple[Tuple[int | float, ...], Dict[int | float, int]]
+    """
+    values = CODE_TO_VALUE + tuple(sorted({item for item in board if isinstance(item, int)}))
+    return values, {value: code for code, value in enumerate(values)}
+
+
+def pack_board(board: Iterable[int | float], codes: Dict[int | float, int]) -> bytes:
+    """Pack a board into one byte per cell (two little-endian bytes if there are more than 256 codes), about a tenth of
+    the memory of a `PuzzleSnapshot.board`.
+
+    :param board: values of the cells, row by row
+    :type board: Iterable[int | float]
+    :param codes: value -> code, see `packing_codes`
+    :type codes: Dict[int | float, int]
+    :return: packed board
+    :rtype: bytes
+    """
+    if len(codes) <= _MAX_BYTE_CODES:
+        return bytes(map(codes.__getitem__, board))
+    board = [codes[value] for value in board]
+    return struct.pack(f"<{len(board)}H", *board)
+
+
+def unpack_board(board: bytes, values: Sequence[int | float]) -> Tuple[int | float, ...]:
+    """Reverse process of `pack_board`.
+
+    :param board: packed board
+    :type board: bytes
+    :param values: code -> value, see `packing_codes`
+    :type values: Sequence[int | float]
+    :return: values of the cells, row by row
+    :rtype: Tuple[int | float, ...]
+    """
+    if len(values) > _MAX_BYTE_CODES:
+        board = struct.unpack(f"<{len(board) // 2}H", board)
+    return tuple(map(values.__getitem__, board))
+
+
+class BaseNumberPuzzle:
+    """Rules of the game shared by the puzzle engines, `solve` runs on any of them: `NumberPuzzle` and
+    `compact_puzzle.CompactNumberPuzzle`.
+
+    An engine has the `LENGTH` (columns), `WIDTH` (rows), `target`, `history`, `pieces` (value -> set of coordinates)
+    and `obstacles` attributes, the `puzzle` board in nested lists, the `zobrist_hash` property and the `move`, `undo`,
+    `is_solved`, `snapshot`, `restore` and `fork` methods of `NumberPuzzle`.
+    """
+    __slots__ = ()
+
+    # noinspection PyTypeHints
+    @staticmethod
+    def calc(num1: int, symbol: Literal[0.3, 0.4, 0.5, 0.6, 0.7], num2: int) -> int:
+        if not (BaseNumberPuzzle.is_number(num1) and BaseNumberPuzzle.is_number(num2)):
+            raise ValueError(f"could not perform operation on: {num1} and {num2}")
+        match symbol:
+            case 0.3:  # +
+                return num1 + num2
+            case 0.4:  # -
+                if num1 < num2:
+                    raise ArithmeticError(f"could not subtract {num2} from {num1}")
+                return num1 - num2
+            case 0.5:  # *
+                return num1 * num2
+            case 0.6:  # /
+                if num1 % num2:  # Integer arithmetic, float division is not exact beyond 2 ** 53
+                    raise ArithmeticError(f"{num1} is not divisible by {num2}")
+                return num1 // num2
+            # Self-defined operator 0.7 ('&') -> 3 & 7 = 37, 7 & 3 = 73
+            case 0.7:
+                return int(str(num1) + str(num2))
+            case _:
+                raise ValueError(f"unrecognized operator: {symbol}")
+
+    @staticmethod
+    def is_number(value: Any) -> bool:  # Numbers in the puzzle, non-negative
+        return isinstance(value, int) and value >= 0
+
+    @staticmethod
+    def is_symbol(value: Any) -> bool:  # Inherit the representation of +, -, *, / in Juejin API
+        return value in (0.3, 0.4, 0.5, 0.6)
+
+    @staticmethod
+    def is_piece(value: Any) -> bool:  # Movable pieces in the puzzle
+        return BaseNumberPuzzle.is_number(value) or BaseNumberPuzzle.is_symbol(value)
+
+    @staticmethod
+    def is_blank(value: Any) -> bool:
+        return value == 0.1
+
+    @staticmethod
+    def is_obstacle(value: Any) -> bool:
+        return value == 0.2
+
+    @staticmethod
+    def is_valid_value(value: Any) -> bool:  # Check if it is a valid value on the game board
+        return BaseNumberPuzzle.is_piece(value) or BaseNumberPuzzle.is_obstacle(value) or \
+            BaseNumberPuzzle.is_blank(value)
+
+    def encode_history_record(self, x: int, y: int, direction: Direction) -> int:
+        """Encode the history record into an integer. The first `self.LENGTH.bit_length()` bits represent
+        the x-coordinate of the piece, followed by `self.WIDTH.bit_length()` bits of the y-coordinate. The last two bits
+        are direction.
+
+        :param x: x-coordinate of the piece
+        :type x: int
+        :param y: y-coordinate of the piece
+        :type y: int
+        :param direction: moving direction
+        :type direction: Direction
+        :return: Encoded record
+        :rtype: int
+        """
+        # As the size of the history grows too rapidly (and causes MemoryError), I came up with this solution
+        return x << (self.WIDTH.bit_length() + 2) | y << 2 | direction.value
+
+    def decode_history_record(self, value: int) -> Tuple[int, int, Direction]:
+        """Reverse process of `encode_history_record` method, see that method for more information.
+
+        :param value: Encoded record
+        :type value: int
+        :return: x-coordinate and y-coordinate of the piece as well as direction (either left, right, up or down)
+        :rtype: Tuple[int, int, Direction]
+        """
+        direction = Direction(value & 0b11)
+
+        value >>= 2
+        y = value & ((1 << self.WIDTH.bit_length()) - 1)
+        x = value >> self.WIDTH.bit_length()
+        return x, y, direction
+
+    def reset(self) -> None:
+        """Reset the puzzle to the initial, same as calling `undo` method infinite times.
+
+        :return: None
+        """
+        self.undo(len(self.history))
+
+    def pack(self, codes: Dict[int | float, int]) -> bytes:
+        """Pack the board with `pack_board`, a snapshot for the searches which keep a lot of states. The hash is not
+        included.
+
+        :param codes: value -> code, see `packing_codes`
+        :type codes: Dict[int | float, int]
+        :return: packed board
+        :rtype: bytes
+        """
+        return pack_board(self.snapshot().board, codes)
+
+    def restore_packed(self, board: bytes, values: Sequence[int | float], zobrist_hash: int) -> None:
+        """Same as `restore`, with a board packed by `pack`.
+
+        :param board: packed board
+        :type board: bytes
+        :param values: code -> value of the codes `board` was packed with
+        :type values: Sequence[int | float]
+        :param zobrist_hash: hash of the board
+        :type zobrist_hash: int
+        :return: None
+        """
+        self.restore(PuzzleSnapshot(unpack_board(board, values), zobrist_hash))
+
+
+class NumberPuzzle(BaseNumberPuzzle):
     def __init__(self, puzzle: List[List[int | float]], target: int):
         # Parameter validation
         if not self.is_number(target):
@@ -25,8 +240,6 @@ class NumberPuzzle:
 
         self.pieces = defaultdict(set)
         self.obstacles = set()
-        self.__zobrist_keys = {}
-        self.__zobrist_hash = 0
         has_piece = False
         first_row_width = None
         for y, row in enumerate(puzzle):
@@ -37,10 +250,8 @@ class NumberPuzzle:
                 if self.is_piece(item):
                     has_piece = True
                     self.pieces[item].add((x, y))
-                    self.__calc_hash(x, y, item)
                 elif self.is_obstacle(item):
                     self.obstacles.add((x, y))
-                    self.__calc_hash(x, y, item)
                 elif not self.is_blank(item):
                     raise ValueError(f"invalid value '{item}' in puzzle")
 
@@ -57,8 +268,23 @@ class NumberPuzzle:
         self.WIDTH = len(puzzle)
         self.puzzle = deepcopy(puzzle)
         self.target = target
+        # Zobrist keys met so far, per cell (`y * LENGTH + x`) and value
+        self.__zobrist_keys = [{} for _ in range(self.LENGTH * self.WIDTH)]
+        self.__zobrist_hash = 0
+        for x, y in chain(chain(*self.pieces.values()), self.obstacles):
+            self.__calc_hash(x, y, self[x, y])
+        # Blocker indexes for sliding, bit x of `__row_masks[y]` and bit y of `__column_masks[x]` are set when (x, y)
+        # is not blank
+        self.__row_masks = [0] * self.WIDTH
+        self.__column_masks = [0] * self.LENGTH
+        for x, y in chain(chain(*self.pieces.values()), self.obstacles):
+            self.__row_masks[y] |= 1 << x
+            self.__column_masks[x] |= 1 << y
         self.history = []  # Only storing `move` method calls (with their arguments) history
-        self.__full_history = []  # For inner use, storing every action (move/concat/eval) performed
+        # For inner use, storing every change made to the board as integer records, see `_NO_MERGE`
+        self.__journal = array("q")
+        self.__spill = []  # Operands that do not fit in a journal word, last in first out
+        self.__cell_bits = (self.LENGTH * self.WIDTH - 1).bit_length()
 
     def __getitem__(self, item):
         if isinstance(item, tuple):
@@ -81,81 +307,57 @@ class NumberPuzzle:
     def zobrist_hash(self) -> int:
         return self.__zobrist_hash
 
-    # noinspection PyTypeHints
-    @staticmethod
-    def calc(num1: int, symbol: Literal[0.3, 0.4, 0.5, 0.6, 0.7], num2: int) -> int:
-        if not (NumberPuzzle.is_number(num1) and NumberPuzzle.is_number(num2)):
-            raise ValueError(f"could not perform operation on: {num1} and {num2}")
-        match symbol:
-            case 0.3:  # +
-                return num1 + num2
-            case 0.4:  # -
-                if num1 < num2:
-                    raise ArithmeticError(f"could not subtract {num2} from {num1}")
-                return num1 - num2
-            case 0.5:  # *
-                return num1 * num2
-            case 0.6:  # /
-                if not (ans := num1 / num2).is_integer():
-                    raise ArithmeticError(f"{num1} is not divisible by {num2}")
-                return int(ans)
-            # Self-defined operator 0.7 ('&') -> 3 & 7 = 37, 7 & 3 = 73
-            case 0.7:
-                return int(str(num1) + str(num2))
-            case _:
-                raise ValueError(f"unrecognized operator: {symbol}")
-
-    @staticmethod
-    def is_number(value: Any) -> bool:  # Numbers in the puzzle, non-negative
-        return isinstance(value, int) and value >= 0
-
-    @staticmethod
-    def is_symbol(value: Any) -> bool:  # Inherit the representation of +, -, *, / in Juejin API
-        return value in (0.3, 0.4, 0.5, 0.6)
-
-    @staticmethod
-    def is_piece(value: Any) -> bool:  # Movable pieces in the puzzle
-        return NumberPuzzle.is_number(value) or NumberPuzzle.is_symbol(value)
-
-    @staticmethod
-    def is_blank(value: Any) -> bool:
-        return value == 0.1
-
-    @staticmethod
-    def is_obstacle(value: Any) -> bool:
-        return value == 0.2
-
-    @staticmethod
-    def is_valid_value(value: Any) -> bool:  # Check if it is a valid value on the game board
-        return NumberPuzzle.is_piece(value) or NumberPuzzle.is_obstacle(value) or NumberPuzzle.is_blank(value)
-
     def __calc_hash(self, x, y, piece) -> None:
-        if self.__zobrist_keys.get((x, y, piece)) is None:
-            self.__zobrist_keys[x, y, piece] = int(uuid4())
-        self.__zobrist_hash ^= self.__zobrist_keys[x, y, piece]
-
-    def __create_piece(self, x, y, value):  # Update self.pieces, calculate new Zobrist hash
+        keys = self.__zobrist_keys[y * self.LENGTH + x]
+        if (key := keys.get(piece)) is None:
+            key = keys[piece] = zobrist_key(x, y, piece)
+        self.__zobrist_hash ^= key
+
+    def __push_operand(self, value: int) -> None:
+        if value > _MAX_WORD:
+            self.__spill.append(value)
+            value = -1
+        self.__journal.append(value)
+
+    def __pop_operand(self) -> int:
+        value = self.__journal.pop()
+        return self.__spill.pop() if value < 0 else value
+
+    def __create_piece(self, x, y, value):  # Update self.pieces and blocker indexes, calculate new Zobrist hash
         self.pieces[value].add((x, y))
+        self.__row_masks[y] |= 1 << x
+        self.__column_masks[x] |= 1 << y
         self.__calc_hash(x, y, value)
 
-    def __destroy_piece(self, x, y, value):  # Update self.pieces, calculate new Zobrist hash
+    def __destroy_piece(self, x, y, value):  # Update self.pieces and blocker indexes, calculate new Zobrist hash
         self.pieces[value].remove((x, y))
+        self.__row_masks[y] &= ~(1 << x)
+        self.__column_masks[x] &= ~(1 << y)
         # Remove the set if it is empty
         if not self.pieces[value]:
             del self.pieces[value]
         self.__calc_hash(x, y, value)
 
+    def __relocate_piece(self, from_x, from_y, to_x, to_y, value):  # `__destroy_piece` + `__create_piece` in one go
+        coordinates = self.pieces[value]
+        coordinates.remove((from_x, from_y))
+        coordinates.add((to_x, to_y))
+        row_masks, column_masks = self.__row_masks, self.__column_masks
+        row_masks[from_y] &= ~(1 << from_x)
+        column_masks[from_x] &= ~(1 << from_y)
+        row_masks[to_y] |= 1 << to_x
+        column_masks[to_x] |= 1 << to_y
+        self.__calc_hash(from_x, from_y, value)
+        self.__calc_hash(to_x, to_y, value)
+
     def __move_piece(self, from_x: int, from_y: int, to_x: int, to_y: int) -> None:
         # Move a piece all the way horizontally or vertically until it meets another piece or an obstacle
         # Therefore, either from_x == to_x or from_y == to_y in order to be valid
         # Still no parameter validation here, as we are simply 'teleporting' a piece from one place to another
         # `__move` method will find a legal (to_x, to_y) for this
-        value = self[from_x, from_y]
-        self[from_x, from_y], self[to_x, to_y] = 0.1, value
-
-        self.__destroy_piece(from_x, from_y, value)
-        self.__create_piece(to_x, to_y, value)
-        self.__full_history.append(("move", from_x, from_y, to_x, to_y))
+        value = self.puzzle[from_y][from_x]
+        self.puzzle[from_y][from_x], self.puzzle[to_y][to_x] = 0.1, value
+        self.__relocate_piece(from_x, from_y, to_x, to_y, value)
 
     # noinspection PyTypeHints
     def __concat_numbers(self, from_x: int, to_x: int, y: int) -> Tuple[Tuple[int, int], Tuple[int, Literal[0.7], int]]:
@@ -167,7 +369,8 @@ class NumberPuzzle:
         self.__destroy_piece(from_x, y, num1)
         self.__destroy_piece(to_x, y, num2)
         self.__create_piece(to_x, y, ans)
-        self.__full_history.append(("concat", num1, num2, from_x, to_x, y))
+        self.__push_operand(num1)
+        self.__push_operand(num2)
         return (to_x, y), (num2, 0.7, num1) if from_x > to_x else (num1, 0.7, num2)
 
     # noinspection PyTypeHints
@@ -187,75 +390,35 @@ class NumberPuzzle:
         self.__destroy_piece(symbol_x, y, symbol)
         self.__destroy_piece(val2_x, y, val2)
         self.__create_piece(symbol_x, y, ans)
-        self.__full_history.append(("eval", val1, symbol, val2, symbol_x, y))
+        self.__push_operand(val1)
+        self.__push_operand(val2)
         return (symbol_x, y), (val1, symbol, val2)
 
     # noinspection PyTypeHints
     def __find_destination_and_move(self, x: int, y: int, direction: Direction) -> Tuple[int, int]:
-        is_increasing = direction in (Direction.RIGHT, Direction.DOWN)
-        is_moving_horizontally = direction in (Direction.LEFT, Direction.RIGHT)
-        if is_increasing:
-            start = x + 1 if is_moving_horizontally else y + 1
-            stop = self.LENGTH if is_moving_horizontally else self.WIDTH
-            step = 1
+        # Look up the nearest blocker in the row/column instead of walking cell by cell
+        if is_moving_horizontally := direction in (Direction.LEFT, Direction.RIGHT):
+            line, pos, size = self.__row_masks[y], x, self.LENGTH
         else:
-            start = x - 1 if is_moving_horizontally else y - 1
-            stop = -1
-            step = -1
-
-        changed = False
-        for loc in range(start, stop, step):
-            val_at_loc = self[loc, y] if is_moving_horizontally else self[x, loc]
-            if not self.is_blank(val_at_loc):
-                loc -= step
-                break
-            changed = True
+            line, pos, size = self.__column_masks[x], y, self.WIDTH
 
-        if not changed:
+        if direction in (Direction.RIGHT, Direction.DOWN):
+            # The lowest set bit above `pos` is the blocker, stop right before it
+            blockers = line >> (pos + 1)
+            loc = pos + (blockers & -blockers).bit_length() - 1 if blockers else size - 1
+        else:
+            # The highest set bit below `pos` is the blocker, stop right after it
+            loc = (line & ((1 << pos) - 1)).bit_length()
+
+        if loc == pos:
             return x, y
         if is_moving_horizontally:
-            # noinspection PyUnboundLocalVariable
-            # I am quite sure that reference before assignment will not occur
             self.__move_piece(x, y, loc, y)
             return loc, y
         else:
-            # noinspection PyUnboundLocalVariable
-            # I am quite sure that reference before assignment will not occur
             self.__move_piece(x, y, x, loc)
             return x, loc
 
-    def encode_history_record(self, x: int, y: int, direction: Direction) -> int:
-        """Encode the history record into an integer. The first `self.LENGTH.bit_length()` bits represent
-        the x-coordinate of the piece, followed by `self.WIDTH.bit_length()` bits of the y-coordinate. The last two bits
-        are direction.
-
-        :param x: x-coordinate of the piece
-        :type x: int
-        :param y: y-coordinate of the piece
-        :type y: int
-        :param direction: moving direction
-        :type direction: Direction
-        :return: Encoded record
-        :rtype: int
-        """
-        # As the size of the history grows too rapidly (and causes MemoryError), I came up with this solution
-        return x << (self.WIDTH.bit_length() + 2) | y << 2 | direction.value
-
-    def decode_history_record(self, value: int) -> Tuple[int, int, Direction]:
-        """Reverse process of `encode_history_record` method, see that method for more information.
-
-        :param value: Encoded record
-        :type value: int
-        :return: x-coordinate and y-coordinate of the piece as well as direction (either left, right, up or down)
-        :rtype: Tuple[int, int, Direction]
-        """
-        direction = Direction(value & 0b11)
-
-        value >>= 2
-        y = value & ((1 << self.WIDTH.bit_length()) - 1)
-        x = value >> self.WIDTH.bit_length()
-        return x, y, direction
-
     # noinspection PyTypeHints
     def move(self, x: int, y: int, direction: Direction) \
             -> Tuple[Tuple[int, int], Tuple[int, Literal[0.3, 0.4, 0.5, 0.6, 0.7], int] | None]:
@@ -284,29 +447,33 @@ class NumberPuzzle:
         #   - move + concat
         #   - eval
         #   - concat
-        # We need something to separate moves: None (as a header of each move)
-        self.__full_history.append(None)
+        # All of them are journaled as a single header, written once the move is done
         operands = None
-        x, y = self.__find_destination_and_move(x, y, direction)
+        merge = _NO_MERGE
+        x, y = slid_x, slid_y = self.__find_destination_and_move(x, y, direction)
 
         if direction in (Direction.LEFT, Direction.RIGHT):
             plus_minus = add if direction == Direction.RIGHT else sub
 
-            if self.is_number(self[x, y]) and 0 <= (next_or_last_x := plus_minus(x, 1)) < self.WIDTH:
+            if self.is_number(self[x, y]) and 0 <= (next_or_last_x := plus_minus(x, 1)) < self.LENGTH:
                 if self.is_number(self[next_or_last_x, y]):
                     (x, y), operands = self.__concat_numbers(x, next_or_last_x, y)  # from_x, to_x, y
-                elif 0 <= (next_next_or_last_last_x := plus_minus(next_or_last_x, 1)) < self.WIDTH and \
+                    merge = _CONCAT
+                elif 0 <= (next_next_or_last_last_x := plus_minus(next_or_last_x, 1)) < self.LENGTH and \
                         self.is_symbol(self[next_or_last_x, y]) and \
                         self.is_number(self[next_next_or_last_last_x, y]):
                     try:
                         (x, y), operands = self.__eval_numbers(next_or_last_x, y)  # symbol_x, y
+                        merge = _EVAL | _SYMBOLS.index(operands[1]) << _SYMBOL_SHIFT
                     except ArithmeticError:
                         pass
 
-        # If no changes, pop `None`
-        if original_x == x and original_y == y:
-            self.__full_history.pop()
-        else:
+        # If no changes, nothing is journaled
+        if original_x != x or original_y != y:
+            if direction == Direction.RIGHT:
+                merge |= _RIGHT_MERGE
+            self.__journal.append(((original_y * self.LENGTH + original_x) << self.__cell_bits |
+                                   slid_y * self.LENGTH + slid_x) << _HEADER_BITS | merge)
             self.history.append(self.encode_history_record(original_x, original_y, direction))
         return (x, y), operands
 
@@ -319,12 +486,51 @@ class NumberPuzzle:
         keys = self.pieces.keys()
         return len(keys) == 1 and next(iter(keys)) == self.target
 
-    def reset(self) -> None:
-        """Reset the puzzle to the initial, same as calling `undo` method infinite times.
+    def snapshot(self) -> PuzzleSnapshot:
+        """Take an immutable copy of the board (and its hash), which can be restored or forked later.
 
+        :return: A snapshot
+        :rtype: PuzzleSnapshot
+        """
+        return PuzzleSnapshot(tuple(chain.from_iterable(self.puzzle)), self.__zobrist_hash)
+
+    def pack(self, codes: Dict[int | float, int]) -> bytes:
+        """Same as `BaseNumberPuzzle.pack`, without building a snapshot first."""
+        return pack_board(chain.from_iterable(self.puzzle), codes)
+
+    def restore(self, snapshot: PuzzleSnapshot) -> None:
+        """Bring the board back to a snapshot taken from this puzzle, without replaying any moves.
+
+        The history is left untouched, so `undo` only works for the moves made after restoring.
+
+        :param snapshot: A snapshot
+        :type snapshot: PuzzleSnapshot
         :return: None
         """
-        self.undo(len(self.__full_history))
+        board = snapshot.board
+        self.puzzle = [list(board[y * self.LENGTH:(y + 1) * self.LENGTH]) for y in range(self.WIDTH)]
+        self.pieces.clear()
+        self.__row_masks = [0] * self.WIDTH
+        self.__column_masks = [0] * self.LENGTH
+        for index, value in enumerate(board):
+            if not self.is_blank(value):
+                y, x = divmod(index, self.LENGTH)
+                if self.is_piece(value):
+                    self.pieces[value].add((x, y))
+                self.__row_masks[y] |= 1 << x
+                self.__column_masks[x] |= 1 << y
+        self.__zobrist_hash = snapshot.zobrist_hash
+
+    def fork(self, snapshot: PuzzleSnapshot | None = None) -> "NumberPuzzle":
+        """Create a new puzzle, with an empty history, from a snapshot.
+
+        :param snapshot: A snapshot, the current state if None
+        :type snapshot: PuzzleSnapshot | None
+        :return: A new puzzle
+        :rtype: NumberPuzzle
+        """
+        board = (self.snapshot() if snapshot is None else snapshot).board
+        return type(self)([list(board[y * self.LENGTH:(y + 1) * self.LENGTH]) for y in range(self.WIDTH)], self.target)
 
     def undo(self, move_count: int = 1) -> None:
         """Return the state of the puzzle to `move_count` number of moves before.
@@ -334,43 +540,35 @@ class NumberPuzzle:
         :return: None
         :raises ValueError: invalid `move_count`
         """
+        journal = self.__journal
+        board = self.puzzle
+        cell_mask = (1 << self.__cell_bits) - 1
         for _ in range(move_count):  # Undo `move_count` times
-            if len(self.__full_history) == 0:  # `move_count` > len(history)
+            if not journal:  # `move_count` > len(history)
                 break
 
-            while True:
-                item = self.__full_history.pop()
-                if item is None:
-                    break
-
-                cmd, *args = item
-                match cmd:
-                    case "move":
-                        from_x, from_y, to_x, to_y = args
-                        val = self[to_x, to_y]
-                        self[from_x, from_y], self[to_x, to_y] = val, 0.1
-
-                        self.__destroy_piece(to_x, to_y, val)
-                        self.__create_piece(from_x, from_y, val)
-                    case "concat":
-                        val1, val2, from_x, to_x, y = args
-                        val_after = self[to_x, y]
-                        self[from_x, y], self[to_x, y] = val1, val2
-
-                        self.__destroy_piece(to_x, y, val_after)
-                        self.__create_piece(from_x, y, val1)
-                        self.__create_piece(to_x, y, val2)
-                        self.__calc_hash(to_x, y, val2)
-                    case "eval":
-                        val1, symbol, val2, symbol_x, y = args
-                        val1_x = symbol_x - 1
-                        val2_x = symbol_x + 1
-                        val_after = self[symbol_x, y]
-                        self[val1_x, y], self[symbol_x, y], self[val2_x, y] = val1, symbol, val2
-
-                        self.__destroy_piece(symbol_x, y, val_after)
-                        self.__create_piece(val1_x, y, val1)
-                        self.__create_piece(symbol_x, y, symbol)
-                        self.__create_piece(val2_x, y, val2)
-                        self.__calc_hash(val2_x, y, val2)
+            header = journal.pop()
+            cells = header >> _HEADER_BITS
+            from_y, from_x = divmod(cells >> self.__cell_bits, self.LENGTH)
+            y, x = divmod(cells & cell_mask, self.LENGTH)  # Where the piece slid to
+            if merge := header & _MERGE_MASK:
+                next_x = x + 1 if header & _RIGHT_MERGE else x - 1
+                val2 = self.__pop_operand()
+                val1 = self.__pop_operand()
+                if merge == _CONCAT:
+                    self.__destroy_piece(next_x, y, board[y][next_x])
+                    board[y][x], board[y][next_x] = val1, val2
+                    self.__create_piece(x, y, val1)
+                    self.__create_piece(next_x, y, val2)
+                else:  # _EVAL, `next_x` is the symbol
+                    symbol = _SYMBOLS[header >> _SYMBOL_SHIFT & 0b11]
+                    self.__destroy_piece(next_x, y, board[y][next_x])
+                    board[y][next_x - 1], board[y][next_x], board[y][next_x + 1] = val1, symbol, val2
+                    self.__create_piece(next_x - 1, y, val1)
+                    self.__create_piece(next_x, y, symbol)
+                    self.__create_piece(next_x + 1, y, val2)
+            if from_x != x or from_y != y:
+                val = board[y][x]
+                board[from_y][from_x], board[y][x] = val, 0.1
+                self.__relocate_piece(x, y, from_x, from_y, val)
             self.history.pop()
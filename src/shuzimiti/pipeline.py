@@ -0,0 +1,156 @@
+from collections import deque
+from concurrent.futures import Future, ThreadPoolExecutor
+from time import perf_counter
+from typing import Any, Callable, List, NamedTuple, Tuple
+
+from api import JuejinGameSession
+
+
+class LevelTimings(NamedTuple):
+    """Latencies of a level played by `LevelPipeline`, in seconds."""
+    round: int
+    fetch: float  # Round-trip of the request starting the level...
+    fetch_wait: float  # ...and how long the main thread waited for it, less than `fetch` if it was prefetched
+    solve: float  # From the level being handed out to its commands being submitted (or the level skipped)
+    submit: float | None  # Round-trip of the request completing the level, None if the level was skipped
+
+    def describe(self) -> str:
+        """One line summary for the console.
+
+        :return: summary
+        :rtype: str
+        """
+        submit = "skipped" if self.submit is None else f"submit {self.submit:.2f}s"
+        return (f"Network: fetch {self.fetch:.2f}s (waited {self.fetch_wait:.2f}s), {submit}; "
+                f"solve {self.solve:.2f}s")
+
+
+class LevelPipeline:
+    """Plays levels one after another, with the network and the console off the critical path.
+
+    Requests are sent in order by a network thread: the next level is fetched as soon as the server allows it, i.e.
+    right after the previous one is submitted, while the main thread carries on. Logging and cache writes queued with
+    `log` run in order on a background thread. Use it as a context manager, both threads are joined on exit::
+
+        with LevelPipeline(session, keep_going) as pipeline:
+            while (data := pipeline.next_level()) is not None:
+                pipeline.submit(solve(data), lambda response, timings: print(response, timings.describe()))
+
+    Errors of the requests are raised by the next call of `next_level`, errors of the background thread by the next call
+    of `next_level` or `log`.
+    """
+
+    def __init__(self, session: JuejinGameSession, keep_going: Callable[[], bool] = lambda: True):
+        self.session = session
+        self.keep_going = keep_going  # Checked before fetching a level, the run ends when it returns False
+        self.__network = ThreadPoolExecutor(1, thread_name_prefix="network")
+        self.__background = ThreadPoolExecutor(1, thread_name_prefix="background")
+        self.__background_tasks = deque()
+        self.__fetching = None  # Future of the level being fetched
+        self.__level = None  # (data, fetch seconds, fetch wait, time handed out) of the level being played
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        if exc_type is None:
+            self.close()
+        else:  # Do not hide the exception behind one of the background thread
+            self.__network.shutdown()
+            self.__background.shutdown()
+
+    def close(self) -> None:
+        """Wait for the queued requests and background tasks, then stop the threads.
+
+        :return: None
+        """
+        self.__network.shutdown()
+        self.__background.shutdown()
+        self.__check_background()
+
+    def __check_background(self) -> None:
+        while self.__background_tasks and self.__background_tasks[0].done():
+            self.__background_tasks.popleft().result()
+
+    def log(self, function: Callable[..., Any], *args, **kwargs) -> None:
+        """Call a function on the background thread, after every function queued before.
+
+        :param function: e.g. `print`, or a function writing to a cache
+        :type function: Callable[..., Any]
+        :param args: positional arguments of the function
+        :param kwargs: keyword arguments of the function
+        :return: None
+        """
+        self.__check_background()
+        self.__background_tasks.append(self.__background.submit(function, *args, **kwargs))
+
+    def __fetch(self, submitting: Future | None) -> Tuple[dict | None, float]:
+        if submitting is not None:
+            submitting.result()  # A failed submission stops the run, it is raised by `next_level`
+        if not self.keep_going():
+            return None, 0.0
+        start = perf_counter()
+        data = self.session.fetch_level_data()
+        return data, perf_counter() - start
+
+    @staticmethod
+    def __timed(function: Callable[..., Any], *args) -> Tuple[Any, float]:
+        start = perf_counter()
+        result = function(*args)
+        return result, perf_counter() - start
+
+    def next_level(self) -> dict | None:
+        """The next level, prefetched if the previous one was submitted.
+
+        :return: data of the level, None if `keep_going` returned False before it was fetched
+        :rtype: dict | None
+        :raises JuejinError: the level or the submission of the previous one was rejected
+        """
+        self.__check_background()
+        if self.__fetching is None:
+            self.__fetching = self.__network.submit(self.__fetch, None)
+        wait_start = perf_counter()
+        try:
+            data, fetch_seconds = self.__fetching.result()
+        finally:
+            self.__fetching = None
+        handed_out = perf_counter()
+        self.__level = data, fetch_seconds, handed_out - wait_start, handed_out
+        return data
+
+    def __timings(self, submit_seconds: float | None) -> LevelTimings:
+        data, fetch_seconds, fetch_wait, handed_out = self.__level
+        return LevelTimings(data["round"], fetch_seconds, fetch_wait, perf_counter() - handed_out, submit_seconds)
+
+    def submit(self, commands: List[list], done: Callable[[dict, LevelTimings], Any] | None = None) -> None:
+        """Submit the commands of the level and fetch the next one, both in the background.
+
+        :param commands: commands in the form `JuejinGameSession.submit_level` takes
+        :type commands: List[list]
+        :param done: called on the background thread with the response and the timings once the level is submitted,
+            e.g. to log them and cache the commands; not called if the submission fails
+        :type done: Callable[[dict, LevelTimings], Any] | None
+        :return: None
+        """
+        timings = self.__timings(None)
+        submitting = self.__network.submit(self.__timed, self.session.submit_level, commands)
+        self.__fetching = self.__network.submit(self.__fetch, submitting)
+        if done is not None:
+            self.log(self.__done, submitting, timings, done)
+
+    @staticmethod
+    def __done(submitting: Future, timings: LevelTimings, done: Callable[[dict, LevelTimings], Any]) -> None:
+        if submitting.exception() is not None:
+            return  # Raised by `next_level`
+        response, submit_seconds = submitting.result()
+        done(response, timings._replace(submit=submit_seconds))
+
+    def skip(self) -> LevelTimings:
+        """Give up the level and fetch another one in the background.
+
+        :return: timings of the level
+        :rtype: LevelTimings
+        """
+        timings = self.__timings(None)
+        self.__fetching = self.__network.submit(self.__fetch, None)
+        return timings
@@ -1,6 +1,12 @@
+from typing import List
+
 from api import JuejinGameSession
-from number_puzzle import NumberPuzzle
-from solve import find_valid_calculations, bfs
+from cache import SolutionCache
+from checkpoint import checkpoint_path
+from number_puzzle import BaseNumberPuzzle, NumberPuzzle
+from pipeline import LevelPipeline, LevelTimings
+from solve import GaveUp, make_puzzle, solve, to_commands
+from stats import SolverStats
 
 PPRINT_GRID_LEFT_RIGHT_PADDING = 1
 FLOAT_TO_SYMBOL = {
@@ -12,15 +18,15 @@ FLOAT_TO_SYMBOL = {
 }
 
 
-def pprint_puzzle(puzzle: NumberPuzzle) -> None:
+def pprint_puzzle(puzzle: BaseNumberPuzzle) -> None:
     """Pretty Juejin Number Puzzle.
 
     :param puzzle: A puzzle
-    :type puzzle: NumberPuzzle
+    :type puzzle: BaseNumberPuzzle
     :return: None
     """
-    if not isinstance(puzzle, NumberPuzzle):
-        raise TypeError(f"{puzzle} is not a {NumberPuzzle.__name__}")
+    if not isinstance(puzzle, BaseNumberPuzzle):
+        raise TypeError(f"{puzzle} is not a {BaseNumberPuzzle.__name__}")
 
     def _format_piece(item):
         match item:
@@ -43,45 +49,114 @@ def pprint_puzzle(puzzle: NumberPuzzle) -> None:
 
 
 if __name__ == "__main__":
-    from time import time
+    from functools import partial
+    from multiprocessing import get_all_start_methods, get_context
+    from os import cpu_count, environ
+    from signal import SIGTERM, signal
+    from threading import Event
+    from time import monotonic
 
     from __init__ import session_id
 
     session = JuejinGameSession(session_id)
-
-    while True:
-        data = session.fetch_level_data()
-        start_time = time()
-
-        np = NumberPuzzle(data["map"], data["target"])
-        print("Level", data["round"])
-        pprint_puzzle(np)
-        print("Target:", data["target"])
-        print()
-
-        print("Calculations:")
-        solution_generator = find_valid_calculations(np)
-        solution = next(solution_generator, None)
-        if solution is None:
-            print("This puzzle is not solvable. Report this to the author if you think this is a bug.")
-            exit()
-        for num1, symbol, num2 in solution:
-            print(num1, FLOAT_TO_SYMBOL[symbol], num2)
-        print()
-
-        print("Steps:")
-        last_until = 0
-        data_to_submit = []
-        for step in solution:
-            bfs(np, *step)
-            for record in np.history[last_until:]:
-                x, y, direction = np.decode_history_record(record)
-                print(f"({x}, {y}) {direction.name}")
-                data_to_submit.append([y, x, direction.name[0].lower()])
-            last_until = len(np.history)
-            print()
-        print(session.submit_level(data_to_submit))
+    workers = int(environ.get("SHUZIMITI_WORKERS") or cpu_count() or 1)
+    cache = SolutionCache(environ.get("SHUZIMITI_CACHE") or ".cache/shuzimiti.sqlite3")
+    checkpoint_directory = environ.get("SHUZIMITI_CHECKPOINTS") or ".cache/checkpoints"
+    # Stop searching on SIGTERM (e.g. from `timeout`), the progress is saved in a checkpoint for the next run
+    terminated = Event()
+    signal(SIGTERM, lambda signum, frame: terminated.set())
+    # Seconds for the whole run (stop before the workflow kills the script) and for each level
+    budget = float(environ.get("SHUZIMITI_BUDGET") or 280)
+    level_budget = float(environ.get("SHUZIMITI_LEVEL_BUDGET") or 60)
+    # Opt-in: solver stats of every level appended to a JSON lines file, progress printed every few seconds
+    stats_file = environ.get("SHUZIMITI_STATS")
+    progress_interval = float(environ.get("SHUZIMITI_PROGRESS") or 0)
+    # The pipeline runs threads, so the solver workers are not forked from this process but from a server process
+    # started (without forking) beforehand, see `solve.solve`
+    mp_context = get_context("forkserver" if "forkserver" in get_all_start_methods() else "spawn")
+    if mp_context.get_start_method() == "forkserver":
+        mp_context.set_forkserver_preload(["solve"])
+    run_start = monotonic()
+    run_deadline = run_start + budget
+
+    def _write_stats(stats: SolverStats, round_: int, outcome: str, seconds: float,
+                     timings: LevelTimings | None = None) -> None:
+        network = {} if timings is None else {"fetch": timings.fetch, "fetch_wait": timings.fetch_wait,
+                                              "submit": timings.submit}
+        with open(stats_file, "a") as file:
+            stats.write_json_line(file, round=round_, outcome=outcome, seconds=seconds, **network)
+
+    def _print_budget(level_start: float) -> None:
+        print(f"Budget used: {monotonic() - level_start:.1f}s of {level_budget:g}s, "
+              f"{monotonic() - run_start:.1f}s of {budget:g}s in total")
+
+    def _submitted(data: dict, commands: List[list], stats: SolverStats | None, level_start: float, response: dict,
+                   timings: LevelTimings) -> None:
+        # Runs on the background thread of the pipeline, while the next level is being fetched or solved
+        print(response)
+        cache.put(data["map"], data["target"], commands, data["round"])
+        if stats is not None:
+            _write_stats(stats, data["round"], "solved", timings.solve, timings)
         print()
-
-        end_time = time()
-        print("Time taken:", end_time - start_time)
+        print(timings.describe())
+        _print_budget(level_start)
+
+    unsolvable = False
+    # Requests, console output and cache writes overlap the solver, see `LevelPipeline`
+    with LevelPipeline(session, lambda: monotonic() < run_deadline and not terminated.is_set()) as pipeline:
+        while (data := pipeline.next_level()) is not None:
+            level_start = monotonic()
+
+            np = make_puzzle(data["map"], data["target"])
+            pipeline.log(print, "Level", data["round"])
+            # The solver moves the pieces of `np` while the board is printed
+            pipeline.log(pprint_puzzle, NumberPuzzle(data["map"], data["target"]))
+            pipeline.log(print, "Target:", data["target"], end="\n\n")
+
+            level_stats = None  # Written to `stats_file`
+            data_to_submit = cache.get(data["map"], data["target"])
+            if data_to_submit is not None:
+                pipeline.log(print, "Solution found in cache.", end="\n\n")
+            else:
+                stats = SolverStats(lambda s: pipeline.log(print, f"... {s.expanded} states expanded, {s.plans} plans, "
+                                                                  f"frontier peak {s.frontier_peak}"),
+                                    progress_interval) if progress_interval > 0 else SolverStats()
+                solution = solve(np, workers, strategies=("beam", "astar"),
+                                 deadline=min(level_start + level_budget, run_deadline), interrupt=terminated.is_set,
+                                 checkpoint_file=checkpoint_path(checkpoint_directory, data["map"], data["target"]),
+                                 stats=stats, mp_context=mp_context)
+                if stats_file:
+                    level_stats = stats
+                if solution is None:
+                    if level_stats is not None:
+                        pipeline.log(_write_stats, level_stats, data["round"], "unsolvable", monotonic() - level_start)
+                    pipeline.log(print, "This puzzle is not solvable. Report this to the author if you think this "
+                                        "is a bug.")
+                    unsolvable = True
+                    break
+                if isinstance(solution, GaveUp):
+                    timings = pipeline.skip()
+                    if level_stats is not None:
+                        pipeline.log(_write_stats, level_stats, data["round"], "gave_up", timings.solve, timings)
+                    pipeline.log(print, f"Gave up after {solution.candidates} candidate(s) at depth limit "
+                                        f"{solution.max_depth}, skipping this level. The progress is saved for the "
+                                        f"next run.")
+                    pipeline.log(print, timings.describe())
+                    pipeline.log(_print_budget, level_start)
+                    pipeline.log(print)
+                    continue
+
+                calculations = "\n".join(f"{num1} {FLOAT_TO_SYMBOL[symbol]} {num2}"
+                                         for num1, symbol, num2 in solution.plan)
+                steps = "\n".join(f"({x}, {y}) {direction.name}"
+                                  for x, y, direction in map(np.decode_history_record, solution.moves))
+                pipeline.log(print, f"Calculations:\n{calculations}\n\nSteps:\n{steps}\n")
+                data_to_submit = to_commands(np, solution.moves)
+            pipeline.submit(data_to_submit, partial(_submitted, data, data_to_submit, level_stats, level_start))
+            pipeline.log(print)
+    session.close()
+    cache.close()
+    if unsolvable:
+        print("Stopped at an unsolvable level.")
+        exit()
+    print("Terminated." if terminated.is_set() else "Run budget used up.")
@@ -1,62 +1,619 @@
+import struct
+from array import array
 from collections import deque
-from copy import copy
-from itertools import chain, zip_longest
-from typing import List, Literal, Generator, Tuple
+from contextlib import nullcontext
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+from functools import lru_cache
+from heapq import heappop, heappush, nsmallest
+from itertools import chain, count, islice, product
+from math import inf
+from multiprocessing import get_context
+from multiprocessing.context import BaseContext
+from time import monotonic
+from typing import Callable, ContextManager, FrozenSet, Iterable, List, Literal, Generator, NamedTuple, Set, Tuple
 
-from number_puzzle import Direction, NumberPuzzle
+from batched import batched_bfs
+from cache import board_key
+from checkpoint import CHECKPOINT_INTERVAL, Checkpoint, SearchState, discard_checkpoint, load_checkpoint, \
+    save_checkpoint
+from compact_puzzle import MAX_NUMBERS, CompactNumberPuzzle
+from geometry import feasible_components, plan_cost, slide_components, slide_distances, step_lower_bound
+from number_puzzle import BaseNumberPuzzle, Direction, NumberPuzzle, packing_codes
+from stats import SolverStats
+from transposition import TranspositionTable
+
+
+COMMUTATIVE_SYMBOLS = (0.3, 0.5)
+INTERRUPT_CHECK_INTERVAL = 1024
+DEFAULT_TABLE_BYTES = 64 << 20
+DEEPENING_DEPTHS = (8, 16, 32, None)
+BEAM_WIDTHS = (256, 2048)  # Beam widths of `beam_search`, each one a restart after the previous one fails
+BEAM_MAX_DEPTH = 64  # Depth limits per step of the passes of `solve` when it has a deadline
+# A frontier entry of `bfs` is the packed board (see `BaseNumberPuzzle.pack`) followed by its hash, node and depth
+FRONTIER_SUFFIX = struct.Struct("<QII")
+
+
+class GaveUp(NamedTuple):
+    """Returned by `solve` when its deadline passes before a solution is found."""
+    candidates: int  # Candidates started, including the one interrupted
+    max_depth: int | None  # Depth limit of the pass being searched, the passes below it found no solution
+
+
+class Solution(NamedTuple):
+    """A verified solution, see `solve`."""
+    plan: List[Tuple[int, Literal[0.3, 0.4, 0.5, 0.6, 0.7], int]]
+    strategy: str
+    moves: List[int]  # Encoded by `NumberPuzzle.encode_history_record`
+
+
+def _phase(stats: SolverStats | None, name: str) -> ContextManager:
+    return nullcontext() if stats is None else stats.phase(name)
+
+
+def _searching(stats: SolverStats | None, table: TranspositionTable) -> ContextManager:
+    return nullcontext() if stats is None else stats.search(table)
+
+
+def _sub_multisets(items: Tuple) -> Generator[Tuple[Tuple, Tuple], None, None]:
+    # Yield every (chosen, rest) split of a sorted tuple, each distinct sub-multiset once, both of them stay sorted
+    distinct = sorted(set(items))
+    counts = [items.count(item) for item in distinct]
+    for chosen_counts in product(*(range(item_count + 1) for item_count in counts)):
+        chosen = []
+        rest = []
+        for item, chosen_count, item_count in zip(distinct, chosen_counts, counts):
+            chosen.extend([item] * chosen_count)
+            rest.extend([item] * (item_count - chosen_count))
+        yield tuple(chosen), tuple(rest)
+
+
+def _splits(numbers: Tuple[int, ...], symbols: Tuple[float, ...]) \
+        -> Generator[Tuple[Tuple[int, ...], Tuple[float, ...], float, Tuple[int, ...], Tuple[float, ...]], None, None]:
+    # Every way to build the last calculation: (left numbers, left symbols, symbol, right numbers, right symbols)
+    for left_numbers, right_numbers in _sub_multisets(numbers):
+        if not left_numbers or not right_numbers:
+            continue
+        for symbol in sorted(set(symbols)):
+            remaining = list(symbols)
+            remaining.remove(symbol)
+            for left_symbols, right_symbols in _sub_multisets(tuple(remaining)):
+                if len(left_symbols) == len(left_numbers) - 1:
+                    yield left_numbers, left_symbols, symbol, right_numbers, right_symbols
+
+
+def canonicalize(numbers, symbols) -> Tuple[Tuple[int, ...], Tuple[float, ...]] | None:
+    """Sort the numbers and the symbols, then pad the symbols with concatenations (0.7) so that every number is used.
+
+    :param numbers: numbers
+    :type numbers: Iterable[int]
+    :param symbols: symbols
+    :type symbols: Iterable[float]
+    :return: sorted numbers and symbols, None if there are too many symbols to use them all
+    :rtype: Tuple[Tuple[int, ...], Tuple[float, ...]] | None
+    """
+    numbers = tuple(sorted(numbers))
+    symbols = list(symbols)
+    if (concat_count := len(numbers) - len(symbols) - 1) < 0:
+        return None
+    symbols.extend([0.7] * concat_count)
+    return numbers, tuple(sorted(symbols))
+
+
+@lru_cache(maxsize=1 << 16)
+def reachable_values(numbers: Tuple[int, ...], symbols: Tuple[float, ...]) -> FrozenSet[int]:
+    """All the values that the numbers can be calculated into, using every symbol exactly once.
+
+    :param numbers: numbers, in the form returned by `canonicalize`
+    :type numbers: Tuple[int, ...]
+    :param symbols: symbols, in the form returned by `canonicalize`
+    :type symbols: Tuple[float, ...]
+    :return: reachable values
+    :rtype: FrozenSet[int]
+    """
+    if len(numbers) == 1:
+        return frozenset(numbers)
+
+    values = set()
+    for left_numbers, left_symbols, symbol, right_numbers, right_symbols in _splits(numbers, symbols):
+        right_values = reachable_values(right_numbers, right_symbols)
+        for num1 in reachable_values(left_numbers, left_symbols):
+            for num2 in right_values:
+                try:
+                    values.add(NumberPuzzle.calc(num1, symbol, num2))
+                except ArithmeticError:
+                    pass
+    return frozenset(values)
+
+
+def is_reachable(numbers, symbols, target: int) -> bool:
+    """Check whether `target` can be calculated from the numbers using every symbol.
+
+    :param numbers: numbers
+    :type numbers: Iterable[int]
+    :param symbols: symbols, concatenations (0.7) are padded automatically
+    :type symbols: Iterable[float]
+    :param target: target
+    :type target: int
+    :return: True if `target` is reachable, False otherwise
+    :rtype: bool
+    """
+    canonical = canonicalize(numbers, symbols)
+    return canonical is not None and target in reachable_values(*canonical)
 
 
 # noinspection PyTypeHints
-def find_valid_calculations(puzzle: NumberPuzzle) \
+def _second_operands(num1: int, symbol: Literal[0.3, 0.4, 0.5, 0.6, 0.7], target: int, candidates: FrozenSet[int]) \
+        -> List[int]:
+    # Solve `num1 symbol num2 == target` for num2 instead of trying every candidate
+    match symbol:
+        case 0.3:
+            options = (target - num1,)
+        case 0.4:
+            options = (num1 - target,)
+        case 0.5:
+            options = candidates if num1 == 0 else (target // num1,)
+        case 0.6:
+            options = candidates if target == 0 else (num1 // target,)
+        case _ if num1 == 0:  # Leading zero is dropped, 0 & 7 = 7
+            options = (target,)
+        case _:
+            target_str, num1_str = str(target), str(num1)
+            rest = target_str[len(num1_str):]
+            options = (int(rest),) if target_str.startswith(num1_str) and rest else ()
+
+    operands = []
+    for num2 in options:
+        if num2 in candidates:
+            try:
+                if NumberPuzzle.calc(num1, symbol, num2) == target:
+                    operands.append(num2)
+            except ArithmeticError:
+                pass
+    return sorted(operands)
+
+
+# noinspection PyTypeHints
+def _plans(numbers: Tuple[int, ...], symbols: Tuple[float, ...], target: int) \
+        -> Generator[List[Tuple[int, Literal[0.3, 0.4, 0.5, 0.6, 0.7], int]], None, None]:
+    if len(numbers) == 1:
+        if numbers[0] == target:
+            yield []
+        return
+
+    for left_numbers, left_symbols, symbol, right_numbers, right_symbols in _splits(numbers, symbols):
+        # Swapping both sides of a commutative calculation gives the same plan
+        is_commutative = symbol in COMMUTATIVE_SYMBOLS
+        if is_commutative and (left_numbers, left_symbols) > (right_numbers, right_symbols):
+            continue
+
+        right_values = reachable_values(right_numbers, right_symbols)
+        for num1 in sorted(reachable_values(left_numbers, left_symbols)):
+            for num2 in _second_operands(num1, symbol, target, right_values):
+                if is_commutative and (left_numbers, left_symbols) == (right_numbers, right_symbols) and num1 > num2:
+                    continue
+                for left_plan in _plans(left_numbers, left_symbols, num1):
+                    for right_plan in _plans(right_numbers, right_symbols, num2):
+                        yield left_plan + right_plan + [(num1, symbol, num2)]
+
+
+# noinspection PyTypeHints
+def find_valid_calculations(puzzle: BaseNumberPuzzle, stats: SolverStats | None = None) \
         -> Generator[List[Tuple[int, Literal[0.3, 0.4, 0.5, 0.6, 0.7], int]], None, None]:
     """Find all valid calculations that are able to solve the given puzzle.
 
+    Calculations are built top-down from `reachable_values`, so branches that cannot reach the target are never
+    explored. Plans that only differ in the order of independent steps or in the order of the operands of a commutative
+    calculation are yielded once (`bfs` accepts the operands of + and * in either order).
+
     :param puzzle: A puzzle
-    :type puzzle: NumberPuzzle
+    :type puzzle: BaseNumberPuzzle
+    :param stats: counts the plans yielded and times their enumeration as the "plans" phase
+    :type stats: SolverStats | None
     :return: A generator, yield a valid calculation a time
     :rtype: Generator[List[Tuple[int, Literal[0.3, 0.4, 0.5, 0.6, 0.7], int]], None, None]
     """
 
-    def _inner(_numbers, _symbols, target, history=None):
-        if history is None:
-            history = []
-        if len(_numbers) == 1 and len(_symbols) == 0 and _numbers[0] == target:
-            yield history
+    def _inner(_numbers, _symbols, target):
+        seen = set()
+        plans = _plans(_numbers, _symbols, target)
+        while True:
+            with _phase(stats, "plans"):
+                plan = next(plans, None)
+            if plan is None:
+                return
+            # Different groupings may still spell out the same steps when an intermediate value equals a number
+            if (key := tuple(plan)) not in seen:
+                seen.add(key)
+                if stats is not None:
+                    stats.plans += 1
+                yield plan
+
+    if not isinstance(puzzle, BaseNumberPuzzle):
+        raise TypeError(f"{puzzle} is not a {BaseNumberPuzzle.__name__}")
+
+    if (canonical := _pieces_multiset(puzzle)) is None:
+        return iter(())
+    return _inner(*canonical, puzzle.target)
+
+
+# noinspection PyTypeHints
+def rank_plans(puzzle: BaseNumberPuzzle, plans: Iterable[List[Tuple[int, Literal[0.3, 0.4, 0.5, 0.6, 0.7], int]]],
+               window: int = 64, limit: int | None = None) \
+        -> Generator[List[Tuple[int, Literal[0.3, 0.4, 0.5, 0.6, 0.7], int]], None, None]:
+    """Reorder plans cheapest-first by `geometry.plan_cost`, lazily.
+
+    At most `window` plans are buffered at once, so only the order within that window is exact. The buffer is refilled
+    from `plans` each time the cheapest plan is yielded.
+
+    :param puzzle: A puzzle
+    :type puzzle: BaseNumberPuzzle
+    :param plans: plans, usually from `find_valid_calculations(puzzle)`
+    :type plans: Iterable[List[Tuple[int, Literal[0.3, 0.4, 0.5, 0.6, 0.7], int]]]
+    :param window: number of plans to buffer
+    :type window: int
+    :param limit: maximum number of plans to yield, unlimited if None
+    :type limit: int | None
+    :return: A generator, yield a plan a time
+    :rtype: Generator[List[Tuple[int, Literal[0.3, 0.4, 0.5, 0.6, 0.7], int]], None, None]
+    :raises ValueError: non-positive `window`
+    """
+    if window < 1:
+        raise ValueError(f"window should be a positive integer, not {window}")
+
+    distances = slide_distances(puzzle)
+    plans = iter(plans)
+    counter = count()  # Tie-breaker, keeps enumeration order among plans of the same cost
+    heap = []
+    yielded = 0
+    while limit is None or yielded < limit:
+        while len(heap) < window and (plan := next(plans, None)) is not None:
+            heappush(heap, (plan_cost(puzzle, plan, distances), next(counter), plan))
+        if not heap:
             return
+        yield heappop(heap)[2]
+        yielded += 1
+
+
+# noinspection PyTypeHints
+def realize_plan(puzzle: BaseNumberPuzzle, plan: List[Tuple[int, Literal[0.3, 0.4, 0.5, 0.6, 0.7], int]],
+                 strategy: Literal["bfs", "astar", "greedy", "batched", "beam"] = "astar",
+                 interrupt: Callable[[], bool] | None = None, max_depth: int | None = None,
+                 resume: SearchState | None = None,
+                 suspend: Callable[[int, List[int], SearchState], None] | None = None,
+                 stats: SolverStats | None = None) -> bool:
+    """Perform every step of a plan on the board with `bfs`. If a step cannot be performed, the moves made for the plan
+    are undone.
+
+    :param puzzle: A puzzle
+    :type puzzle: BaseNumberPuzzle
+    :param plan: A plan yielded by `find_valid_calculations`
+    :type plan: List[Tuple[int, Literal[0.3, 0.4, 0.5, 0.6, 0.7], int]]
+    :param strategy: see `bfs`
+    :type strategy: Literal["bfs", "astar", "greedy", "batched", "beam"]
+    :param interrupt: see `bfs`
+    :type interrupt: Callable[[], bool] | None
+    :param max_depth: most moves each step may take, see `bfs`
+    :type max_depth: int | None
+    :param resume: see `bfs`, for the first step
+    :type resume: SearchState | None
+    :param suspend: see `bfs`, also called with the index of the step being searched and the moves made for the steps
+        before it
+    :type suspend: Callable[[int, List[int], SearchState], None] | None
+    :param stats: see `bfs`
+    :type stats: SolverStats | None
+    :return: True if the plan is realized, False otherwise
+    :rtype: bool
+    """
+    initial_history_length = len(puzzle.history)
+    for index, step in enumerate(plan):
+        # The history does not change while a step is searched, it holds the moves of the steps before
+        step_suspend = None if suspend is None else \
+            lambda state, index_=index: suspend(index_, puzzle.history[initial_history_length:], state)
+        if not bfs(puzzle, *step, strategy=strategy, interrupt=interrupt, max_depth=max_depth,
+                   resume=resume if index == 0 else None, suspend=step_suspend, stats=stats):
+            puzzle.undo(len(puzzle.history) - initial_history_length)
+            return False
+    return True
+
+
+# noinspection PyTypeHints
+def _step_pieces(puzzle: BaseNumberPuzzle, val1: int, symbol: Literal[0.3, 0.4, 0.5, 0.6, 0.7], val2: int,
+                 second_try: bool, components: Tuple[int, ...], feasible: Set[int]) -> List[Tuple[int, int]]:
+    # Pieces to move for a step, pieces outside the regions where the calculation can happen never interact with its
+    # operands
+    if not second_try:
+        pieces = chain(puzzle.pieces.get(val1, ()), puzzle.pieces.get(symbol, ()), puzzle.pieces.get(val2, ()))
+    else:
+        pieces = chain(*puzzle.pieces.values())
+    return [(x, y) for x, y in pieces if components[y * puzzle.LENGTH + x] in feasible]
+
+
+def _rebuild_path(parents: array, moves: array, node: int) -> List[int]:
+    # Walk up the search tree from `node` to the start
+    path = []
+    while node:
+        path.append(moves[node])
+        node = parents[node]
+    path.reverse()
+    return path
+
+
+# noinspection PyTypeHints
+def bfs(puzzle: BaseNumberPuzzle, val1: int, symbol: Literal[0.3, 0.4, 0.5, 0.6, 0.7], val2: int,
+        second_try: bool = False, strategy: Literal["bfs", "astar", "greedy", "batched", "beam"] = "bfs",
+        interrupt: Callable[[], bool] | None = None, table: TranspositionTable | None = None,
+        max_depth: int | None = None, resume: SearchState | None = None,
+        suspend: Callable[[SearchState], None] | None = None, stats: SolverStats | None = None) -> bool:
+    """Search for the moves that perform the calculation `val1 symbol val2` on the board, the moves found are applied to
+    `puzzle`. Only the pieces involved in the calculation are moved at first, all pieces are moved on the second try.
+    Either way, pieces that can never reach the operands (see `geometry.feasible_components`) are left alone, and the
+    search is skipped entirely if the calculation can never be performed.
+
+    :param puzzle: A puzzle
+    :type puzzle: BaseNumberPuzzle
+    :param val1: left operand
+    :type val1: int
+    :param symbol: operator
+    :type symbol: Literal[0.3, 0.4, 0.5, 0.6, 0.7]
+    :param val2: right operand
+    :type val2: int
+    :param second_try: move every piece instead of only the pieces involved in the calculation
+    :type second_try: bool
+    :param strategy: "bfs" for blind breadth-first search, "astar" for A* and "greedy" for greedy best-first search,
+        the latter two are guided by `geometry.step_lower_bound`; "batched" runs the breadth-first search with NumPy
+        (see `batched.batched_bfs`, `table` is not used) and "beam" runs `beam_search` with its default widths
+    :type strategy: Literal["bfs", "astar", "greedy", "batched", "beam"]
+    :param interrupt: called every `INTERRUPT_CHECK_INTERVAL` expansions, the search gives up once it returns True
+    :type interrupt: Callable[[], bool] | None
+    :param table: table of visited states, it is cleared first; pass one to set the memory cap or to read its counters
+        afterwards, a `DEFAULT_TABLE_BYTES` table is used if None
+    :type table: TranspositionTable | None
+    :param max_depth: most moves the calculation may take, unlimited if None
+    :type max_depth: int | None
+    :param resume: state passed to `suspend` by an earlier search of the same calculation with the same strategy, the
+        search carries on from it instead of starting over (ignored by "batched" and "beam")
+    :type resume: SearchState | None
+    :param suspend: called with the state of the search every `checkpoint.CHECKPOINT_INTERVAL` seconds and when it is
+        interrupted (never called by "batched" and "beam")
+    :type suspend: Callable[[SearchState], None] | None
+    :param stats: adds the counters of the search to it and times it as the "search" phase
+    :type stats: SolverStats | None
+    :return: True if the calculation is performed, False otherwise
+    :rtype: bool
+    :raises ValueError: invalid `strategy`
+    """
+    if strategy not in ("bfs", "astar", "greedy", "batched", "beam"):
+        raise ValueError(f"unrecognized strategy: {strategy}")
+    if strategy == "batched":
+        return batched_bfs(puzzle, val1, symbol, val2, second_try, interrupt, max_depth, stats)
+    if strategy == "beam":
+        return beam_search(puzzle, val1, symbol, val2, second_try, interrupt=interrupt, table=table,
+                           max_depth=max_depth, stats=stats)
+    if stats is not None and not second_try:
+        stats.searches += 1
+
+    components = slide_components(puzzle)
+    if not (feasible := feasible_components(puzzle, val1, symbol, val2, components)):
+        return False
+
+    def _search_state():
+        if informed:
+            # A sorted heap is still a heap, the order of popping is kept on resuming
+            frontier = [(priority, entry_) for priority, _, entry_ in sorted(to_do)]
+        else:
+            frontier = [(0, entry_) for entry_ in to_do]
+        return SearchState(step, strategy, second_try, parents, moves, frontier, values, table)
+
+    step = (val1, symbol, val2)
+    start = puzzle.snapshot()
+    # The states of the search never merge pieces, so the values of the board can be coded once
+    values, codes = packing_codes(start.board)
+    if resume is not None and (resume.step != step or resume.strategy != strategy or resume.values != values):
+        resume = None  # Saved by another search
+    if resume is not None and resume.second_try and not second_try:
+        return bfs(puzzle, val1, symbol, val2, second_try=True, strategy=strategy, interrupt=interrupt,
+                   max_depth=max_depth, resume=resume, suspend=suspend, stats=stats)
+
+    informed = strategy != "bfs"
+    if informed:
+        distances = slide_distances(puzzle)
+        counter = count()  # Tie-breaker, keeps the heap from comparing entries
+    board_size = len(puzzle.pack(codes))
+    if resume is not None:
+        parents, moves, table = resume.parents, resume.moves, resume.table
+        if informed:
+            to_do = [(priority, next(counter), entry) for priority, entry in resume.frontier]
+        else:
+            to_do = deque(entry for _, entry in resume.frontier)
+    else:
+        # Search tree stored as parallel columns, node 0 is the start. The moves of a node are only rebuilt from its
+        # parents once the goal is found, frontier entries carry the packed state (see `FRONTIER_SUFFIX`) so that it
+        # can be restored directly.
+        parents = array("I", [0])
+        moves = array("I", [0])
+        entry = puzzle.pack(codes) + FRONTIER_SUFFIX.pack(puzzle.zobrist_hash, 0, 0)
+        if informed:
+            to_do = [(0, next(counter), entry)]
+        else:
+            to_do = deque([entry])
+        if table is None:
+            # Depths let A* and greedy reopen a state reached by a shorter path. Greedy needs them too under a depth
+            # limit: a state first reached by a long path and cut off there must be searched again from a shorter one
+            table = TranspositionTable(DEFAULT_TABLE_BYTES, store_depth=informed)
+        table.clear()
+        table.add(puzzle.zobrist_hash)
+
+    with _searching(stats, table):
+        expansions = 0
+        next_checkpoint = monotonic() + CHECKPOINT_INTERVAL
+        while to_do:
+            expansions += 1
+            if expansions % INTERRUPT_CHECK_INTERVAL == 0:
+                if stats is not None:
+                    stats.sample()
+                if interrupt is not None and interrupt():
+                    if suspend is not None:
+                        suspend(_search_state())
+                    puzzle.restore(start)
+                    return False
+                if suspend is not None and monotonic() >= next_checkpoint:
+                    suspend(_search_state())
+                    next_checkpoint = monotonic() + CHECKPOINT_INTERVAL
 
-        _symbols.extend([0.7] * (len(_numbers) - len(_symbols) - 1))
-        for symbol in (0.3, 0.4, 0.5, 0.6, 0.7):
-            if symbol not in _symbols:
-                continue
-
-            symbols_copied = copy(_symbols)
-            symbols_copied.remove(symbol)
-            for idx, num1 in enumerate(_numbers[:-1]):
-                for num2 in _numbers[idx + 1:]:
-                    for _ in range(2):
-                        try:
-                            result = NumberPuzzle.calc(num1, symbol, num2)
-                        except ArithmeticError:
-                            pass
-                        else:
-                            numbers_copied = copy(_numbers)
-                            numbers_copied.remove(num1)
-                            numbers_copied.remove(num2)
-                            numbers_copied.append(result)
-
-                            history_copied = copy(history)
-                            history_copied.append((num1, symbol, num2))
-
-                            yield from _inner(numbers_copied, symbols_copied, target, history_copied)
-
-                        if symbol in (0.4, 0.6, 0.7) and num1 != num2:  # -, / and & do not obey commutative law
-                            num1, num2 = num2, num1
-                        else:
-                            break
-
-    if not isinstance(puzzle, NumberPuzzle):
-        raise TypeError(f"{puzzle} is not a {type(NumberPuzzle).__name__}")
+            entry = heappop(to_do)[2] if informed else to_do.popleft()
+            zobrist_hash, node, depth = FRONTIER_SUFFIX.unpack_from(entry, board_size)
+            if stats is not None:
+                stats.expand(len(to_do))
+            puzzle.restore_packed(entry[:board_size], values, zobrist_hash)
+            for x, y in _step_pieces(puzzle, val1, symbol, val2, second_try, components, feasible):
+                for direction in Direction:
+                    (moved_x, moved_y), operands = puzzle.move(x, y, direction)
+                    if x == moved_x and y == moved_y:
+                        continue
 
+                    if operands == step or symbol in COMMUTATIVE_SYMBOLS and operands == (val2, symbol, val1):
+                        # Replay the moves from the start once, so that the history can be undone as usual
+                        path = _rebuild_path(parents, moves, node)
+                        path.append(puzzle.history[-1])
+                        puzzle.undo()
+                        puzzle.restore(start)
+                        for record in path:
+                            puzzle.move(*puzzle.decode_history_record(record))
+                        return True
+                    # Any other calculation consumes pieces that the remaining steps rely on, and a state at the depth
+                    # limit has no moves left to perform the calculation
+                    if operands is None and (max_depth is None or depth + 1 < max_depth) and \
+                            table.add(puzzle.zobrist_hash, depth + 1 if informed else 0):
+                        parents.append(node)
+                        moves.append(puzzle.history[-1])
+                        entry = puzzle.pack(codes) + FRONTIER_SUFFIX.pack(puzzle.zobrist_hash, len(parents) - 1,
+                                                                          depth + 1)
+                        if not informed:
+                            to_do.append(entry)
+                        elif (h := step_lower_bound(puzzle, val1, symbol, val2, distances)) != inf:
+                            heappush(to_do, (h if strategy == "greedy" else depth + 1 + h, next(counter), entry))
+                    puzzle.undo()
+
+    puzzle.restore(start)
+    if second_try:
+        return False
+    if stats is not None:
+        stats.second_tries += 1
+    return bfs(puzzle, val1, symbol, val2, second_try=True, strategy=strategy, interrupt=interrupt, table=table,
+               max_depth=max_depth, suspend=suspend, stats=stats)
+
+
+# noinspection PyTypeHints
+def beam_search(puzzle: BaseNumberPuzzle, val1: int, symbol: Literal[0.3, 0.4, 0.5, 0.6, 0.7], val2: int,
+                second_try: bool = False, beam_widths: Iterable[int] = BEAM_WIDTHS,
+                interrupt: Callable[[], bool] | None = None, table: TranspositionTable | None = None,
+                max_depth: int | None = None, stats: SolverStats | None = None) -> bool:
+    """Search for the moves that perform the calculation `val1 symbol val2` like `bfs`, but only keep the best states
+    (by `geometry.step_lower_bound`) of each depth. Memory stays fixed whatever the size of the board, at the cost of
+    completeness: the calculation may be missed even though it can be performed. The moves found are applied to
+    `puzzle`.
+
+    :param puzzle: A puzzle
+    :type puzzle: BaseNumberPuzzle
+    :param val1: left operand
+    :type val1: int
+    :param symbol: operator
+    :type symbol: Literal[0.3, 0.4, 0.5, 0.6, 0.7]
+    :param val2: right operand
+    :type val2: int
+    :param second_try: see `bfs`
+    :type second_try: bool
+    :param beam_widths: number of states kept per depth, the search restarts with the next width if it fails
+    :type beam_widths: Iterable[int]
+    :param interrupt: see `bfs`
+    :type interrupt: Callable[[], bool] | None
+    :param table: see `bfs`
+    :type table: TranspositionTable | None
+    :param max_depth: most moves the calculation may take, `BEAM_MAX_DEPTH` if None
+    :type max_depth: int | None
+    :param stats: see `bfs`, the frontier is the candidates of a depth
+    :type stats: SolverStats | None
+    :return: True if the calculation is performed, False otherwise
+    :rtype: bool
+    """
+    if stats is not None and not second_try:
+        stats.searches += 1
+    components = slide_components(puzzle)
+    if not (feasible := feasible_components(puzzle, val1, symbol, val2, components)):
+        return False
+
+    step = (val1, symbol, val2)
+    start = puzzle.snapshot()
+    distances = slide_distances(puzzle)
+    if table is None:
+        table = TranspositionTable(DEFAULT_TABLE_BYTES)
+    with _searching(stats, table):
+        beam_widths = tuple(beam_widths)
+        expansions = 0
+        for beam_width in beam_widths:
+            # Only the kept states enter the search tree, so it grows by `beam_width` nodes per depth at most
+            parents = array("I", [0])
+            moves = array("I", [0])
+            table.clear()
+            table.add(puzzle.zobrist_hash)
+            beam = [(start, 0)]
+            truncated = False
+            for _ in range(BEAM_MAX_DEPTH if max_depth is None else max_depth):
+                counter = count()  # Tie-breaker, the earlier generated state wins
+                candidates = []
+                for snapshot, node in beam:
+                    expansions += 1
+                    if stats is not None:
+                        stats.expand(len(candidates))
+                    if expansions % INTERRUPT_CHECK_INTERVAL == 0:
+                        if stats is not None:
+                            stats.sample()
+                        if interrupt is not None and interrupt():
+                            puzzle.restore(start)
+                            return False
+
+                    puzzle.restore(snapshot)
+                    for x, y in _step_pieces(puzzle, val1, symbol, val2, second_try, components, feasible):
+                        for direction in Direction:
+                            (moved_x, moved_y), operands = puzzle.move(x, y, direction)
+                            if x == moved_x and y == moved_y:
+                                continue
+
+                            if operands == step or symbol in COMMUTATIVE_SYMBOLS and operands == (val2, symbol, val1):
+                                path = _rebuild_path(parents, moves, node)
+                                path.append(puzzle.history[-1])
+                                puzzle.undo()
+                                puzzle.restore(start)
+                                for record in path:
+                                    puzzle.move(*puzzle.decode_history_record(record))
+                                return True
+                            if operands is None and table.add(puzzle.zobrist_hash) and \
+                                    (h := step_lower_bound(puzzle, val1, symbol, val2, distances)) != inf:
+                                candidates.append((h, next(counter), puzzle.snapshot(), node, puzzle.history[-1]))
+                            puzzle.undo()
+
+                truncated |= len(candidates) > beam_width
+                beam = []
+                for _, _, snapshot, node, record in nsmallest(beam_width, candidates):
+                    parents.append(node)
+                    moves.append(record)
+                    beam.append((snapshot, len(parents) - 1))
+                if not beam:
+                    break
+            if not truncated:
+                break  # Nothing was cut off, a wider beam would search the same states
+
+    puzzle.restore(start)
+    if second_try:
+        return False
+    if stats is not None:
+        stats.second_tries += 1
+    return beam_search(puzzle, val1, symbol, val2, second_try=True, beam_widths=beam_widths, interrupt=interrupt,
+                       table=table, max_depth=max_depth, stats=stats)
+
+
+def _pieces_multiset(puzzle: BaseNumberPuzzle) -> Tuple[Tuple[int, ...], Tuple[float, ...]] | None:
+    # Numbers and symbols left on the board, in the form of `canonicalize`
     numbers = []
     symbols = []
     for piece, coordinates in puzzle.pieces.items():
@@ -64,45 +621,437 @@ def find_valid_calculations(puzzle: NumberPuzzle) \
             numbers.extend([piece] * len(coordinates))
         elif NumberPuzzle.is_symbol(piece):
             symbols.extend([piece] * len(coordinates))
-    return _inner(numbers, symbols, puzzle.target)
+    return canonicalize(numbers, symbols)
+
+
+# noinspection PyTypeHints
+@lru_cache(maxsize=1 << 12)
+def _next_steps(numbers: Tuple[int, ...], symbols: Tuple[float, ...], target: int) \
+        -> Tuple[Tuple[int, Literal[0.3, 0.4, 0.5, 0.6, 0.7], int], ...]:
+    # Every calculation on two of the numbers that keeps `target` reachable
+    steps = []
+    distinct_numbers = sorted(set(numbers))
+    for symbol in sorted(set(symbols)):
+        remaining_symbols = list(symbols)
+        remaining_symbols.remove(symbol)
+        for num1 in distinct_numbers:
+            for num2 in distinct_numbers:
+                if num1 == num2 and numbers.count(num1) < 2 or symbol in COMMUTATIVE_SYMBOLS and num1 > num2:
+                    continue
+                try:
+                    result = NumberPuzzle.calc(num1, symbol, num2)
+                except ArithmeticError:
+                    continue
+                remaining_numbers = list(numbers)
+                remaining_numbers.remove(num1)
+                remaining_numbers.remove(num2)
+                remaining_numbers.append(result)
+                if target in reachable_values(tuple(sorted(remaining_numbers)), tuple(remaining_symbols)):
+                    steps.append((num1, symbol, num2))
+    return tuple(steps)
 
 
-def bfs(puzzle: NumberPuzzle, val1, symbol, val2, second_try=False):
+def _integrated_lower_bound(puzzle: BaseNumberPuzzle, multiset: Tuple[Tuple[int, ...], Tuple[float, ...]],
+                            distances: Tuple[Tuple[float, ...], ...]) -> float:
+    # Every number but the last has to be merged by a move of its own, and the cheapest useful calculation needs its
+    # pieces in a row before its merging move. The bound of each calculation is `step_lower_bound`, with the distances
+    # of the pieces of a value to each row worked out once for all the calculations
+    numbers, symbols = multiset
+    if len(numbers) == 1:
+        return 0
+    length = puzzle.LENGTH
+    row_costs = {}  # (value, count) -> per row, fewest moves for `count` pieces of the value to get there
+
+    def _row_costs(value, count):
+        if (key := (value, count)) not in row_costs:
+            indexes = [x + y * length for x, y in puzzle.pieces.get(value, ())]
+            if len(indexes) < count:
+                row_costs[key] = None
+            elif count == 1:
+                row_costs[key] = [min(row_distances[index] for index in indexes) for row_distances in distances]
+            else:
+                row_costs[key] = [sum(sorted(row_distances[index] for index in indexes)[:count])
+                                  for row_distances in distances]
+        return row_costs[key]
+
+    best = inf
+    for num1, symbol, num2 in _next_steps(numbers, symbols, puzzle.target):
+        costs = [_row_costs(num1, 2)] if num1 == num2 else [_row_costs(num1, 1), _row_costs(num2, 1)]
+        if symbol != 0.7:
+            costs.append(_row_costs(symbol, 1))
+        if None not in costs:
+            best = min(best, min(map(sum, zip(*costs))))
+    return best + len(numbers) - 1
+
+
+# noinspection PyTypeHints
+def solve_integrated(puzzle: BaseNumberPuzzle, weight: float = 2.0, second_try: bool = False,
+                     interrupt: Callable[[], bool] | None = None, table: TranspositionTable | None = None,
+                     stats: SolverStats | None = None) \
+        -> List[Tuple[int, Literal[0.3, 0.4, 0.5, 0.6, 0.7], int]] | None:
+    """Solve the puzzle with a single best-first search over board states, instead of fixing a plan first and searching
+    each of its steps on its own. The moves found are applied to `puzzle`.
+
+    Every state also tracks the numbers and symbols left on the board. A move that merges pieces is accepted as long as
+    the target stays reachable from what is left (see `reachable_values`), the state is dropped otherwise. Like `bfs`,
+    only the pieces of the calculations that keep the target reachable are moved at first, all pieces are moved on the
+    second try.
+
+    It usually expands many more states than `bfs` with a plan (see `benchmark.py integrated`), so it is not part of
+    the default strategies of `script.py` and `batch.py`.
+
+    :param puzzle: A puzzle
+    :type puzzle: BaseNumberPuzzle
+    :param weight: weight of the heuristic, 1 for A*; larger values expand far fewer states but may find longer
+        solutions
+    :type weight: float
+    :param second_try: move every piece instead of only the pieces involved in the calculations
+    :type second_try: bool
+    :param interrupt: see `bfs`
+    :type interrupt: Callable[[], bool] | None
+    :param table: see `bfs`
+    :type table: TranspositionTable | None
+    :param stats: see `bfs`
+    :type stats: SolverStats | None
+    :return: the calculations performed, in order, None if the puzzle is not solved
+    :rtype: List[Tuple[int, Literal[0.3, 0.4, 0.5, 0.6, 0.7], int]] | None
+    """
+
     def _get_pieces():
         if not second_try:
-            return list(chain(puzzle.pieces[val1], puzzle.pieces[symbol], puzzle.pieces[val2]))
+            values = set(chain(*_next_steps(*multiset, puzzle.target)))
+            pieces = chain(*(puzzle.pieces.get(value, ()) for value in values))
         else:
-            return list(chain(*puzzle.pieces.values()))
+            pieces = chain(*puzzle.pieces.values())
+        return list(pieces)
 
-    def _restore_state_to(ref_history: List[int], *, offset: int = 0) -> None:
-        longest_common_prefix_length = 0
-        for longest_common_prefix_length, (this, that) in enumerate(zip_longest(puzzle.history[offset:], ref_history)):
-            if this != that:
-                break
+    if stats is not None and not second_try:
+        stats.searches += 1
+    if puzzle.is_solved():
+        return []
+    if (multiset := _pieces_multiset(puzzle)) is None or puzzle.target not in reachable_values(*multiset):
+        return None
 
-        puzzle.undo(len(puzzle.history[offset:]) - longest_common_prefix_length)
-        for item in ref_history[longest_common_prefix_length:]:
-            puzzle.move(*puzzle.decode_history_record(item))
+    start = puzzle.snapshot()
+    distances = slide_distances(puzzle)
+    parents = array("I", [0])
+    moves = array("I", [0])
+    counter = count()
+    to_do = [(0, 0, next(counter), 0, start, 0, multiset)]
+    if table is None:
+        table = TranspositionTable(DEFAULT_TABLE_BYTES, store_depth=True)
+    table.clear()
+    table.add(puzzle.zobrist_hash)
 
-    to_do = deque([[]])
-    hashes = {puzzle.zobrist_hash}
-    initial_history_length = len(puzzle.history)
+    with _searching(stats, table):
+        expansions = 0
+        while to_do:
+            expansions += 1
+            if expansions % INTERRUPT_CHECK_INTERVAL == 0:
+                if stats is not None:
+                    stats.sample()
+                if interrupt is not None and interrupt():
+                    puzzle.restore(start)
+                    return None
 
-    while to_do:
-        history = to_do.popleft()
-        _restore_state_to(history, offset=initial_history_length)
-        for x, y in _get_pieces():
-            for direction in Direction:
-                (moved_x, moved_y), operands = puzzle.move(x, y, direction)
-                if x == moved_x and y == moved_y:
-                    continue
+            _, _, _, depth, snapshot, node, multiset = heappop(to_do)
+            if stats is not None:
+                stats.expand(len(to_do))
+            puzzle.restore(snapshot)
+            for x, y in _get_pieces():
+                for direction in Direction:
+                    (moved_x, moved_y), operands = puzzle.move(x, y, direction)
+                    if x == moved_x and y == moved_y:
+                        continue
+
+                    if operands is not None and puzzle.is_solved():
+                        path = _rebuild_path(parents, moves, node)
+                        path.append(puzzle.history[-1])
+                        puzzle.undo()
+                        puzzle.restore(start)
+                        plan = []
+                        for record in path:
+                            if (operands := puzzle.move(*puzzle.decode_history_record(record))[1]) is not None:
+                                plan.append(operands)
+                        return plan
+
+                    if operands is None:
+                        child_multiset = multiset
+                    elif (child_multiset := _pieces_multiset(puzzle)) is not None and \
+                            puzzle.target not in reachable_values(*child_multiset):
+                        child_multiset = None  # The oracle rules the target out, drop the state
+                    if child_multiset is not None and table.add(puzzle.zobrist_hash, depth + 1) and \
+                            (h := _integrated_lower_bound(puzzle, child_multiset, distances)) != inf:
+                        parents.append(node)
+                        moves.append(puzzle.history[-1])
+                        # Ties go to the state closer to the goal
+                        heappush(to_do, (depth + 1 + weight * h, h, next(counter), depth + 1, puzzle.snapshot(),
+                                         len(parents) - 1, child_multiset))
+                    puzzle.undo()
+
+    puzzle.restore(start)
+    if second_try:
+        return None
+    if stats is not None:
+        stats.second_tries += 1
+    return solve_integrated(puzzle, weight, second_try=True, interrupt=interrupt, table=table, stats=stats)
+
+
+def to_commands(puzzle: BaseNumberPuzzle, moves: Iterable[int]) -> List[list]:
+    """Convert history records into the commands that `JuejinGameSession.submit_level` takes.
+
+    :param puzzle: the puzzle the moves are recorded on
+    :type puzzle: BaseNumberPuzzle
+    :param moves: history records
+    :type moves: Iterable[int]
+    :return: commands, `[y, x, direction]` each
+    :rtype: List[list]
+    """
+    commands = []
+    for record in moves:
+        x, y, direction = puzzle.decode_history_record(record)
+        commands.append([y, x, direction.name[0].lower()])
+    return commands
+
+
+_worker_puzzle = None
+_worker_cancelled = None
+
+
+def _init_worker(board: List[List[int | float]], target: int, puzzle_type: type, cancelled) -> None:
+    # Every worker builds its puzzle once, only plans are sent afterwards
+    global _worker_puzzle, _worker_cancelled
+    _worker_puzzle = puzzle_type(board, target)
+    _worker_cancelled = cancelled
+
+
+# noinspection PyTypeHints
+def _attempt(puzzle: BaseNumberPuzzle, plan: List[Tuple[int, Literal[0.3, 0.4, 0.5, 0.6, 0.7], int]] | None,
+             strategy: str, max_depth: int | None, interrupt: Callable[[], bool] | None = None,
+             resume: SearchState | None = None,
+             suspend: Callable[[int, List[int], SearchState], None] | None = None,
+             stats: SolverStats | None = None) -> List[Tuple[int, Literal[0.3, 0.4, 0.5, 0.6, 0.7], int]] | None:
+    # Try one candidate of `solve`, return the calculations performed if it succeeds
+    if strategy == "integrated":
+        return solve_integrated(puzzle, interrupt=interrupt, stats=stats)
+    return plan if realize_plan(puzzle, plan, strategy, interrupt, max_depth, resume, suspend, stats) else None
+
+
+def _deadline_interrupt(deadline: float | None, interrupt: Callable[[], bool] | None = None) \
+        -> Callable[[], bool] | None:
+    # Combine the deadline (on the `time.monotonic` clock) with another interrupt
+    if deadline is None:
+        return interrupt
+    if interrupt is None:
+        return lambda: monotonic() >= deadline
+    return lambda: interrupt() or monotonic() >= deadline
+
+
+# noinspection PyTypeHints
+def _attempt_in_worker(plan: List[Tuple[int, Literal[0.3, 0.4, 0.5, 0.6, 0.7], int]] | None, strategy: str,
+                       max_depth: int | None, deadline: float | None, collect_stats: bool) \
+        -> Tuple[Tuple[List[Tuple[int, Literal[0.3, 0.4, 0.5, 0.6, 0.7], int]], List[int]] | None, dict | None]:
+    # The stats of the attempt are sent back along with its result, see `SolverStats.merge`
+    interrupt = _deadline_interrupt(deadline, _worker_cancelled.is_set)
+    stats = SolverStats() if collect_stats else None
+    if (plan := _attempt(_worker_puzzle, plan, strategy, max_depth, interrupt, stats=stats)) is None:
+        return None, None if stats is None else stats.as_dict()
+    moves = list(_worker_puzzle.history)
+    _worker_puzzle.reset()
+    return (plan, moves), None if stats is None else stats.as_dict()
+
+
+def _verify(puzzle: BaseNumberPuzzle, moves: List[int]) -> bool:
+    # Replay the moves on a fresh copy of the board
+    replayed = puzzle.fork()
+    try:
+        for record in moves:
+            replayed.move(*replayed.decode_history_record(record))
+    except (TypeError, ValueError, IndexError):
+        return False
+    return replayed.is_solved()
+
+
+def make_puzzle(board: List[List[int | float]], target: int) -> BaseNumberPuzzle:
+    """Build the puzzle of a level with the faster engine for it. `CompactNumberPuzzle` expands states faster than
+    `NumberPuzzle` on every size `benchmark.py engines` measures, but it codes the numbers of the board in a byte, so
+    the boards with more than `compact_puzzle.MAX_NUMBERS` distinct numbers get a `NumberPuzzle`.
+
+    :param board: `map` of the level
+    :type board: List[List[int | float]]
+    :param target: target of the level
+    :type target: int
+    :return: A puzzle
+    :rtype: BaseNumberPuzzle
+    """
+    numbers = {item for row in board for item in row if NumberPuzzle.is_number(item)}
+    return (CompactNumberPuzzle if len(numbers) <= MAX_NUMBERS else NumberPuzzle)(board, target)
+
+
+def solve(puzzle: BaseNumberPuzzle, workers: int = 1,
+          strategies: Iterable[Literal["bfs", "astar", "greedy", "batched", "beam", "integrated"]] = ("astar",),
+          deadline: float | None = None, interrupt: Callable[[], bool] | None = None,
+          checkpoint_file: str | None = None, stats: SolverStats | None = None,
+          mp_context: BaseContext | None = None) -> Solution | GaveUp | None:
+    """Solve the puzzle by racing candidate plans (ranked by `rank_plans`) and search strategies across processes. The
+    moves of the solution are applied to `puzzle`. The "integrated" strategy (`solve_integrated`) does not take a plan,
+    it is tried once after every plan, for the levels where no plan can be carried out step by step.
+
+    The result is deterministic: among the candidates that succeed, the one ranked first wins, the others are cancelled
+    as soon as it is known.
+
+    With a deadline, the plans are tried again and again with the depth limits of `DEEPENING_DEPTHS` (moves per step),
+    so that short solutions of any plan turn up before long searches on the first ones. A pass of "bfs", "astar" or
+    "greedy" finds a plan's solution within the limit whenever there is one, as the informed strategies reopen states
+    reached again by shorter paths; "beam" keeps the best states only and may miss it. The searches check the clock
+    every `INTERRUPT_CHECK_INTERVAL` expansions and give up once it passes.
+
+    With a checkpoint file, the progress is saved when giving up, and every `checkpoint.CHECKPOINT_INTERVAL` seconds
+    while `bfs` runs in this process. A later call on the same level with the same strategies carries on from there:
+    the candidates that failed are skipped and the search in progress is resumed. That call runs in this process only,
+    as searches in worker processes are not saved. The file is deleted once the level is solved or found unsolvable.
+
+    :param puzzle: A puzzle
+    :type puzzle: BaseNumberPuzzle
+    :param workers: number of worker processes, the puzzle is solved in this process if it is 1
+    :type workers: int
+    :param strategies: strategies for `bfs`, every plan is tried with each of them, or "integrated"
+    :type strategies: Iterable[Literal["bfs", "astar", "greedy", "batched", "beam", "integrated"]]
+    :param deadline: give up at this time of `time.monotonic`, never if None
+    :type deadline: float | None
+    :param interrupt: give up once it returns True, it is called as often as the clock is checked
+    :type interrupt: Callable[[], bool] | None
+    :param checkpoint_file: file to save the progress in and to resume from, see `checkpoint.checkpoint_path`
+    :type checkpoint_file: str | None
+    :param stats: adds the counters of the plans and of the searches to it, including those run by the workers, and
+        times the "plans", "search" and "verify" phases
+    :type stats: SolverStats | None
+    :param mp_context: multiprocessing context of the workers, the default one if None; pass a "forkserver" or "spawn"
+        context when the calling process runs threads, forking it may leave a worker stuck on a lock held by a thread
+    :type mp_context: BaseContext | None
+    :return: A verified solution, `GaveUp` if the deadline passes or if it is interrupted first, None if the puzzle is
+        not solvable
+    :rtype: Solution | GaveUp | None
+    :raises ValueError: non-positive `workers`
+    """
+    if workers < 1:
+        raise ValueError(f"workers should be a positive integer, not {workers}")
+
+    def _candidates():
+        for max_depth in DEEPENING_DEPTHS if deadline is not None else (None,):
+            plans = rank_plans(puzzle, find_valid_calculations(puzzle, stats))
+            while True:
+                with _phase(stats, "plans"):  # Ranking included
+                    plan = next(plans, None)
+                if plan is None:
+                    break
+                for strategy in plan_strategies:
+                    yield plan, strategy, max_depth
+        if "integrated" in strategies:
+            yield None, "integrated", None
+
+    def _should_stop():
+        return deadline is not None and monotonic() >= deadline or interrupt is not None and interrupt()
+
+    def _gave_up(index):
+        # `index` is the candidate being searched when time runs out
+        if checkpoint_file is not None and saved_candidate != index:
+            save_checkpoint(checkpoint_file, Checkpoint(key, strategies, index, 0, [], None))
+        return GaveUp(len(submitted), submitted[min(index - first_candidate, len(submitted) - 1)][1] if submitted
+                      else None)
+
+    def _finish(result):
+        if checkpoint_file is not None:
+            discard_checkpoint(checkpoint_file)
+        return result
+
+    strategies = tuple(strategies)
+    plan_strategies = tuple(strategy for strategy in strategies if strategy != "integrated")
+    key = board_key(puzzle.puzzle, puzzle.target)
+    resume = None if checkpoint_file is None else load_checkpoint(checkpoint_file, key)
+    if resume is not None and resume.strategies != strategies:
+        resume = None  # Candidates come in another order
+    first_candidate = 0 if resume is None else resume.candidate
+    if resume is not None:
+        workers = 1  # The level took more than one go, only a search in this process can be saved and resumed
+    # Candidate of the latest checkpoint written, the one loaded stands until the candidate is searched further
+    saved_candidate = None if resume is None else first_candidate
+    candidates = islice(_candidates(), first_candidate, None)
+    submitted = []  # Strategy and depth limit of each candidate, from `first_candidate` on
+
+    if workers == 1:
+        initial_history_length = len(puzzle.history)
+        search_interrupt = _deadline_interrupt(deadline, interrupt)
+        for index, (plan, strategy, max_depth) in enumerate(candidates, first_candidate):
+            if _should_stop():
+                return _gave_up(index)
+            submitted.append((strategy, max_depth))
+
+            # Pick up the plan where the checkpoint left it
+            steps_done, history, search = 0, [], None
+            if resume is not None and plan is not None:
+                steps_done, history, search = resume.steps_done, resume.history, resume.search
+                for record in history:
+                    puzzle.move(*puzzle.decode_history_record(record))
+            resume = None
+
+            def _suspend(step_index, moves, state, index_=index, steps_done_=steps_done, history_=history):
+                nonlocal saved_candidate
+                save_checkpoint(checkpoint_file, Checkpoint(key, strategies, index_, steps_done_ + step_index,
+                                                            history_ + moves, state))
+                saved_candidate = index_
+
+            if _attempt(puzzle, None if plan is None else plan[steps_done:], strategy, max_depth, search_interrupt,
+                        search, None if checkpoint_file is None else _suspend, stats) is not None:
+                return _finish(Solution(plan, strategy, puzzle.history[initial_history_length:]))
+            puzzle.undo(len(puzzle.history) - initial_history_length)
+            if _should_stop():
+                return _gave_up(index)  # Interrupted, the candidate is searched again (or resumed) next time
+        return _finish(None)
+
+    if mp_context is None:
+        mp_context = get_context()
+    cancelled = mp_context.Event()
+    results = {}  # Candidate index -> (plan, moves), None if failed
+    in_flight = {}  # Future -> candidate index
+    next_to_decide = first_candidate
+    with ProcessPoolExecutor(workers, mp_context, initializer=_init_worker,
+                             initargs=(puzzle.puzzle, puzzle.target, type(puzzle), cancelled)) as executor:
+        try:
+            while True:
+                if _should_stop():
+                    return _gave_up(next_to_decide)
+
+                # Keep every worker busy, with one extra candidate queued for each
+                while len(in_flight) < 2 * workers and (candidate := next(candidates, None)) is not None:
+                    in_flight[executor.submit(_attempt_in_worker, *candidate, deadline, stats is not None)] = \
+                        first_candidate + len(submitted)
+                    submitted.append(candidate[1:])
+                if not in_flight:
+                    return _gave_up(next_to_decide) if _should_stop() else _finish(None)
 
-                if puzzle.zobrist_hash not in hashes:
-                    if puzzle.is_solved():
-                        return
-                    hashes.add(puzzle.zobrist_hash)
-                    to_do.append(puzzle.history[initial_history_length:])
-                puzzle.undo()
+                # Wake up now and then to check the interrupt
+                timeout = None if deadline is None else max(deadline - monotonic(), 0)
+                if interrupt is not None:
+                    timeout = 1.0 if timeout is None else min(timeout, 1.0)
+                done, _ = wait(in_flight, timeout, FIRST_COMPLETED)
+                for future in done:
+                    result, worker_stats = future.result()
+                    if worker_stats is not None:
+                        stats.merge(worker_stats)
+                    with _phase(stats, "verify"):
+                        results[in_flight.pop(future)] = result if result is not None and _verify(puzzle, result[1]) \
+                            else None
 
-    puzzle.undo(len(puzzle.history) - initial_history_length)
-    return bfs(puzzle, val1, symbol, val2, second_try=True)
+                # A success only wins once every candidate ranked before it has failed
+                while next_to_decide in results:
+                    if (result := results[next_to_decide]) is not None:
+                        plan, moves = result
+                        for record in moves:
+                            puzzle.move(*puzzle.decode_history_record(record))
+                        return _finish(Solution(plan, submitted[next_to_decide - first_candidate][0], moves))
+                    next_to_decide += 1
+        finally:
+            cancelled.set()
+            for future in in_flight:
+                future.cancel()
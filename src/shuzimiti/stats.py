@@ -0,0 +1,137 @@
+from collections import defaultdict
+from contextlib import contextmanager
+from json import dumps
+from time import monotonic, perf_counter
+from typing import Callable, Iterator, TextIO
+
+try:
+    import resource
+except ImportError:  # Not available on Windows
+    resource = None
+
+
+def peak_rss() -> int | None:
+    """Peak resident set size of this process and of its terminated children (e.g. solver workers).
+
+    :return: bytes, None if it cannot be measured on this platform
+    :rtype: int | None
+    """
+    if resource is None:
+        return None
+    # Kibibytes on Linux
+    return 1024 * max(resource.getrusage(resource.RUSAGE_SELF).ru_maxrss,
+                      resource.getrusage(resource.RUSAGE_CHILDREN).ru_maxrss)
+
+
+class SolverStats:
+    """Counters and timings of the solver, pass the same object to every function of a solve to add them up.
+
+    `progress` is called with the object itself at most every `progress_interval` seconds while a search runs, e.g. to
+    print a line for long searches. Searches run by worker processes are only added once they are over, and do not call
+    `progress`.
+    """
+
+    COUNTERS = ("plans", "searches", "expanded", "generated", "deduplicated", "table_replacements", "second_tries")
+
+    def __init__(self, progress: Callable[["SolverStats"], None] | None = None, progress_interval: float = 10.0):
+        self.plans = 0  # Plans enumerated by `find_valid_calculations`
+        self.searches = 0  # Searches started, second tries excluded
+        self.expanded = 0  # States taken out of the frontier
+        self.generated = 0  # States generated, i.e. looked up in the transposition table
+        self.deduplicated = 0  # States dropped as the table has them already
+        self.table_replacements = 0
+        self.second_tries = 0  # Searches that fell back to moving every piece
+        self.frontier_peak = 0
+        self.phases = defaultdict(float)  # Phase -> seconds
+        self.progress = progress
+        self.progress_interval = progress_interval
+        self.__open_phases = defaultdict(int)
+        self.__next_progress = monotonic() + progress_interval
+
+    @contextmanager
+    def phase(self, name: str) -> Iterator[None]:
+        """Time a phase. Nested (or recursive) phases of the same name are only counted once.
+
+        :param name: name of the phase
+        :type name: str
+        """
+        self.__open_phases[name] += 1
+        start = perf_counter()
+        try:
+            yield
+        finally:
+            self.__open_phases[name] -= 1
+            if not self.__open_phases[name]:
+                self.phases[name] += perf_counter() - start
+
+    @contextmanager
+    def search(self, table) -> Iterator[None]:
+        """Time a search as the "search" phase, and add what its transposition table did meanwhile.
+
+        :param table: A `transposition.TranspositionTable`
+        :type table: TranspositionTable
+        """
+        lookups, hits, replacements = table.lookups, table.hits, table.replacements
+        try:
+            with self.phase("search"):
+                yield
+        finally:
+            self.generated += table.lookups - lookups
+            self.deduplicated += table.hits - hits
+            self.table_replacements += table.replacements - replacements
+
+    def expand(self, frontier_size: int) -> None:
+        """Count a state taken out of the frontier.
+
+        :param frontier_size: number of states left in the frontier
+        :type frontier_size: int
+        :return: None
+        """
+        self.expanded += 1
+        if frontier_size > self.frontier_peak:
+            self.frontier_peak = frontier_size
+
+    def sample(self) -> None:
+        """Call `progress` if it is due. Searches call it every `solve.INTERRUPT_CHECK_INTERVAL` expansions.
+
+        :return: None
+        """
+        if self.progress is not None and monotonic() >= self.__next_progress:
+            self.progress(self)
+            self.__next_progress = monotonic() + self.progress_interval
+
+    def merge(self, other: dict) -> None:
+        """Add the stats of another solve, e.g. from a worker process.
+
+        :param other: return value of `as_dict` of the other stats
+        :type other: dict
+        :return: None
+        """
+        for counter in self.COUNTERS:
+            setattr(self, counter, getattr(self, counter) + other[counter])
+        self.frontier_peak = max(self.frontier_peak, other["frontier_peak"])
+        for name, seconds in other["phases"].items():
+            self.phases[name] += seconds
+
+    def as_dict(self) -> dict:
+        """All the stats, with the peak RSS of the process at the time of the call.
+
+        :return: stats
+        :rtype: dict
+        """
+        stats = {counter: getattr(self, counter) for counter in self.COUNTERS}
+        stats["frontier_peak"] = self.frontier_peak
+        stats["table_hit_rate"] = self.deduplicated / self.generated if self.generated else 0.0
+        stats["phases"] = dict(self.phases)
+        stats["peak_rss"] = peak_rss()
+        return stats
+
+    def write_json_line(self, file: TextIO, **extra) -> None:
+        """Append the stats to a JSON lines file.
+
+        :param file: file opened in text mode
+        :type file: TextIO
+        :param extra: other fields of the line, e.g. the round of the level
+        :return: None
+        """
+        file.write(dumps({**extra, **self.as_dict()}, separators=(",", ":")) + "\n")
@@ -0,0 +1,212 @@
+import struct
+from array import array
+from sys import byteorder
+from typing import BinaryIO
+
+KEY_MASK = (1 << 64) - 1
+PROBE_LIMIT = 8  # Slots probed (linearly) before an entry gets replaced
+INITIAL_CAPACITY = 1 << 12
+# Written first by `dump`, the arrays of the table are in the byte order of the machine writing them
+BYTE_ORDER = b"<" if byteorder == "little" else b">"
+DUMP_HEADER_FORMAT = "QQ?QQQQ"  # max_capacity, capacity, store_depth, size, lookups, hits, replacements
+DUMP_HEADER = struct.Struct(BYTE_ORDER.decode() + DUMP_HEADER_FORMAT)
+
+
+class TranspositionTable:
+    """A set of visited states for puzzle searches, keyed by Zobrist hashes truncated to 64 bits.
+
+    Keys live in a preallocated `array('Q')` with open addressing. The table doubles as it fills up until it reaches
+    `max_bytes`, and also whenever the `PROBE_LIMIT` slots of a new state are taken. At the cap, a new state replaces
+    one of the states in its neighbourhood (the deepest one when depths are stored), so memory never grows beyond it. A
+    replaced state can be searched again, which costs time but never correctness.
+    """
+
+    def __init__(self, max_bytes: int = 64 << 20, store_depth: bool = False):
+        slot_size = 8 + (4 if store_depth else 0)
+        if max_bytes < INITIAL_CAPACITY * slot_size:
+            raise ValueError(f"max_bytes should be at least {INITIAL_CAPACITY * slot_size}, not {max_bytes}")
+
+        self.max_capacity = 1 << (max_bytes // slot_size).bit_length() - 1  # Largest power of two that fits
+        self.store_depth = store_depth
+        self.lookups = 0
+        self.hits = 0
+        self.replacements = 0
+        self.__allocate(INITIAL_CAPACITY)
+
+    def __allocate(self, capacity: int) -> None:
+        self.__keys = array("Q", bytes(8 * capacity))
+        self.__depths = array("I", bytes(4 * capacity)) if self.store_depth else None
+        self.__mask = capacity - 1
+        self.__size = 0
+
+    def __len__(self) -> int:
+        return self.__size
+
+    def __contains__(self, key: int) -> bool:
+        key = key & KEY_MASK or 1  # 0 marks an empty slot
+        keys = self.__keys
+        mask = self.__mask
+        for probe in range(PROBE_LIMIT):
+            if (slot_key := keys[(key + probe) & mask]) == key:
+                return True
+            if slot_key == 0:
+                return False
+        return False
+
+    @property
+    def capacity(self) -> int:
+        return self.__mask + 1
+
+    @property
+    def hit_rate(self) -> float:
+        """Fraction of `add` calls that found the state already recorded."""
+        return self.hits / self.lookups if self.lookups else 0.0
+
+    @property
+    def memory(self) -> int:
+        """Bytes taken by the slots."""
+        return self.capacity * (12 if self.store_depth else 8)
+
+    def add(self, key: int, depth: int = 0) -> bool:
+        """Record a state.
+
+        :param key: Zobrist hash of the state
+        :type key: int
+        :param depth: depth (or cost) the state is reached with, only kept if `store_depth` is True
+        :type depth: int
+        :return: True if the state is new, or if it is reached with a smaller depth than recorded; False otherwise
+        :rtype: bool
+        """
+        self.lookups += 1
+        key = key & KEY_MASK or 1  # 0 marks an empty slot
+        if self.__size * 2 >= self.capacity and self.capacity < self.max_capacity:
+            self.__grow()
+
+        while True:
+            keys = self.__keys
+            depths = self.__depths
+            mask = self.__mask
+            victim = key & mask
+            for probe in range(PROBE_LIMIT):
+                index = (key + probe) & mask
+                slot_key = keys[index]
+                if slot_key == key:
+                    if depths is not None and depth < depths[index]:
+                        depths[index] = depth
+                        return True
+                    self.hits += 1
+                    return False
+                if slot_key == 0:
+                    keys[index] = key
+                    if depths is not None:
+                        depths[index] = depth
+                    self.__size += 1
+                    return True
+                if depths is not None and depths[index] > depths[victim]:
+                    victim = index
+            if self.capacity >= self.max_capacity:
+                break
+            self.__grow()  # Neighbourhood is full, nothing is replaced while the table can grow
+
+        # Neighbourhood is full and the table cannot grow any more
+        keys[victim] = key
+        if depths is not None:
+            depths[victim] = depth
+        self.replacements += 1
+        return True
+
+    def dump(self, file: BinaryIO) -> None:
+        """Write the table to a binary file, in native byte order marked by `BYTE_ORDER`, see `load`.
+
+        :param file: file opened in binary mode
+        :type file: BinaryIO
+        :return: None
+        """
+        file.write(BYTE_ORDER)
+        file.write(DUMP_HEADER.pack(self.max_capacity, self.capacity, self.store_depth, self.__size, self.lookups,
+                                    self.hits, self.replacements))
+        self.__keys.tofile(file)
+        if self.store_depth:
+            self.__depths.tofile(file)
+
+    @classmethod
+    def load(cls, file: BinaryIO) -> "TranspositionTable":
+        """Read a table written by `dump`, on this machine or on one of the other byte order.
+
+        :param file: file opened in binary mode
+        :type file: BinaryIO
+        :return: A table
+        :rtype: TranspositionTable
+        :raises EOFError: the file is truncated
+        :raises ValueError: not a dump of a table
+        """
+        if (byte_order := file.read(1)) not in (b"<", b">"):
+            raise ValueError("invalid byte order of transposition table")
+        header_struct = DUMP_HEADER
+        if byte_order != BYTE_ORDER:  # Written on a machine of the other byte order
+            header_struct = struct.Struct(byte_order.decode() + DUMP_HEADER_FORMAT)
+        header = file.read(header_struct.size)
+        if len(header) < header_struct.size:
+            raise EOFError("truncated transposition table")
+        max_capacity, capacity, store_depth, size, lookups, hits, replacements = header_struct.unpack(header)
+        table = cls.__new__(cls)
+        table.max_capacity = max_capacity
+        table.store_depth = store_depth
+        table.lookups = lookups
+        table.hits = hits
+        table.replacements = replacements
+        table.__keys = array("Q")
+        table.__keys.fromfile(file, capacity)
+        if store_depth:
+            table.__depths = array("I")
+            table.__depths.fromfile(file, capacity)
+        else:
+            table.__depths = None
+        if byte_order != BYTE_ORDER:
+            table.__keys.byteswap()
+            if table.__depths is not None:
+                table.__depths.byteswap()
+        table.__mask = capacity - 1
+        table.__size = size
+        return table
+
+    def clear(self) -> None:
+        """Forget every state, counters are kept."""
+        self.__allocate(INITIAL_CAPACITY)
+
+    def __grow(self) -> None:
+        # Twice as large, or larger still if a key finds no free slot in its neighbourhood
+        old_keys = self.__keys
+        old_depths = self.__depths
+        capacity = self.capacity * 2
+        while not self.__rehash(old_keys, old_depths, capacity):
+            capacity *= 2
+
+    def __rehash(self, old_keys: array, old_depths: array | None, capacity: int) -> bool:
+        # Move the keys into new slots, at `max_capacity` a key with a full neighbourhood replaces one as in `add`
+        self.__allocate(capacity)
+        keys = self.__keys
+        depths = self.__depths
+        mask = self.__mask
+        for old_index, key in enumerate(old_keys):
+            if key == 0:
+                continue
+            victim = key & mask
+            for probe in range(PROBE_LIMIT):
+                index = (key + probe) & mask
+                if keys[index] == 0:
+                    keys[index] = key
+                    if depths is not None:
+                        depths[index] = old_depths[old_index]
+                    self.__size += 1
+                    break
+                if depths is not None and depths[index] > depths[victim]:
+                    victim = index
+            else:
+                if capacity < self.max_capacity:
+                    return False
+                keys[victim] = key
+                if depths is not None:
+                    depths[victim] = old_depths[old_index]
+                self.replacements += 1
+        return True
@@ -0,0 +1,147 @@
+from asyncio import sleep as async_sleep
+from os import environ
+from random import uniform
+from threading import Lock
+from time import monotonic, sleep
+from urllib.parse import urlsplit
+
+DEFAULT_RATE = float(environ.get("JUEJIN_RATE_LIMIT") or 5.0)  # Requests per second per host
+DEFAULT_BURST = int(environ.get("JUEJIN_RATE_BURST") or 10)
+MAX_ATTEMPTS = 4  # Attempts of an idempotent request, including the first one
+BACKOFF_BASE = 0.5  # Seconds, doubled at every retry
+BACKOFF_CAP = 8.0
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})  # Throttled, or the server is having a bad time
+
+
+class RequestCounters:
+    """Counters of the requests made by every client, see `counters`."""
+    NAMES = ("requests", "throttled", "throttle_responses", "retries", "coalesced")
+
+    def __init__(self):
+        self.__lock = Lock()
+        self.reset()
+
+    def increment(self, name: str) -> None:
+        """Add one to a counter.
+
+        :param name: one of `NAMES`
+        :type name: str
+        :return: None
+        """
+        with self.__lock:
+            setattr(self, name, getattr(self, name) + 1)
+
+    def reset(self) -> None:
+        """Set every counter to zero.
+
+        :return: None
+        """
+        with self.__lock:
+            self.requests = 0  # Requests sent, retries included
+            self.throttled = 0  # Requests delayed by the rate limiter
+            self.throttle_responses = 0  # Responses with a status in `RETRY_STATUSES`
+            self.retries = 0
+            self.coalesced = 0  # Requests answered by an identical request in flight
+
+    def as_dict(self) -> dict:
+        """All the counters.
+
+        :return: counters
+        :rtype: dict
+        """
+        with self.__lock:
+            return {name: getattr(self, name) for name in self.NAMES}
+
+
+counters = RequestCounters()
+
+
+class TokenBucket:
+    """Token bucket rate limiter, shared by threads and coroutines alike.
+
+    Every request takes a token. Tokens are refilled at `rate` per second up to `burst`; when there is none left, the
+    request reserves the next one and waits for it, so waiting requests are served in order.
+    """
+
+    def __init__(self, rate: float = DEFAULT_RATE, burst: int = DEFAULT_BURST):
+        if rate <= 0:
+            raise ValueError(f"rate should be positive, not {rate}")
+        if burst < 1:
+            raise ValueError(f"burst should be a positive integer, not {burst}")
+        self.rate = rate
+        self.burst = burst
+        self.__tokens = float(burst)
+        self.__last = monotonic()
+        self.__lock = Lock()
+
+    def _reserve(self) -> float:
+        # Take a token, return the seconds to wait before it is there
+        with self.__lock:
+            now = monotonic()
+            tokens = self.__tokens = min(self.burst, self.__tokens + (now - self.__last) * self.rate) - 1
+            self.__last = now
+        if tokens >= 0:
+            return 0.0
+        counters.increment("throttled")
+        return -tokens / self.rate
+
+    def acquire(self) -> None:
+        """Take a token, block until there is one.
+
+        :return: None
+        """
+        if delay := self._reserve():
+            sleep(delay)
+
+    async def acquire_async(self) -> None:
+        """Take a token, wait until there is one.
+
+        :return: None
+        """
+        if delay := self._reserve():
+            await async_sleep(delay)
+
+
+_buckets = {}
+_buckets_lock = Lock()
+
+
+def configure(host: str, rate: float = DEFAULT_RATE, burst: int = DEFAULT_BURST) -> None:
+    """Set the limits of a host, replacing its bucket.
+
+    :param host: host name, e.g. "api.juejin.cn"
+    :type host: str
+    :param rate: requests per second
+    :type rate: float
+    :param burst: requests that may be sent at once after a pause
+    :type burst: int
+    :return: None
+    """
+    with _buckets_lock:
+        _buckets[host] = TokenBucket(rate, burst)
+
+
+def bucket_for(url: str) -> TokenBucket:
+    """The bucket of the host of a URL, every client in the process shares it.
+
+    :param url: URL of a request
+    :type url: str
+    :return: A token bucket, with the default limits unless `configure`d
+    :rtype: TokenBucket
+    """
+    host = urlsplit(url).netloc
+    with _buckets_lock:
+        if (bucket := _buckets.get(host)) is None:
+            bucket = _buckets[host] = TokenBucket()
+        return bucket
+
+
+def backoff_delay(attempt: int) -> float:
+    """Seconds to wait before retrying, exponential with full jitter.
+
+    :param attempt: number of attempts made so far, from 1
+    :type attempt: int
+    :return: seconds
+    :rtype: float
+    """
+    return uniform(0, min(BACKOFF_CAP, BACKOFF_BASE * 2 ** (attempt - 1)))
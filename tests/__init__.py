@@ -0,0 +1,8 @@
+import sys
+from os import path
+
+# The scripts import their modules by flat names, with src/ and the directory of the script on the path
+_SOURCE = path.join(path.dirname(path.dirname(path.abspath(__file__))), "src")
+for _directory in (_SOURCE, path.join(_SOURCE, "shuzimiti")):
+    if _directory not in sys.path:
+        sys.path.insert(0, _directory)
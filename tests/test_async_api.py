@@ -0,0 +1,220 @@
+import unittest
+from asyncio import gather, sleep
+from collections import Counter
+from unittest import mock
+
+from aiohttp import web
+from jwt import encode
+
+from __init__ import JuejinError
+from async_api import AsyncJuejinGameSession
+from check_in.async_api import AsyncJuejinSession
+from lottery.async_api import AsyncLottery
+from throttle import configure, counters
+
+TOKEN = encode({"userId": "42"}, "stand-in signing key, never verified", algorithm="HS256")
+
+
+class StandInServer:
+    """Local stand-in for the Juejin APIs: counts the requests, keeps their bodies and fails on demand."""
+
+    def __init__(self):
+        self.hits = Counter()
+        self.failures = Counter()  # Path -> number of 503 responses to send before succeeding
+        self.bodies = {}
+        self.errors = {}  # Path -> error message
+        self.delay = 0.0
+        self.url = None
+        self.__runner = None
+
+    async def start(self) -> None:
+        app = web.Application()
+        app.router.add_get("/token", self.__token)
+        app.router.add_post("/game/{name}", self.__game)
+        app.router.add_route("*", "/api/{name:.+}", self.__api)
+        self.__runner = web.AppRunner(app)
+        await self.__runner.setup()
+        site = web.TCPSite(self.__runner, "127.0.0.1", 0)
+        await site.start()
+        host, port = self.__runner.addresses[0][:2]
+        self.url = f"http://{host}:{port}/"
+        configure(f"{host}:{port}", rate=1000, burst=1000)  # Pacing is not under test
+
+    async def stop(self) -> None:
+        await self.__runner.cleanup()
+
+    async def __record(self, request: web.Request, name: str) -> None:
+        self.hits[name] += 1
+        self.bodies[name] = await request.json() if request.can_read_body else None
+        if self.delay:
+            await sleep(self.delay)
+
+    async def __api(self, request: web.Request) -> web.Response:
+        name = request.match_info["name"]
+        await self.__record(request, name)
+        if self.failures[name] > 0:
+            self.failures[name] -= 1
+            return web.Response(status=503, text="busy")
+        if name in self.errors:
+            return web.json_response({"err_no": 1, "err_msg": self.errors[name], "data": None})
+        if request.cookies.get("sessionid") != "session":
+            return web.json_response({"err_no": 403, "err_msg": "must login", "data": None})
+        return web.json_response({"err_no": 0, "err_msg": "success", "data": {"hits": self.hits[name]}})
+
+    async def __token(self, request: web.Request) -> web.Response:
+        await self.__record(request, "token")
+        if request.cookies.get("sessionid") != "session":
+            return web.json_response({"err_no": 403, "err_msg": "must login"})
+        return web.json_response({"err_no": 0, "err_msg": "success", "data": TOKEN})
+
+    async def __game(self, request: web.Request) -> web.Response:
+        name = request.match_info["name"]
+        await self.__record(request, name)
+        if request.headers.get("authorization") != "Bearer " + TOKEN or request.query.get("uid") != "42":
+            return web.json_response({"code": 403, "message": "unauthorized"})
+        if name in self.errors:
+            return web.json_response({"code": 1, "message": self.errors[name]})
+        return web.json_response({"code": 0, "data": {"name": name}})
+
+
+class StandInTestCase(unittest.IsolatedAsyncioTestCase):
+    async def asyncSetUp(self):
+        self.server = StandInServer()
+        await self.server.start()
+        self.addAsyncCleanup(self.server.stop)
+        patcher = mock.patch("throttle.BACKOFF_BASE", 0.001)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        counters.reset()
+
+
+class TestAsyncJuejinSession(StandInTestCase):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        self.session = AsyncJuejinSession("session", self.server.url + "api/")
+        await self.session.open()
+        self.addAsyncCleanup(self.session.close)
+
+    async def test_call(self):
+        self.assertEqual(await self.session._call("is_checked_in"), {"hits": 1})
+        self.assertEqual(await self.session.check_in(), {"hits": 1})
+        self.assertEqual(counters.as_dict()["requests"], 2)
+
+    async def test_error(self):
+        self.server.errors["check_in"] = "already checked in"
+        with self.assertRaisesRegex(JuejinError, "already checked in"):
+            await self.session.check_in()
+        with self.assertRaisesRegex(JuejinError, "must login"):
+            async with AsyncJuejinSession("expired", self.server.url + "api/") as session:
+                await session.is_checked_in()
+
+    async def test_idempotent_requests_are_retried(self):
+        self.server.failures["get_today_status"] = 2
+        self.assertEqual(await self.session._call("is_checked_in"), {"hits": 3})
+        stats = counters.as_dict()
+        self.assertEqual((stats["requests"], stats["retries"], stats["throttle_responses"]), (3, 2, 2))
+
+    async def test_retries_give_up(self):
+        self.server.failures["get_today_status"] = 10
+        with self.assertRaises(JuejinError):
+            await self.session._call("is_checked_in")
+        self.assertEqual(self.server.hits["get_today_status"], 4)  # MAX_ATTEMPTS
+
+    async def test_other_requests_are_not_retried(self):
+        self.server.failures["check_in"] = 1
+        with self.assertRaises(JuejinError):
+            await self.session.check_in()
+        self.assertEqual(self.server.hits["check_in"], 1)
+        self.assertEqual(counters.as_dict()["retries"], 0)
+
+    async def test_identical_gets_are_coalesced(self):
+        self.server.delay = 0.1
+        results = await gather(*(self.session.is_checked_in() for _ in range(5)))
+        self.assertEqual(results, [{"hits": 1}] * 5)
+        self.assertEqual(self.server.hits["get_today_status"], 1)
+        self.assertEqual(counters.as_dict()["coalesced"], 4)
+
+        # A failure reaches every waiter, and the next call sends a request again
+        self.server.errors["get_today_status"] = "busy"
+        for result in await gather(*(self.session.is_checked_in() for _ in range(3)), return_exceptions=True):
+            self.assertIsInstance(result, JuejinError)
+        del self.server.errors["get_today_status"]
+        self.assertEqual(await self.session.is_checked_in(), {"hits": 3})
+
+    async def test_posts_are_not_coalesced(self):
+        self.server.delay = 0.1
+        await gather(*(self.session.check_in() for _ in range(3)))
+        self.assertEqual(self.server.hits["check_in"], 3)
+        self.assertEqual(counters.as_dict()["coalesced"], 0)
+
+    async def test_not_opened(self):
+        with self.assertRaises(RuntimeError):
+            await AsyncJuejinSession("session", self.server.url + "api/").is_checked_in()
+
+
+class TestAsyncLottery(StandInTestCase):
+    async def asyncSetUp(self):
+        await super().asyncSetUp()
+        session = AsyncJuejinSession("session", self.server.url + "api/")
+        await session.open()
+        self.addAsyncCleanup(session.close)
+        self.lottery = AsyncLottery(session)
+
+    async def test_methods(self):
+        self.assertEqual(await self.lottery.get_config(), {"hits": 1})
+        self.assertEqual(await self.lottery.get_history(), {"hits": 1})
+        self.assertEqual(await self.lottery.draw(), {"hits": 1})
+        self.assertEqual(await self.lottery.get_luck(), {"hits": 1})
+        self.assertEqual(set(self.server.hits), {"lottery_config/get", "lottery_history/global_small",
+                                                 "lottery/draw", "lottery_lucky/my_lucky"})
+
+    async def test_attract_luck(self):
+        await self.lottery.attract_luck(123)
+        self.assertEqual(self.server.bodies["lottery_lucky/dip_lucky"], {"lottery_history_id": "123"})
+        with self.assertRaises(TypeError):
+            await self.lottery.attract_luck(1.5)
+        self.assertEqual(self.server.hits["lottery_lucky/dip_lucky"], 1)
+
+    async def test_luck_is_retried(self):
+        self.server.failures["lottery_lucky/my_lucky"] = 1
+        self.assertEqual(await self.lottery.get_luck(), {"hits": 2})
+        self.assertEqual(counters.as_dict()["retries"], 1)
+
+
+class TestAsyncJuejinGameSession(StandInTestCase):
+    def game_session(self, session_id: str = "session") -> AsyncJuejinGameSession:
+        return AsyncJuejinGameSession(session_id, self.server.url + "game/", self.server.url + "token")
+
+    async def test_levels(self):
+        async with self.game_session() as session:
+            self.assertEqual((session.token, session.uid), (TOKEN, "42"))
+            self.assertEqual(await session.fetch_level_data(), {"name": "start"})
+            self.assertEqual(await session.submit_level([[0, 1], [2, 3]]), {"name": "complete"})
+        self.assertEqual(self.server.bodies["complete"], {"command": [[0, 1], [2, 3]]})
+        self.assertEqual(self.server.hits["token"], 1)
+        self.assertEqual(counters.as_dict()["requests"], 3)
+
+    async def test_errors(self):
+        with self.assertRaisesRegex(JuejinError, "must login"):
+            async with self.game_session("expired"):
+                pass
+        async with self.game_session() as session:
+            self.server.errors["complete"] = "wrong answer"
+            with self.assertRaisesRegex(JuejinError, "wrong answer"):
+                await session.submit_level([])
+
+    async def test_not_retried(self):
+        async with self.game_session() as session:
+            self.server.errors["start"] = "busy"
+            with self.assertRaises(JuejinError):
+                await session.fetch_level_data()
+        self.assertEqual(self.server.hits["start"], 1)
+        self.assertEqual(counters.as_dict()["retries"], 0)
+
+    async def test_not_opened(self):
+        with self.assertRaises(RuntimeError):
+            await self.game_session().fetch_level_data()
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,29 @@
+import unittest
+from io import StringIO
+from json import dumps
+from os import path
+from tempfile import TemporaryDirectory
+
+from batch import read_levels
+from benchmark import generate_level
+
+
+class TestReadLevels(unittest.TestCase):
+    def setUp(self):
+        self.levels = [generate_level(3, seed, seed + 1) for seed in range(3)]
+
+    def test_malformed_lines_are_skipped(self):
+        lines = [dumps(self.levels[0]), "{\"map\": [[", "", dumps(self.levels[1]), "not json", dumps(self.levels[2])]
+        self.assertEqual(list(read_levels(StringIO("\n".join(lines) + "\n"))), self.levels)
+
+    def test_malformed_files_are_skipped(self):
+        with TemporaryDirectory() as directory:
+            contents = [dumps(self.levels[0]), "", dumps(self.levels[1]), "{", dumps(self.levels[2])]
+            for index, content in enumerate(contents):
+                with open(path.join(directory, f"{index}.json"), "w") as file:
+                    file.write(content)
+            self.assertEqual(list(read_levels(directory)), self.levels)
+
+
+if __name__ == "__main__":
+    unittest.main()
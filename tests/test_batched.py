@@ -0,0 +1,41 @@
+import unittest
+
+from batched import batched_bfs, np
+from benchmark import generate_level
+from number_puzzle import NumberPuzzle
+from solve import bfs, find_valid_calculations
+
+
+@unittest.skipIf(np is None, "numpy is not installed")
+class TestBatchedBfs(unittest.TestCase):
+    """`batched_bfs` against `solve.bfs`, which finds a calculation whenever `batched_bfs` does."""
+
+    def assert_same_outcome(self, board, val1, symbol, val2):
+        batched, scalar = NumberPuzzle(board, 0), NumberPuzzle(board, 0)
+        performed = batched_bfs(batched, val1, symbol, val2)
+        self.assertEqual(performed, bfs(scalar, val1, symbol, val2))
+        if performed:
+            result = NumberPuzzle.calc(val1, symbol, val2)
+            self.assertIn(result, batched.pieces)
+            self.assertEqual(sorted(batched.pieces), sorted(scalar.pieces))
+
+    def test_numbers_beyond_64_bits(self):
+        big = 10 ** 19
+        for board, step in (([[big, 0.1, 0.4, 0.1, big - 5]], (big, 0.4, big - 5)),
+                            ([[3 * big, 0.1, 0.6, 0.1, 3]], (3 * big, 0.6, 3)),
+                            ([[2 ** 64 + 1, 0.1, 0.6, 0.1, 2]], (2 ** 64 + 1, 0.6, 2)),
+                            ([[2 ** 64, 0.1, 0.1, 0.1], [0.1, 0.1, 0.2, 2 ** 70]], (2 ** 64, 0.7, 2 ** 70)),
+                            ([[big, 0.1, 0.5, 0.1, big], [0.1, 0.1, 0.1, 0.1, 0.1]], (big, 0.5, big))):
+            with self.subTest(board=board):
+                self.assert_same_outcome(board, *step)
+
+    def test_generated_levels(self):
+        for seed in range(12):
+            level = generate_level(3 + seed % 3, seed)
+            plan = next(find_valid_calculations(NumberPuzzle(level["map"], level["target"])), None)
+            if plan is not None:
+                self.assert_same_outcome(level["map"], *plan[0])
+
+
+if __name__ == "__main__":
+    unittest.main()
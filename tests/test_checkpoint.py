@@ -0,0 +1,75 @@
+import unittest
+from array import array
+from io import BytesIO
+from os import path
+from tempfile import TemporaryDirectory
+from time import monotonic
+
+from benchmark import generate_level
+from cache import board_key
+from checkpoint import Checkpoint, SearchState, checkpoint_path, load_checkpoint, save_checkpoint
+from number_puzzle import CODE_TO_VALUE, NumberPuzzle
+from solve import GaveUp, make_puzzle, solve
+from transposition import TranspositionTable
+
+
+def _dump(table: TranspositionTable) -> bytes:
+    file = BytesIO()
+    table.dump(file)
+    return file.getvalue()
+
+
+class TestCheckpoint(unittest.TestCase):
+    def setUp(self):
+        self.directory = TemporaryDirectory()
+        self.addCleanup(self.directory.cleanup)
+
+    def test_round_trip(self):
+        table = TranspositionTable(1 << 16)
+        for key in range(1, 100):
+            table.add(key * 0x9E3779B97F4A7C15)
+        search = SearchState((1, 0.3, 2), "bfs", False, array("q", [-1, 0, 0, 1]), array("q", [0, 5, 9, 13]),
+                             [(0.0, b"\x00\x06\x07" + bytes(16)), (1.5, b"\x07\x06\x00" + bytes(16))],
+                             CODE_TO_VALUE + (1, 2), table)
+        checkpoint = Checkpoint("key", ("bfs", "astar"), 3, 1, [5, 9], search)
+        file_path = path.join(self.directory.name, "level.ckpt")
+        save_checkpoint(file_path, checkpoint)
+
+        loaded = load_checkpoint(file_path, "key")
+        self.assertEqual(loaded[:5], checkpoint[:5])
+        self.assertEqual(loaded.search[:7], search[:7])
+        self.assertEqual(_dump(loaded.search.table), _dump(table))
+        self.assertIsNone(load_checkpoint(file_path, "another key"))
+
+    def test_early_interrupt_keeps_the_search(self):
+        # A level that takes "bfs" several seconds
+        level = generate_level(7, 3)
+        file_path = checkpoint_path(self.directory.name, level["map"], level["target"])
+        key = board_key(level["map"], level["target"])
+
+        result = solve(make_puzzle(level["map"], level["target"]), strategies=("bfs",), deadline=monotonic() + 0.5,
+                       checkpoint_file=file_path)
+        self.assertIsInstance(result, GaveUp)
+        saved = load_checkpoint(file_path, key)
+        self.assertIsNotNone(saved.search)
+        self.assertTrue(saved.search.frontier)
+
+        # Interrupted before the candidate is searched any further, the search on file stands
+        for interrupt in ({"interrupt": lambda: True}, {"deadline": monotonic()}):
+            puzzle = NumberPuzzle(level["map"], level["target"])
+            self.assertIsInstance(solve(puzzle, strategies=("bfs",), checkpoint_file=file_path, **interrupt), GaveUp)
+            self.assertEqual(puzzle.history, [])
+            loaded = load_checkpoint(file_path, key)
+            self.assertEqual(loaded[:5], saved[:5])
+            self.assertEqual(loaded.search[:7], saved.search[:7])
+            self.assertEqual(_dump(loaded.search.table), _dump(saved.search.table))
+
+        # The search carries on from the frontier
+        solve(make_puzzle(level["map"], level["target"]), strategies=("bfs",), deadline=monotonic() + 0.5,
+              checkpoint_file=file_path)
+        resumed = load_checkpoint(file_path, key)
+        self.assertGreater(len(resumed.search.parents), len(saved.search.parents))
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,103 @@
+import unittest
+from random import Random
+
+from benchmark import generate_level
+from compact_puzzle import MAX_NUMBERS, CompactNumberPuzzle
+from number_puzzle import Direction, NumberPuzzle, PuzzleSnapshot, packing_codes
+from solve import make_puzzle
+
+
+def _random_move(puzzle, rng):
+    x, y = rng.choice(sorted(coordinate for coordinates in puzzle.pieces.values() for coordinate in coordinates))
+    return x, y, rng.choice(list(Direction))
+
+
+class TestEngineParity(unittest.TestCase):
+    """`CompactNumberPuzzle` against `NumberPuzzle` on the same move sequences."""
+
+    def assert_same(self, number, compact):
+        self.assertEqual(number.snapshot(), compact.snapshot())
+        self.assertEqual(dict(number.pieces), dict(compact.pieces))
+        self.assertEqual(number.history, compact.history)
+        self.assertEqual(number.puzzle, compact.puzzle)
+        self.assertEqual(number.is_solved(), compact.is_solved())
+
+    def test_random_moves(self):
+        rng = Random(0)
+        for seed in range(60):
+            level = generate_level(3 + seed % 6, seed)
+            number = NumberPuzzle(level["map"], level["target"])
+            compact = CompactNumberPuzzle(level["map"], level["target"])
+            start = number.snapshot()
+            values, codes = packing_codes(start.board)
+            for _ in range(150):
+                draw = rng.random()
+                if draw < 0.2 and number.history:
+                    move_count = rng.randint(1, 3)
+                    number.undo(move_count)
+                    compact.undo(move_count)
+                elif draw < 0.25:
+                    number.restore(start)
+                    compact.restore(start)
+                    number, compact = number.fork(), compact.fork()
+                else:
+                    move = _random_move(number, rng)
+                    self.assertEqual(number.move(*move), compact.move(*move))
+                self.assert_same(number, compact)
+
+                # The frontier of `solve.bfs` only holds boards whose values are all coded
+                if all(value in codes for value in number.snapshot().board):
+                    packed = number.pack(codes)
+                    self.assertEqual(packed, compact.pack(codes))
+                    other = compact.fork()
+                    other.restore_packed(packed, values, number.zobrist_hash)
+                    self.assertEqual(number.snapshot(), other.snapshot())
+                    self.assertEqual(dict(number.pieces), dict(other.pieces))
+
+            number.reset()
+            compact.reset()
+            self.assert_same(number, compact)
+
+    def test_is_solved(self):
+        for board, target in (([[7, 0.1, 7]], 7), ([[7, 0.1, 0.2]], 7), ([[7, 0.3, 7]], 7), ([[7, 0.1, 8]], 7),
+                              ([[6, 0.1, 0.1]], 7)):
+            self.assertEqual(NumberPuzzle(board, target).is_solved(), CompactNumberPuzzle(board, target).is_solved())
+        self.assertTrue(CompactNumberPuzzle([[7, 0.1, 7]], 7).is_solved())
+
+    def test_large_operands(self):
+        # Operands above a journal word are spilled
+        board = [[10 ** 30, 10 ** 30, 0.5, 3, 0.1]]
+        number, compact = NumberPuzzle(board, 0), CompactNumberPuzzle(board, 0)
+        for move in ((0, 0, Direction.RIGHT), (1, 0, Direction.RIGHT)):
+            self.assertEqual(number.move(*move), compact.move(*move))
+            self.assert_same(number, compact)
+        number.undo(2)
+        compact.undo(2)
+        self.assert_same(number, compact)
+
+    def test_many_numbers(self):
+        # More numbers show up than a byte codes, the compact engine codes them again
+        board = [[1, 0.1, 2]]
+        number, compact = NumberPuzzle(board, 3), CompactNumberPuzzle(board, 3)
+        for value in range(600):
+            snapshot = PuzzleSnapshot((value, 0.1, value + 1), value)
+            number.restore(snapshot)
+            compact.restore(snapshot)
+            self.assertEqual(number.move(0, 0, Direction.RIGHT), compact.move(0, 0, Direction.RIGHT))
+            self.assert_same(number, compact)
+            number.undo()
+            compact.undo()
+            self.assertEqual(compact.snapshot(), snapshot)
+            self.assert_same(number, compact)
+
+    def test_make_puzzle(self):
+        board = [[number for number in range(MAX_NUMBERS)] + [0.1]]
+        self.assertIsInstance(make_puzzle(board, 1), CompactNumberPuzzle)
+        board[0][-1] = MAX_NUMBERS
+        self.assertIsInstance(make_puzzle(board, 1), NumberPuzzle)
+        with self.assertRaises(OverflowError):
+            CompactNumberPuzzle(board, 1)
+
+
+if __name__ == "__main__":
+    unittest.main()
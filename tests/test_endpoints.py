@@ -0,0 +1,28 @@
+import unittest
+
+from endpoints import build_body
+
+
+class TestBuildBody(unittest.TestCase):
+    def test_fields(self):
+        self.assertEqual(build_body("attract_luck", {"lottery_history_id": "7"}), {"lottery_history_id": "7"})
+        self.assertIsNone(build_body("draw", {}))
+
+    def test_integer_ids_are_sent_as_strings(self):
+        self.assertEqual(build_body("attract_luck", {"lottery_history_id": 123}), {"lottery_history_id": "123"})
+
+    def test_other_types_are_refused(self):
+        for value in (None, True, 1.5, ["7"], b"7"):
+            with self.subTest(value=value), self.assertRaises(TypeError):
+                build_body("attract_luck", {"lottery_history_id": value})
+
+    def test_missing_or_unexpected_fields(self):
+        for fields in ({}, {"history_id": "7"}, {"lottery_history_id": "7", "extra": 1}):
+            with self.subTest(fields=fields), self.assertRaises(ValueError):
+                build_body("attract_luck", fields)
+        with self.assertRaises(ValueError):
+            build_body("draw", {"lottery_history_id": "7"})
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,109 @@
+import subprocess
+import sys
+import unittest
+from os import environ, pathsep
+from random import Random
+
+from benchmark import generate_level
+from compact_puzzle import CompactNumberPuzzle
+from number_puzzle import Direction, NumberPuzzle, zobrist_key
+
+
+class TestUndo(unittest.TestCase):
+    """The undo journal of both engines, see `number_puzzle._NO_MERGE`."""
+
+    ENGINES = (NumberPuzzle, CompactNumberPuzzle)
+
+    def assert_undone(self, board, target, moves):
+        for engine in self.ENGINES:
+            with self.subTest(engine=engine.__name__, board=board):
+                puzzle = engine(board, target)
+                start = puzzle.snapshot()
+                states = []
+                for move in moves:
+                    state = puzzle.snapshot()
+                    puzzle.move(*move)
+                    if len(puzzle.history) > len(states):  # Moves that change nothing are not kept
+                        states.append(state)
+                for state in reversed(states):
+                    puzzle.undo()
+                    self.assertEqual(puzzle.snapshot(), state)
+                    self.assertEqual(dict(puzzle.pieces), dict(engine(puzzle.puzzle, target).pieces))
+                self.assertEqual(puzzle.snapshot(), start)
+                self.assertEqual(puzzle.history, [])
+
+    def test_slides(self):
+        self.assert_undone([[0.1, 1, 0.1], [0.2, 0.1, 0.1], [0.1, 0.1, 2]], 3,
+                           [(1, 0, Direction.LEFT), (0, 0, Direction.DOWN), (2, 2, Direction.UP),
+                            (2, 0, Direction.LEFT), (0, 0, Direction.RIGHT)])
+
+    def test_concatenations(self):
+        self.assert_undone([[1, 0.1, 0.1, 2], [0.1, 0.1, 0.1, 0.1]], 12, [(0, 0, Direction.RIGHT)])
+        self.assert_undone([[1, 0.1, 0.1, 2], [0.1, 0.1, 0.1, 0.1]], 21, [(3, 0, Direction.LEFT)])
+
+    def test_calculations(self):
+        for symbol in (0.3, 0.4, 0.5, 0.6):
+            self.assert_undone([[6, 0.1, symbol, 0.1, 2]], 0,
+                               [(0, 0, Direction.RIGHT), (4, 0, Direction.LEFT), (2, 0, Direction.LEFT)])
+
+    def test_large_operands(self):
+        self.assert_undone([[10 ** 30, 0.1, 10 ** 30, 0.5, 3]], 0,
+                           [(0, 0, Direction.RIGHT), (2, 0, Direction.RIGHT)])
+
+    def test_undo_more_than_history(self):
+        for engine in self.ENGINES:
+            puzzle = engine([[1, 0.1, 2]], 12)
+            start = puzzle.snapshot()
+            puzzle.move(0, 0, Direction.RIGHT)
+            puzzle.undo(5)
+            self.assertEqual(puzzle.snapshot(), start)
+            self.assertEqual(puzzle.history, [])
+
+    def test_random_moves(self):
+        rng = Random(0)
+        for seed in range(30):
+            level = generate_level(3 + seed % 5, seed)
+            moves = []
+            puzzle = NumberPuzzle(level["map"], level["target"])
+            for _ in range(60):
+                x, y = rng.choice(sorted(coordinate for coordinates in puzzle.pieces.values()
+                                         for coordinate in coordinates))
+                move = x, y, rng.choice(list(Direction))
+                puzzle.move(*move)
+                moves.append(move)
+            self.assert_undone(level["map"], level["target"], moves)
+
+
+class TestZobristKey(unittest.TestCase):
+    """Keys must not depend on the process, workers and checkpoints rely on the same hashes."""
+
+    PIECES = ((0, 0, 0.2), (3, 1, 0.3), (2, 5, 7), (6, 6, 7), (1, 2, 10 ** 30))
+
+    def test_known_keys(self):
+        keys = [zobrist_key(*piece) for piece in self.PIECES]
+        self.assertEqual(keys, [zobrist_key(*piece) for piece in self.PIECES])
+        self.assertEqual(len(set(keys)), len(keys))
+        self.assertTrue(all(0 <= key < 1 << 64 for key in keys))
+
+    def test_other_processes(self):
+        code = f"from number_puzzle import zobrist_key; print([zobrist_key(*piece) for piece in {self.PIECES!r}])"
+        keys = str([zobrist_key(*piece) for piece in self.PIECES])
+        for hash_seed in ("0", "1", "random"):
+            output = subprocess.run([sys.executable, "-c", code], capture_output=True, text=True, check=True,
+                                    env={**environ, "PYTHONHASHSEED": hash_seed, "PYTHONPATH": pathsep.join(sys.path)})
+            self.assertEqual(output.stdout.strip(), keys)
+
+    def test_hash_of_a_state(self):
+        # Same board, reached in another order, hashes the same
+        first = NumberPuzzle([[1, 0.1, 0.1], [0.1, 0.1, 2]], 3)
+        second = NumberPuzzle([[1, 0.1, 0.1], [0.1, 0.1, 2]], 3)
+        first.move(0, 0, Direction.DOWN)
+        first.move(2, 1, Direction.UP)
+        second.move(2, 1, Direction.UP)
+        second.move(0, 0, Direction.DOWN)
+        self.assertEqual(first.snapshot(), second.snapshot())
+        self.assertEqual(first.zobrist_hash, NumberPuzzle(first.puzzle, 3).zobrist_hash)
+
+
+if __name__ == "__main__":
+    unittest.main()
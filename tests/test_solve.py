@@ -0,0 +1,24 @@
+import unittest
+
+from benchmark import generate_level
+from solve import GaveUp, Solution, make_puzzle, solve
+
+
+class TestSolve(unittest.TestCase):
+    def test_same_solution_with_workers(self):
+        for seed in range(4):
+            level = generate_level(4, seed)
+            results = []
+            for workers in (1, 2):
+                puzzle = make_puzzle(level["map"], level["target"])
+                result = solve(puzzle, workers, strategies=("astar", "beam"))
+                self.assertNotIsInstance(result, GaveUp)
+                if result is not None:
+                    self.assertIsInstance(result, Solution)
+                    self.assertTrue(puzzle.is_solved())
+                results.append(result)
+            self.assertEqual(results[0], results[1])
+
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,59 @@
+import unittest
+from io import BytesIO
+from random import Random
+
+from transposition import INITIAL_CAPACITY, PROBE_LIMIT, TranspositionTable
+
+
+class TestTranspositionTable(unittest.TestCase):
+    def test_keys_below_the_cap_are_kept(self):
+        rng = Random(0)
+        for store_depth in (False, True):
+            table = TranspositionTable(64 << 20, store_depth)
+            keys = [rng.getrandbits(64) for _ in range(100000)]
+            for key in keys:
+                self.assertTrue(table.add(key, 5))
+            self.assertEqual(len(table), len(keys))
+            self.assertEqual(table.replacements, 0)
+            self.assertTrue(all(key in table for key in keys))
+            self.assertFalse(any(table.add(key, 5) for key in keys))
+
+    def test_crowded_keys_below_the_cap_are_kept(self):
+        # Keys that all share their slot, the table grows instead of replacing any of them
+        table = TranspositionTable(1 << 20)
+        keys = [index * INITIAL_CAPACITY * 4 + 1 for index in range(4 * PROBE_LIMIT)]
+        for key in keys:
+            table.add(key)
+        self.assertEqual(len(table), len(keys))
+        self.assertEqual(table.replacements, 0)
+        self.assertTrue(all(key in table for key in keys))
+
+    def test_keys_are_replaced_at_the_cap(self):
+        table = TranspositionTable(INITIAL_CAPACITY * 8)
+        for key in range(1, 2 * INITIAL_CAPACITY):
+            self.assertTrue(table.add(key * 0x9E3779B97F4A7C15))
+        self.assertEqual(table.capacity, INITIAL_CAPACITY)
+        self.assertLessEqual(len(table), INITIAL_CAPACITY)
+        self.assertGreater(table.replacements, 0)
+
+    def test_smaller_depths(self):
+        table = TranspositionTable(store_depth=True)
+        self.assertTrue(table.add(42, 7))
+        self.assertFalse(table.add(42, 7))
+        self.assertTrue(table.add(42, 3))
+        self.assertFalse(table.add(42, 5))
+
+    def test_dump_and_load(self):
+        table = TranspositionTable(store_depth=True)
+        for key in range(1, 10000):
+            table.add(key * 0x9E3779B97F4A7C15, key % 13)
+        file = BytesIO()
+        table.dump(file)
+        file.seek(0)
+        loaded = TranspositionTable.load(file)
+        self.assertEqual((len(loaded), loaded.capacity, loaded.lookups), (len(table), table.capacity, table.lookups))
+        self.assertTrue(all(key * 0x9E3779B97F4A7C15 in loaded for key in range(1, 10000)))
+
+
+if __name__ == "__main__":
+    unittest.main()